@@ -0,0 +1,74 @@
+"""add entry tags
+
+Revision ID: a7b8c9d0e1f2
+Revises: f6a7b8c9d0e1
+Create Date: 2026-10-17
+
+"""
+from collections.abc import Sequence
+from typing import Union
+
+import sqlalchemy as sa
+import sqlmodel.sql.sqltypes
+
+from alembic import op
+from data_adapters.sql.create_tables import entry_tags_ddl
+
+revision: str = 'a7b8c9d0e1f2'
+down_revision: Union[str, None] = 'f6a7b8c9d0e1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'entry_tags',
+        sa.Column('entry_uuid', sa.Uuid(), nullable=False),
+        sa.Column('tag', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+        sa.Column('space_name', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+        sa.Column('subpath', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+        sa.PrimaryKeyConstraint('entry_uuid', 'tag'),
+    )
+    op.create_index('idx_entry_tags_space_tag', 'entry_tags', ['space_name', 'tag', 'subpath'])
+    op.create_index('idx_entry_tags_space_subpath', 'entry_tags', ['space_name', 'subpath'])
+    op.create_table(
+        'subpath_tag_counts',
+        sa.Column('space_name', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+        sa.Column('subpath', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+        sa.Column('resource_type', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+        sa.Column('tag', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+        sa.Column('count', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('space_name', 'subpath', 'resource_type', 'tag'),
+    )
+
+    op.execute(
+        """
+        INSERT INTO entry_tags (entry_uuid, tag, space_name, subpath)
+        SELECT DISTINCT e.uuid, t.tag, e.space_name, e.subpath
+        FROM entries e
+        CROSS JOIN LATERAL jsonb_array_elements_text(
+            CASE WHEN jsonb_typeof(e.tags) = 'array' THEN e.tags ELSE '[]'::jsonb END
+        ) AS t(tag)
+        """
+    )
+    op.execute(
+        """
+        INSERT INTO subpath_tag_counts (space_name, subpath, resource_type, tag, count)
+        SELECT e.space_name, e.subpath, e.resource_type, et.tag, count(*)
+        FROM entry_tags et
+        JOIN entries e ON e.uuid = et.entry_uuid
+        GROUP BY e.space_name, e.subpath, e.resource_type, et.tag
+        """
+    )
+    for ddl in entry_tags_ddl():
+        op.execute(ddl)
+
+
+def downgrade() -> None:
+    op.execute("DROP TRIGGER IF EXISTS trg_entries_tags_update ON entries")
+    op.execute("DROP TRIGGER IF EXISTS trg_entries_tags_write ON entries")
+    op.execute("DROP FUNCTION IF EXISTS dmart_entry_tags()")
+    op.drop_table('subpath_tag_counts')
+    op.drop_index('idx_entry_tags_space_subpath', table_name='entry_tags')
+    op.drop_index('idx_entry_tags_space_tag', table_name='entry_tags')
+    op.drop_table('entry_tags')
@@ -0,0 +1,63 @@
+"""add acl users
+
+Revision ID: b8c9d0e1f2a3
+Revises: a7b8c9d0e1f2
+Create Date: 2026-10-17
+
+"""
+from collections.abc import Sequence
+from typing import Union
+
+import sqlalchemy as sa
+import sqlmodel.sql.sqltypes
+
+from alembic import op
+from data_adapters.sql.create_tables import ACL_TABLES, acl_users_ddl
+
+revision: str = 'b8c9d0e1f2a3'
+down_revision: Union[str, None] = 'a7b8c9d0e1f2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'acl_users',
+        sa.Column('user_shortname', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+        sa.Column('entry_uuid', sa.Uuid(), nullable=False),
+        sa.Column('space_name', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+        sa.Column('subpath', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+        sa.Column('shortname', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+        sa.Column('resource_type', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+        sa.PrimaryKeyConstraint('user_shortname', 'entry_uuid'),
+    )
+    op.create_index('idx_acl_users_entry', 'acl_users', ['entry_uuid'])
+    op.execute("CREATE SEQUENCE IF NOT EXISTS acl_users_version_seq")
+
+    for table in ACL_TABLES:
+        op.execute(
+            f"""
+            INSERT INTO acl_users (user_shortname, entry_uuid, space_name, subpath, shortname, resource_type)
+            SELECT DISTINCT a.access->>'user_shortname', t.uuid, t.space_name, t.subpath, t.shortname, t.resource_type
+            FROM {table} t
+            CROSS JOIN LATERAL jsonb_array_elements(
+                CASE WHEN jsonb_typeof(t.acl) = 'array' THEN t.acl ELSE '[]'::jsonb END
+            ) AS a(access)
+            WHERE a.access->>'user_shortname' IS NOT NULL
+            ON CONFLICT DO NOTHING
+            """
+        )
+    for ddl in acl_users_ddl():
+        op.execute(ddl)
+
+
+def downgrade() -> None:
+    for table in ACL_TABLES:
+        op.execute(f"DROP TRIGGER IF EXISTS trg_{table}_acl_users_update ON {table}")
+        op.execute(f"DROP TRIGGER IF EXISTS trg_{table}_acl_users_write ON {table}")
+    op.execute("DROP TRIGGER IF EXISTS trg_acl_users_version ON acl_users")
+    op.execute("DROP FUNCTION IF EXISTS dmart_acl_users_version()")
+    op.execute("DROP FUNCTION IF EXISTS dmart_acl_users()")
+    op.execute("DROP SEQUENCE IF EXISTS acl_users_version_seq")
+    op.drop_index('idx_acl_users_entry', table_name='acl_users')
+    op.drop_table('acl_users')
@@ -0,0 +1,43 @@
+"""add permissions cache versioning
+
+Revision ID: d4e5f6a7b8c9
+Revises: c3d4e5f6a7b8
+Create Date: 2026-10-17
+
+"""
+from collections.abc import Sequence
+from typing import Union
+
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+from alembic import op
+
+revision: str = 'd4e5f6a7b8c9'
+down_revision: Union[str, None] = 'c3d4e5f6a7b8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute("CREATE SEQUENCE IF NOT EXISTS permissions_version_seq")
+    op.execute("DELETE FROM userpermissionscache")
+    op.add_column(
+        'userpermissionscache',
+        sa.Column('version', sa.Integer(), nullable=False, server_default='0'),
+    )
+    op.add_column(
+        'userpermissionscache',
+        sa.Column('role_shortnames', postgresql.JSONB(astext_type=sa.Text()), nullable=False, server_default='[]'),
+    )
+    op.add_column(
+        'userpermissionscache',
+        sa.Column('permission_shortnames', postgresql.JSONB(astext_type=sa.Text()), nullable=False, server_default='[]'),
+    )
+
+
+def downgrade() -> None:
+    op.drop_column('userpermissionscache', 'permission_shortnames')
+    op.drop_column('userpermissionscache', 'role_shortnames')
+    op.drop_column('userpermissionscache', 'version')
+    op.execute("DROP SEQUENCE IF EXISTS permissions_version_seq")
@@ -0,0 +1,40 @@
+"""add search vector
+
+Revision ID: e5f6a7b8c9d0
+Revises: d4e5f6a7b8c9
+Create Date: 2026-10-17
+
+"""
+from collections.abc import Sequence
+from typing import Union
+
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+from alembic import op
+from data_adapters.sql.create_tables import SEARCH_VECTOR_TABLES, search_vector_ddl
+
+revision: str = 'e5f6a7b8c9d0'
+down_revision: Union[str, None] = 'd4e5f6a7b8c9'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    for table in SEARCH_VECTOR_TABLES:
+        op.add_column(table, sa.Column('search_vector', postgresql.TSVECTOR(), nullable=True))
+    for ddl in search_vector_ddl():
+        op.execute(ddl)
+    # Fire the triggers once to fill the new column
+    for table in SEARCH_VECTOR_TABLES:
+        op.execute(f"UPDATE {table} SET search_vector = NULL")
+
+
+def downgrade() -> None:
+    for table in SEARCH_VECTOR_TABLES:
+        op.execute(f"DROP TRIGGER IF EXISTS trg_{table}_search_vector ON {table}")
+        op.drop_index(f'idx_{table}_search_vector', table_name=table, if_exists=True)
+        op.drop_column(table, 'search_vector')
+    op.execute("DROP FUNCTION IF EXISTS dmart_search_vector()")
+    op.execute("DROP FUNCTION IF EXISTS dmart_jsonb_text(jsonb)")
+    op.execute("DROP FUNCTION IF EXISTS dmart_space_regconfig(text)")
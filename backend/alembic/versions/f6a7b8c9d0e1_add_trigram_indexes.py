@@ -0,0 +1,26 @@
+"""add trigram indexes
+
+Revision ID: f6a7b8c9d0e1
+Revises: e5f6a7b8c9d0
+Create Date: 2026-10-17
+
+"""
+from collections.abc import Sequence
+from typing import Union
+
+from alembic import op
+from data_adapters.sql.create_tables import sync_trigram_indexes, trigram_index_ddl
+
+revision: str = 'f6a7b8c9d0e1'
+down_revision: Union[str, None] = 'e5f6a7b8c9d0'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    sync_trigram_indexes(op.get_bind())
+
+
+def downgrade() -> None:
+    for name in trigram_index_ddl():
+        op.execute(f"DROP INDEX IF EXISTS {name}")
@@ -10,9 +10,13 @@ from fastapi import APIRouter, Depends, status
 from fastapi.responses import JSONResponse
 
 import models.api as api
+from data_adapters.adapter import data_adapter as db
 from utils.internal_error_code import InternalErrorCode
-from utils.jwt import JWTBearer
+from utils.jq_engine import jq_engine
+from utils.jwt import JWTBearer, verified_tokens
+from utils.password_hashing import hashing_pool
 from utils.plugin_manager import plugin_manager
+from utils.query_cache import public_query_cache
 from utils.settings import settings
 
 router = APIRouter(default_response_class=JSONResponse)
@@ -80,6 +84,43 @@ async def get_settings(shortname=Depends(JWTBearer())) -> api.Response:
     return api.Response(status=api.Status.success, attributes=safe_settings)
 
 
+@router.get("/metrics", response_model=api.Response, response_model_exclude_none=True)
+async def get_metrics(shortname=Depends(JWTBearer())) -> api.Response:
+    if shortname != "dmart":
+        raise api.Exception(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            error=api.Error(
+                type="access", code=InternalErrorCode.NOT_ALLOWED, message="You don't have permission to this action [21]"
+            ),
+        )
+    metrics = {
+        "process_id": getpid(),
+        "permissions_cache": db.permissions_cache.stats(),  # type: ignore
+        "jq": jq_engine.stats(),
+        "public_query_cache": public_query_cache.stats(),
+        "database": db.database_stats(),  # type: ignore
+        "password_hashing": hashing_pool.stats(),
+        "jwt_cache": verified_tokens.stats(),
+    }
+    return api.Response(status=api.Status.success, attributes=metrics)
+
+
+@router.get("/indexes", response_model=api.Response, response_model_exclude_none=True)
+async def get_indexes(shortname=Depends(JWTBearer()), sync: bool = False) -> api.Response:
+    if shortname != "dmart":
+        raise api.Exception(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            error=api.Error(
+                type="access", code=InternalErrorCode.NOT_ALLOWED, message="You don't have permission to this action [21]"
+            ),
+        )
+    attributes: dict = {}
+    if sync:
+        attributes["folder_indexes"] = await db.sync_folder_indexes()  # type: ignore
+    attributes["indexes"] = await db.get_index_usage()  # type: ignore
+    return api.Response(status=api.Status.success, attributes=attributes)
+
+
 @router.get("/manifest", response_model=api.Response, response_model_exclude_none=True)
 async def get_manifest(_=Depends(JWTBearer())) -> api.Response:
     now = datetime.now()
@@ -9,7 +9,8 @@ import sys
 import tempfile
 import traceback
 import zipfile
-from collections.abc import Callable
+from collections.abc import AsyncGenerator, Callable
+from contextlib import aclosing
 from datetime import datetime
 from io import BytesIO, StringIO
 from pathlib import Path as FilePath
@@ -29,7 +30,7 @@ import utils.regex as regex
 import utils.repository as repository
 from api.managed.utils import (
     create_or_update_resource_with_payload_handler,
-    csv_entries_prepare_docs,
+    csv_entries_prepare_row,
     # data_asset_attachments_handler,
     # data_asset_handler,
     get_mime_type,
@@ -47,6 +48,7 @@ from api.managed.utils import (
     update_state_handle_resolution,
 )
 from data_adapters.adapter import data_adapter as db
+from data_adapters.sql.adapter_helpers import KEYSET_QUERY_TYPES
 from data_adapters.sql.json_to_db_migration import main as json_to_db_main
 from models.enums import (
     ContentType,
@@ -235,7 +237,6 @@ async def csv_entries(query: api.Query, user_shortname=Depends(JWTBearer())):
         )
     )
 
-    query.retrieve_attachments = True
     subpath_stripped = (query.subpath or "/").strip("/")
     if not subpath_stripped:
         parent_subpath = "/"
@@ -266,46 +267,68 @@ async def csv_entries(query: api.Query, user_shortname=Depends(JWTBearer())):
 
     keys: list = [i["name"] for i in folder_views]
     keys_existence = dict(zip(keys, [False for _ in range(len(keys))], strict=False))
-
-    #  _, search_res = await db.query(query, user_shortname)
-    # docs_dicts = [search_re.model_dump() for search_re in search_res]
-
-    _, search_res = await repository.serve_query(
-        query,
-        user_shortname,
-    )
-
-    docs_dicts = [search_re.model_dump() for search_re in search_res]
-
-    json_data, deprecated_keys, new_keys = csv_entries_prepare_docs(query, docs_dicts, folder_views, keys_existence)
-
-    await plugin_manager.after_action(
-        core.Event(
-            space_name=query.space_name,
-            subpath=query.subpath,
-            action_type=core.ActionType.query,
-            user_shortname=user_shortname,
-        )
-    )
-
-    keys = [key for key in keys if keys_existence[key]]
-
-    list_deprecated_keys = list(deprecated_keys)
-    keys = list(filter(lambda item: item not in list_deprecated_keys, keys))
-    fieldnames = keys + list(new_keys)
-
-    def csv_row_generator():
-        """Stream CSV rows one at a time to avoid building the full CSV in memory."""
+    query.retrieve_attachments = any(str(i.get("key", "")).startswith("attachments.") for i in folder_views)
+
+    # Listings stream from the database cursor. The other query types, and jq filters that need the whole result,
+    # are served in one go as before and written through the same writer.
+    streamed = query.type in KEYSET_QUERY_TYPES and not query.jq_filter
+    served: list = []
+    if not streamed:
+        _, served = await repository.serve_query(query, user_shortname)
+
+    async def query_records() -> AsyncGenerator[Any, None]:
+        if not streamed:
+            for record in served:
+                yield record
+            return
+        async with aclosing(db.stream_query(query.model_copy(deep=True), user_shortname)) as stream:
+            async for record in stream:
+                yield record
+
+    def csv_row(record: Any) -> dict:
+        doc = record.model_dump() if isinstance(record, core.Record) else record
+        if isinstance(doc, dict) and isinstance(doc.get("attributes"), dict):
+            doc["attributes"].pop("password", None)
+        return csv_entries_prepare_row(doc if isinstance(doc, dict) else {}, folder_views, keys_existence)
+
+    if not settings.csv_export_single_pass:
+        # A first pass over the records finds the columns that no record sets, the export leaves them out
+        async with aclosing(query_records()) as first_pass:
+            async for record in first_pass:
+                csv_row(record)
+        keys = [key for key in keys if keys_existence[key]]
+
+    records = query_records()
+    # Pull the first record now so that query and permission errors get a proper error response
+    first_record = await anext(records, None)
+
+    async def csv_row_generator():
+        """Write the rows through one writer as the cursor yields them, flushing the buffer every 64KB"""
         buf = StringIO()
         buf.write(codecs.BOM_UTF8.decode("utf-8"))
-        writer = csv.DictWriter(buf, fieldnames=fieldnames)
+        writer = csv.DictWriter(buf, fieldnames=keys, extrasaction="ignore")
         writer.writeheader()
+        record = first_record
+        try:
+            while record is not None:
+                writer.writerow(csv_row(record))
+                if buf.tell() >= 65536:
+                    yield buf.getvalue()
+                    buf.seek(0)
+                    buf.truncate()
+                record = await anext(records, None)
+        finally:
+            await records.aclose()
         yield buf.getvalue()
-        for row in json_data:
-            buf = StringIO()
-            writer = csv.DictWriter(buf, fieldnames=fieldnames)
-            writer.writerow(row)
-            yield buf.getvalue()
+
+        await plugin_manager.after_action(
+            core.Event(
+                space_name=query.space_name,
+                subpath=query.subpath,
+                action_type=core.ActionType.query,
+                user_shortname=user_shortname,
+            )
+        )
 
     response = StreamingResponse(csv_row_generator(), media_type="text/csv")
     safe_filename = f"{query.space_name}_{query.subpath}".replace("/", "_").replace("\\", "_").replace('"', "")
@@ -388,9 +411,60 @@ async def query_entries(query: api.Query, user_shortname=Depends(JWTBearer())) -
     return api.Response(
         status=api.Status.success,
         records=[] if query.type == QueryType.counters else records,
-        attributes={"total": total, "returned": len(records)},
+        attributes=repository.query_response_attributes(query, total, records),
+    )
+
+
+@router.post("/query/stream", response_class=StreamingResponse)
+async def query_entries_stream(query: api.Query, user_shortname=Depends(JWTBearer())) -> StreamingResponse:
+    """Query records as newline delimited JSON, read from the database as the client consumes them"""
+    await is_space_exist(query.space_name)
+    if query.jq_filter:
+        raise api.Exception(
+            status.HTTP_400_BAD_REQUEST,
+            api.Error(
+                type="request",
+                code=InternalErrorCode.INVALID_DATA,
+                message="jq_filter is not supported by streamed queries",
+            ),
+        )
+
+    await plugin_manager.before_action(
+        core.Event(
+            space_name=query.space_name,
+            subpath=query.subpath,
+            action_type=core.ActionType.query,
+            user_shortname=user_shortname,
+            attributes={"filter_shortnames": query.filter_shortnames},
+        )
     )
 
+    records = db.stream_query(query, user_shortname)
+    # Pull the first record now so that query and permission errors get a proper error response
+    first_record = await anext(records, None)
+
+    async def ndjson_records():
+        record = first_record
+        try:
+            while record is not None:
+                if isinstance(record.attributes, dict):
+                    record.attributes.pop("password", None)
+                yield record.model_dump_json(exclude_none=True) + "\n"
+                record = await anext(records, None)
+        finally:
+            await records.aclose()
+
+        await plugin_manager.after_action(
+            core.Event(
+                space_name=query.space_name,
+                subpath=query.subpath,
+                action_type=core.ActionType.query,
+                user_shortname=user_shortname,
+            )
+        )
+
+    return StreamingResponse(ndjson_records(), media_type="application/x-ndjson")
+
 
 @router.post("/request", response_model=api.Response, response_model_exclude_none=True)
 async def serve_request(
@@ -500,6 +574,7 @@ async def update_state(
         resource_owner_group=ticket_obj.owner_group_shortname,
         record_attributes={"state": "", "resolution_reason": ""},
         entry_shortname=shortname,
+        entry_meta=ticket_obj,
     ):
         raise api.Exception(
             status.HTTP_401_UNAUTHORIZED,
@@ -644,6 +719,7 @@ async def retrieve_entry_or_attachment_payload(
         resource_owner_shortname=meta.owner_shortname,
         resource_owner_group=meta.owner_group_shortname,
         entry_shortname=meta.shortname,
+        entry_meta=meta,
     ):
         raise api.Exception(
             status.HTTP_401_UNAUTHORIZED,
@@ -968,6 +1044,7 @@ async def retrieve_entry_meta(
         resource_owner_shortname=meta.owner_shortname,
         resource_owner_group=meta.owner_group_shortname,
         entry_shortname=meta.shortname,
+        entry_meta=meta,
     ):
         raise api.Exception(
             status.HTTP_401_UNAUTHORIZED,
@@ -1482,7 +1559,8 @@ async def data_asset_single(
             resource_is_active=meta.is_active,
             resource_owner_shortname=meta.owner_shortname,
             resource_owner_group=meta.owner_group_shortname,
-            entry_shortname=meta.shortname
+            entry_shortname=meta.shortname,
+            entry_meta=meta,
     ):
         raise api.Exception(
             status.HTTP_401_UNAUTHORIZED,
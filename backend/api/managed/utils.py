@@ -33,6 +33,7 @@ from utils.helpers import (
     flatten_dict,
 )
 from utils.internal_error_code import InternalErrorCode
+from utils.password_hashing import hashing_pool
 from utils.plugin_manager import plugin_manager
 from utils.router_helper import is_space_exist
 from utils.settings import settings
@@ -57,78 +58,60 @@ async def iter_bytesio(data: BytesIO, chunk_size: int = 8192):
             return
 
 
-def csv_entries_prepare_docs(query, docs_dicts, folder_views, keys_existence):
-    json_data = []
+def csv_entries_prepare_row(doc: dict, folder_views: list, keys_existence: dict) -> dict:
+    """CSV row of a dumped query record, keyed by the names of the folder csv_columns"""
     timestamp_fields = ["created_at", "updated_at"]
-    new_keys: set[str] = set()
-    deprecated_keys: set[str] = set()
-
-    for redis_document in docs_dicts:
-        rows: list[dict] = [{}]
-        flattened_doc = flatten_dict(redis_document)
-        for folder_view in folder_views:
-            column_key = folder_view.get("key")
-            column_title = folder_view.get("name")
-            attribute_val = flattened_doc.get(column_key)
-
-            if attribute_val is None and not column_key.startswith("attachments."):
-                parts = column_key.split(".")
-                current = redis_document
-                for part in parts:
-                    if isinstance(current, dict):
-                        current = current.get(part)
-                    else:
-                        current = None
-                        break
-                if isinstance(current, (dict, list)):
-                    attribute_val = current
-
-            if column_key.startswith("attachments.") and attribute_val is None:
-                parts = column_key.split(".")
-                if len(parts) >= 3:
-                    attachment_type = parts[1]
-                    property_name = ".".join(parts[2:])
-
-                    attachment_key = f"attachments.{attachment_type}"
-                    attachments_array = flattened_doc.get(attachment_key)
-
-                    if isinstance(attachments_array, list):
-                        flattened_attachments = [
-                            flatten_dict(attachment) if isinstance(attachment, dict) else attachment
-                            for attachment in attachments_array
-                        ]
-                        attribute_val = [
-                            flattened_attachment.get(property_name)
-                            for flattened_attachment in flattened_attachments
-                            if isinstance(flattened_attachment, dict) and flattened_attachment.get(property_name) is not None
-                        ]
-                        attribute_val = [val for val in attribute_val if val is not None]
-
-            if attribute_val is not None:
-                keys_existence[column_title] = True
-            if isinstance(attribute_val, (dict, list)):
-                new_col = json.dumps(attribute_val, ensure_ascii=False)
-                for row in rows:
-                    row[column_title] = new_col
-            elif attribute_val is not None:
-                new_col = (
-                    attribute_val
-                    if column_key not in timestamp_fields
-                    else datetime.fromtimestamp(attribute_val).strftime("%Y-%m-%d %H:%M:%S")
-                )
-                for row in rows:
-                    row[column_title] = new_col
-        json_data += rows
-
-    # Sort all entries from all schemas
-    if query.sort_by in core.Meta.model_fields and len(query.filter_schema_names) > 1:
-        json_data = sorted(
-            json_data,
-            key=lambda d: d.get(query.sort_by, ""),
-            reverse=(query.sort_type == api.SortType.descending),
-        )
-
-    return json_data, deprecated_keys, new_keys
+    row: dict = {}
+    flattened_doc = flatten_dict(doc)
+    for folder_view in folder_views:
+        column_key = folder_view.get("key")
+        column_title = folder_view.get("name")
+        attribute_val = flattened_doc.get(column_key)
+
+        if attribute_val is None and not column_key.startswith("attachments."):
+            parts = column_key.split(".")
+            current: Any = doc
+            for part in parts:
+                if isinstance(current, dict):
+                    current = current.get(part)
+                else:
+                    current = None
+                    break
+            if isinstance(current, (dict, list)):
+                attribute_val = current
+
+        if column_key.startswith("attachments.") and attribute_val is None:
+            parts = column_key.split(".")
+            if len(parts) >= 3:
+                attachment_type = parts[1]
+                property_name = ".".join(parts[2:])
+
+                attachment_key = f"attachments.{attachment_type}"
+                attachments_array = flattened_doc.get(attachment_key)
+
+                if isinstance(attachments_array, list):
+                    flattened_attachments = [
+                        flatten_dict(attachment) if isinstance(attachment, dict) else attachment
+                        for attachment in attachments_array
+                    ]
+                    attribute_val = [
+                        flattened_attachment.get(property_name)
+                        for flattened_attachment in flattened_attachments
+                        if isinstance(flattened_attachment, dict) and flattened_attachment.get(property_name) is not None
+                    ]
+                    attribute_val = [val for val in attribute_val if val is not None]
+
+        if attribute_val is not None:
+            keys_existence[column_title] = True
+        if isinstance(attribute_val, (dict, list)):
+            row[column_title] = json.dumps(attribute_val, ensure_ascii=False)
+        elif attribute_val is not None:
+            row[column_title] = (
+                attribute_val
+                if column_key not in timestamp_fields
+                else datetime.fromtimestamp(attribute_val).strftime("%Y-%m-%d %H:%M:%S")
+            )
+    return row
 
 
 async def serve_request_create_check_access(request, record, owner_shortname):
@@ -260,7 +243,10 @@ async def serve_request_create(request: api.Request, owner_shortname: str, token
 
             await db.validate_uniqueness(request.space_name, record, RequestType.create, owner_shortname)
 
-            resource_obj = core.Meta.from_record(record=record, owner_shortname=owner_shortname)
+            password_hashed = await hashing_pool.hash_record_password(record)
+            resource_obj = core.Meta.from_record(
+                record=record, owner_shortname=owner_shortname, password_hashed=password_hashed
+            )
 
             separate_payload_data, resource_obj = set_resource_object(record, resource_obj, is_internal)
 
@@ -448,6 +434,7 @@ async def serve_request_update(request, owner_shortname: str):
                 resource_owner_group=old_resource_obj.owner_group_shortname,
                 record_attributes=record.attributes,
                 entry_shortname=record.shortname,
+                entry_meta=old_resource_obj,
             ):
                 raise api.Exception(
                     status.HTTP_401_UNAUTHORIZED,
@@ -475,9 +462,11 @@ async def serve_request_update(request, owner_shortname: str):
                 else:
                     new_resource_payload_data = None
             else:
+                password_hashed = await hashing_pool.hash_record_password(record)
                 new_resource_payload_data = resource_obj.update_from_record(
                     record=record,
                     old_body=old_resource_payload_body,
+                    password_hashed=password_hashed,
                 )
 
                 new_version_flattend = resource_obj.model_dump()
@@ -621,6 +610,7 @@ async def serve_request_patch(request, owner_shortname: str):
                 resource_owner_group=old_resource_obj.owner_group_shortname,
                 record_attributes=record.attributes,
                 entry_shortname=record.shortname,
+                entry_meta=old_resource_obj,
             ):
                 raise api.Exception(
                     status.HTTP_401_UNAUTHORIZED,
@@ -645,9 +635,11 @@ async def serve_request_patch(request, owner_shortname: str):
             if record.resource_type == ResourceType.log:
                 new_resource_payload_data = record.attributes.get("payload", {}).get("body", {})
             else:
+                password_hashed = await hashing_pool.hash_record_password(record)
                 new_resource_payload_data = resource_obj.update_from_record(
                     record=record,
                     old_body=old_resource_payload_body,
+                    password_hashed=password_hashed,
                 )
                 new_version_flattend = resource_obj.model_dump()
                 if new_resource_payload_data is not None:
@@ -794,6 +786,7 @@ async def serve_request_assign(request, owner_shortname: str):
                 resource_owner_group=resource_obj.owner_group_shortname,
                 record_attributes=record.attributes,
                 entry_shortname=record.shortname,
+                entry_meta=resource_obj,
             ):
                 raise api.Exception(
                     status.HTTP_401_UNAUTHORIZED,
@@ -901,6 +894,7 @@ async def serve_request_update_acl(request, owner_shortname: str):
                 resource_owner_group=resource_obj.owner_group_shortname,
                 record_attributes=record.attributes,
                 entry_shortname=record.shortname,
+                entry_meta=resource_obj,
             ):
                 raise api.Exception(
                     status.HTTP_401_UNAUTHORIZED,
@@ -1009,6 +1003,7 @@ async def serve_request_delete(request, owner_shortname: str):
                 resource_owner_shortname=resource_obj.owner_shortname,
                 resource_owner_group=resource_obj.owner_group_shortname,
                 entry_shortname=record.shortname,
+                entry_meta=resource_obj,
             ):
                 raise api.Exception(
                     status.HTTP_401_UNAUTHORIZED,
@@ -1632,7 +1627,8 @@ async def create_or_update_resource_with_payload_handler(
 ):
     if record.resource_type == ResourceType.ticket:
         record = await set_init_state_from_record(record, owner_shortname, space_name)
-    resource_obj = core.Meta.from_record(record=record, owner_shortname=owner_shortname)
+    password_hashed = await hashing_pool.hash_record_password(record)
+    resource_obj = core.Meta.from_record(record=record, owner_shortname=owner_shortname, password_hashed=password_hashed)
     if record.resource_type == ResourceType.ticket:
         record = await set_init_state_from_record(record, owner_shortname, space_name)
 
@@ -2,13 +2,15 @@ import hashlib
 import os
 import re
 import sys
+from collections.abc import Awaitable, Callable
 from re import sub as res_sub
 from typing import Any, Union
 from uuid import uuid4
 
-from fastapi import APIRouter, Body, Depends, Form, Path, Query, UploadFile, status
+from fastapi import APIRouter, Body, Depends, Form, Path, Query, Request, UploadFile, status
+from fastapi.encoders import jsonable_encoder
 from fastapi.responses import JSONResponse
-from starlette.responses import FileResponse, StreamingResponse
+from starlette.responses import FileResponse, Response, StreamingResponse
 
 import models.api as api
 import models.core as core
@@ -26,6 +28,7 @@ from utils.access_control import access_control
 from utils.helpers import camel_case
 from utils.internal_error_code import InternalErrorCode
 from utils.plugin_manager import plugin_manager
+from utils.query_cache import public_query_cache
 from utils.router_helper import is_space_exist
 from utils.settings import settings
 from utils.ticket_sys_utils import set_init_state_for_record
@@ -35,8 +38,47 @@ router = APIRouter(default_response_class=JSONResponse)
 # Retrieve publically-available content
 
 
+async def cached_public_query(
+    request: Request, route: str, query: api.Query, serve: Callable[[], Awaitable[api.Response]]
+) -> Response | api.Response:
+    """
+    Serialized response of an anonymous query, served from the public query cache while no write changed its
+    subpath. Clients revalidate with If-None-Match, and Cache-Control: no-cache skips the cached copy.
+    With the cache disabled, the response is the plain one, without caching headers.
+    """
+    if not public_query_cache.enabled:
+        return await serve()
+
+    if query.type == QueryType.random and query.seed is None:
+        # A new sample every time, nothing to cache nor to revalidate
+        return JSONResponse(content=jsonable_encoder(await serve(), exclude_none=True), headers={"Cache-Control": "no-store"})
+
+    space_name, subpath = query.space_name, query.subpath
+    key = public_query_cache.key(route, query)
+    cached = None
+    if "no-cache" not in request.headers.get("cache-control", ""):
+        cached = public_query_cache.get(key)
+
+    if cached:
+        body, etag = cached
+    else:
+        snapshot = public_query_cache.snapshot(space_name, subpath)
+        body = bytes(JSONResponse(content=jsonable_encoder(await serve(), exclude_none=True)).body)
+        etag = public_query_cache.put(key, space_name, subpath, body, snapshot)
+
+    max_age = settings.public_query_cache_max_age
+    headers = {
+        "ETag": etag,
+        "Cache-Control": f"public, max-age={max_age}" if max_age > 0 else "public, no-cache",
+        "X-Cache": "HIT" if cached else "MISS",
+    }
+    if etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
 @router.post("/query", response_model=api.Response, response_model_exclude_none=True)
-async def query_entries(query: api.Query) -> api.Response:
+async def query_entries(request: Request, query: api.Query) -> Response | api.Response:
     await plugin_manager.before_action(
         core.Event(
             space_name=query.space_name,
@@ -47,7 +89,15 @@ async def query_entries(query: api.Query) -> api.Response:
         )
     )
 
-    total, records = await repository.serve_query(query, "anonymous")
+    async def serve() -> api.Response:
+        total, records = await repository.serve_query(query, "anonymous")
+        return api.Response(
+            status=api.Status.success,
+            records=[] if query.type == QueryType.counters else records,
+            attributes=repository.query_response_attributes(query, total, records),
+        )
+
+    response = await cached_public_query(request, "query", query, serve)
 
     await plugin_manager.after_action(
         core.Event(
@@ -59,11 +109,7 @@ async def query_entries(query: api.Query) -> api.Response:
         )
     )
 
-    return api.Response(
-        status=api.Status.success,
-        records=[] if query.type == QueryType.counters else records,
-        attributes={"total": total, "returned": len(records)},
-    )
+    return response
 
 
 @router.get(
@@ -117,6 +163,7 @@ async def retrieve_entry_meta(
         resource_owner_shortname=meta.owner_shortname,
         resource_owner_group=meta.owner_group_shortname,
         entry_shortname=meta.shortname,
+        entry_meta=meta,
     ):
         raise api.Exception(
             status.HTTP_401_UNAUTHORIZED,
@@ -226,6 +273,7 @@ async def retrieve_entry_or_attachment_payload(
         resource_owner_shortname=meta.owner_shortname,
         resource_owner_group=meta.owner_group_shortname,
         entry_shortname=meta.shortname,
+        entry_meta=meta,
     ):
         raise api.Exception(
             status.HTTP_401_UNAUTHORIZED,
@@ -270,8 +318,9 @@ async def submit() -> api.Response:
     response_model_exclude_none=True,
 )
 async def query_via_urlparams(
+    request: Request,
     query: api.Query = Depends(api.Query),
-) -> api.Response:
+) -> Response | api.Response:
     await plugin_manager.before_action(
         core.Event(
             space_name=query.space_name,
@@ -282,7 +331,15 @@ async def query_via_urlparams(
         )
     )
 
-    total, records = await repository.serve_query(query, "anonymous")
+    async def serve() -> api.Response:
+        total, records = await repository.serve_query(query, "anonymous")
+        return api.Response(
+            status=api.Status.success,
+            records=records,
+            attributes=repository.query_response_attributes(query, total, records),
+        )
+
+    response = await cached_public_query(request, "query_via_urlparams", query, serve)
 
     await plugin_manager.after_action(
         core.Event(
@@ -294,11 +351,7 @@ async def query_via_urlparams(
         )
     )
 
-    return api.Response(
-        status=api.Status.success,
-        records=records,
-        attributes={"total": total, "returned": len(records)},
-    )
+    return response
 
 
 @router.post(
@@ -643,7 +696,7 @@ async def create_attachment(space_name: str, record: str = Form(...), payload_fi
 
 
 @router.post("/excute/{task_type}/{space_name}")
-async def excute(space_name: str, task_type: TaskType, record: core.Record):
+async def excute(request: Request, space_name: str, task_type: TaskType, record: core.Record):
     meta = await db.load(
         space_name=space_name,
         subpath=record.subpath,
@@ -692,7 +745,7 @@ async def excute(space_name: str, task_type: TaskType, record: core.Record):
     filter_shortnames = record.attributes.get("filter_shortnames", [])
     query_dict["filter_shortnames"] = filter_shortnames if isinstance(filter_shortnames, list) else []
 
-    return await query_entries(api.Query(**query_dict))
+    return await query_entries(request, api.Query(**query_dict))
 
 
 @router.get("/byuuid/{uuid}", response_model_exclude_none=True)
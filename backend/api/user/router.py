@@ -117,7 +117,8 @@ async def create_user(response: Response, record: core.Record, http_request: Req
     )
 
     record.resource_type = ResourceType.user
-    user = core.User.from_record(record=record, owner_shortname="dmart")
+    password_hashed = await password_hashing.hashing_pool.hash_record_password(record)
+    user = core.User.from_record(record=record, owner_shortname="dmart", password_hashed=password_hashed)
     separate_payload_data: str | dict[str, Any] | None = {}
     if record.attributes.get("payload", {}).get("body"):
         schema_shortname = getattr(user.payload, "schema_shortname", None)
@@ -373,8 +374,11 @@ async def login(response: Response, request: UserLoginRequest, http_request: Req
             )
 
             is_password_valid = None
+            rehashed_password = None
             if request.password:
-                is_password_valid = password_hashing.verify_password(request.password or "", user.password or "")
+                is_password_valid, rehashed_password = await password_hashing.hashing_pool.verify_and_rehash(
+                    request.password or "", user.password or ""
+                )
             if user and user.is_active and (is_password_valid is None or is_password_valid):
                 await db.clear_failed_password_attempts(shortname)
                 await reset_failed_login_attempt(user)
@@ -383,7 +387,12 @@ async def login(response: Response, request: UserLoginRequest, http_request: Req
                     await db.delete_otp(key)
 
                 record = await process_user_login(
-                    user, response, {}, request.firebase_token, request.device_id, http_request.headers
+                    user,
+                    response,
+                    {"password": rehashed_password} if rehashed_password else {},
+                    request.firebase_token,
+                    request.device_id,
+                    http_request.headers,
                 )
 
                 await plugin_manager.after_action(
@@ -456,7 +465,9 @@ async def login(response: Response, request: UserLoginRequest, http_request: Req
                 user_shortname=shortname,
             )
 
-        is_password_valid = password_hashing.verify_password(request.password or "", user.password or "")
+        is_password_valid, rehashed_password = await password_hashing.hashing_pool.verify_and_rehash(
+            request.password or "", user.password or ""
+        )
         if user and user.is_active and (request.invitation or is_password_valid):
             if (
                 request.invitation is None
@@ -482,6 +493,9 @@ async def login(response: Response, request: UserLoginRequest, http_request: Req
                     )
 
             await db.clear_failed_password_attempts(shortname)
+            if rehashed_password:
+                # Upgrade the hash to the current Argon2 parameters while the plain password is at hand
+                user_updates["password"] = rehashed_password
             record = await process_user_login(
                 user, response, user_updates, request.firebase_token, request.device_id, http_request.headers
             )
@@ -672,7 +686,7 @@ async def update_profile(request: Request, profile: core.Record, shortname=Depen
                     message="Wrong password have been provided!",
                 ),
             )
-        if not password_hashing.verify_password(profile.attributes["old_password"], user.password or ""):
+        if not await password_hashing.hashing_pool.verify(profile.attributes["old_password"], user.password or ""):
             raise api.Exception(
                 status.HTTP_401_UNAUTHORIZED,
                 api.Error(
@@ -1163,7 +1177,7 @@ async def user_reset(
 async def validate_password(password: str = Body(..., embed=True), shortname=Depends(JWTBearer())) -> api.Response:
     """Validate Password"""
     user = await db.load(MANAGEMENT_SPACE, USERS_SUBPATH, shortname, core.User, shortname)
-    if user and password_hashing.verify_password(password, user.password or ""):
+    if user and await password_hashing.hashing_pool.verify(password, user.password or ""):
         return api.Response(status=api.Status.success)
     else:
         raise api.Exception(
@@ -226,7 +226,7 @@ def check_user_validation(user, data, user_updates, invitation_token):
 
 async def set_user_profile(profile, profile_user, user):
     if profile_user.password:
-        user.password = password_hashing.hash_password(profile_user.password)
+        user.password = await password_hashing.hashing_pool.hash(profile_user.password)
         user.force_password_change = False
         # Clear the failed password attempts
         await db.clear_failed_password_attempts(profile.shortname)
@@ -1,5 +1,6 @@
 import io
 from abc import ABC, abstractmethod
+from collections.abc import AsyncGenerator
 from pathlib import Path
 from typing import Any, TypeVar
 
@@ -103,6 +104,10 @@ class BaseDataAdapter(ABC):
     async def query(self, query: api.Query, user_shortname: str | None = None) -> tuple[int, list[core.Record]]:
         pass
 
+    @abstractmethod
+    def stream_query(self, query: api.Query, user_shortname: str | None = None) -> AsyncGenerator[core.Record, None]:
+        pass
+
     @abstractmethod
     async def load(
         self,
@@ -383,6 +388,14 @@ class BaseDataAdapter(ABC):
     async def get_user_permissions(self, user_shortname: str) -> dict:
         pass
 
+    @abstractmethod
+    async def get_entries_acl(self, entries: list[tuple[str, str, str, str]]) -> dict[tuple[str, str, str, str], list[dict]]:
+        pass
+
+    @abstractmethod
+    async def get_acl_holders(self) -> set[str]:
+        pass
+
     @abstractmethod
     async def get_user_by_criteria(self, key: str, value: str) -> str | None:
         pass
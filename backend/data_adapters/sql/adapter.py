@@ -7,21 +7,39 @@ import os
 import shutil
 import sys
 import time
+from collections.abc import AsyncGenerator
 from contextlib import asynccontextmanager
 from copy import copy
-from datetime import datetime
+from datetime import datetime, timedelta
+from enum import Enum
 from pathlib import Path
 from sys import modules as sys_modules
 from typing import Any
-from uuid import uuid4
+from uuid import UUID, uuid4
 
 from fastapi import status
 from fastapi.logger import logger
 from jsonschema import Draft7Validator
-from sqlalchemy import URL, String, Text, bindparam, cast, literal, literal_column, or_
-from sqlalchemy.dialects.postgresql import insert
-from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
-from sqlalchemy.orm import defer, sessionmaker
+from sqlalchemy import (
+    URL,
+    String,
+    Text,
+    any_,
+    bindparam,
+    case,
+    cast,
+    exists,
+    literal,
+    literal_column,
+    or_,
+    true,
+    tuple_,
+)
+from sqlalchemy.dialects.postgresql import ARRAY, JSONB, TEXT, insert
+from sqlalchemy.exc import InterfaceError, OperationalError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session as OrmSession
+from sqlalchemy.orm import aliased, defer, load_only
 from sqlmodel import Boolean, Float, Integer, Session, col, delete, func, select, text, update
 from starlette.datastructures import UploadFile
 
@@ -30,23 +48,41 @@ import models.core as core
 from data_adapters.base_data_adapter import BaseDataAdapter, MetaChild
 from data_adapters.helpers import get_nested_value, trans_magic_words
 from data_adapters.sql.adapter_helpers import (
+    KEYSET_QUERY_TYPES,
+    SEARCH_RELEVANCE_SORT,
+    Explain,
+    decode_cursor_value,
+    decode_query_cursor,
+    encode_query_cursor,
     events_query,
     get_next_date_value,
+    is_case_free_prefix,
     is_date_time_value,
+    keyset_condition,
+    like_escape,
     # build_query_filter_for_allowed_field_values
     mysql_aggregate_functions,
     parse_search_expression,
+    plan_rows_estimate,
     postgres_aggregate_functions,
+    query_sort_signature,
+    random_query_signature,
+    random_sample_statement,
+    search_relevance,
+    search_tsquery_sql,
     set_results_from_aggregation,
     set_table_for_query,
     sqlite_aggregate_functions,
     subpath_checker,
     transform_keys_to_sql,
+    wildcard_like_pattern,
 )
 from data_adapters.sql.create_tables import (
     OTP,
+    AclUsers,
     Attachments,
     Entries,
+    EntryTags,
     Histories,
     Invitations,
     Locks,
@@ -54,13 +90,17 @@ from data_adapters.sql.create_tables import (
     Roles,
     Sessions,
     Spaces,
+    SubpathTagCounts,
     URLShorts,
     UserPermissionsCache,
     Users,
 )
+from data_adapters.sql.folder_indexes import FOLDER_INDEXES_SYNC_RETRY_SECS, index_usage, sync_folder_indexes
+from data_adapters.sql.permissions_cache import UserPermissionsLRU
+from data_adapters.sql.replicas import Replica, ReplicaPool, WriteTrackingSession, pool_stats
 from models.api import Error as API_Error
 from models.api import Exception as API_Exception
-from models.enums import LockAction, QueryType, ResourceType, SortType
+from models.enums import LockAction, QueryType, ResourceType, SortType, TotalMode
 from utils.helpers import (
     arr_remove_common,
     camel_case,
@@ -68,8 +108,10 @@ from utils.helpers import (
     resolve_schema_references,
 )
 from utils.internal_error_code import InternalErrorCode
-from utils.middleware import get_request_data
-from utils.password_hashing import hash_password, verify_password
+from utils.jq_engine import jq_engine
+from utils.middleware import clear_request_memo, get_request_data, get_request_memo, get_request_user
+from utils.password_hashing import hashing_pool, token_digest, verify_token_digest
+from utils.query_cache import public_query_cache
 from utils.query_policies_helper import generate_query_policies, get_user_query_policies
 from utils.settings import settings
 
@@ -225,6 +267,206 @@ def apply_acl_and_query_policies(statement, table, user_shortname, user_query_po
     return statement
 
 
+def query_keyset_keys(table, query: api.Query) -> list[tuple[Any, bool]] | None:
+    """
+    Sort keys, as (expression, nullable), of a query paged by keyset, ending with the uuid tie-breaker.
+    None when the query isn't paged by keyset: it has neither a sort nor a cursor, or its type doesn't return table rows.
+    """
+    if query.type not in KEYSET_QUERY_TYPES or not hasattr(table, "uuid"):
+        return None
+    if not query.sort_by and query.cursor is None:
+        return None
+
+    keys: list[tuple[Any, bool]] = []
+    if query.sort_by == SEARCH_RELEVANCE_SORT and hasattr(table, "search_vector"):
+        relevance = search_relevance(table, query)
+        if relevance is not None:
+            keys.append((relevance, False))
+    elif query.sort_by and "." in query.sort_by:
+        sort_expression = transform_keys_to_sql(
+            query.sort_by.replace("@", "", 1)
+            if query.sort_by.startswith("@")
+            else (f"payload.{query.sort_by}" if query.sort_by.startswith("body.") else query.sort_by)
+        )
+        keys.append(
+            (literal_column(f"CASE WHEN ({sort_expression}) ~ '^[0-9]+$' THEN ({sort_expression})::float END", Float), True)
+        )
+        keys.append((literal_column(f"({sort_expression})", Text), True))
+    elif query.sort_by:
+        sort_column = table.__table__.columns.get(query.sort_by)
+        if sort_column is None:
+            return None
+        keys.append((getattr(table, query.sort_by), sort_column.nullable))
+
+    keys.append((col(table.uuid), False))
+    return keys
+
+
+def query_projection(table, query: api.Query) -> tuple[list[str] | None, Any]:
+    """
+    Columns and payload expression narrowing what a listing query reads to what it returns:
+    the columns left by include_fields / exclude_fields and, without retrieve_json_payload, the payload minus its body.
+    `payload.body.<key>` entries include or exclude parts of the body. The payload expression, when not None,
+    replaces the payload column. (None, None) when the whole row is needed.
+    """
+    columns = table.__table__.columns
+    include_fields = [field.replace("attributes.", "", 1) for field in query.include_fields or []]
+    exclude_fields = [field.replace("attributes.", "", 1) for field in query.exclude_fields or []]
+    strip_body = "payload" in columns and not query.retrieve_json_payload and query.type != QueryType.attachments
+    if not include_fields and not exclude_fields and not strip_body:
+        return None, None
+
+    required = {"uuid", "shortname", "subpath", "resource_type", "space_name"}
+    if query.sort_by and query.sort_by in columns:
+        required.add(query.sort_by)
+    loaded = {column.name for column in columns if column.name not in ("media", "search_vector")}
+    if include_fields:
+        loaded &= required | {field.split(".", 1)[0] for field in include_fields}
+    loaded -= {field for field in exclude_fields if "." not in field} - required
+
+    payload_expression: Any = None
+    if "payload" in loaded:
+        payload = col(table.payload)
+        body_includes = [field.split(".")[2] for field in include_fields if field.startswith("payload.body.")]
+        body_excludes = [field.split(".")[2:] for field in exclude_fields if field.startswith("payload.body.")]
+        without_body = payload.op("-")(literal_column("'body'"))
+        if strip_body:
+            payload_expression = without_body.op("||")(literal_column("'{\"body\": null}'::jsonb"))
+        elif body_includes and "payload" not in include_fields:
+            body = func.jsonb_build_object(
+                *[
+                    arg
+                    for key in dict.fromkeys(body_includes)
+                    for arg in (literal(key, TEXT), payload.op("->")(literal_column("'body'")).op("->")(literal(key, TEXT)))
+                ]
+            )
+            payload_expression = without_body.op("||")(func.jsonb_build_object(literal_column("'body'"), body))
+        elif body_excludes:
+            payload_expression = payload
+            for path in body_excludes:
+                payload_expression = payload_expression.op("#-")(literal(["body", *path], ARRAY(TEXT)))
+        if payload_expression is not None:
+            loaded.discard("payload")
+
+    return sorted(loaded), payload_expression
+
+
+def parse_join_on(expr: str) -> list[tuple[str, bool, str, bool]]:
+    """(left path, left is array, right path, right is array) of each comma separated `left:right` condition"""
+    joins_list = []
+    for part in expr.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        parts = [p.strip() for p in part.split(":", 1)]
+        if len(parts) != 2:
+            raise ValueError(f"Invalid join_on expression: {expr}")
+        left, right = parts[0], parts[1]
+        _l_arr = left.endswith("[]")
+        _r_arr = right.endswith("[]")
+        if _l_arr:
+            left = left[:-2]
+        if _r_arr:
+            right = right[:-2]
+        joins_list.append((left, _l_arr, right, _r_arr))
+    return joins_list
+
+
+def join_record_values(rec: core.Record, path: str) -> list:
+    """Scalar values of the join path in a record, the items for list values"""
+    try:
+        if path in ("shortname", "resource_type", "subpath", "uuid"):
+            val = getattr(rec, path, None)
+        elif path == "space_name":
+            val = rec.attributes.get("space_name") if rec.attributes else None
+        else:
+            container = rec.attributes or {}
+            val = get_nested_value(container, path)
+
+        if val is None:
+            return []
+        if isinstance(val, list):
+            return [item for item in val if isinstance(item, (str, int, float, bool)) or item is None]
+        return [val]
+    except Exception as e:
+        logger.warning(
+            f"Skipping bad record value extraction for path '{path}' on record '{getattr(rec, 'shortname', '?')}': {e}"
+        )
+        return []
+
+
+def join_value_text(value: Any) -> str:
+    # The text Postgres gives the value, for the comparisons of the SQL joins
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    return str(value.value) if isinstance(value, Enum) else str(value)
+
+
+def join_right_condition(table, path: str, left_values) -> Any:
+    """
+    SQL condition of a right record of a join matching one of `left_values`, a select of the left values as text.
+    Like join_record_values, the items of a JSON array are matched one by one. None when the path can't be compared
+    in SQL with the values the records give (e.g. subpath, datetimes or non-column attributes).
+    """
+    name, _, rest = path.partition(".")
+    if name == "subpath" or name not in table.__table__.columns:
+        return None
+    column = table.__table__.columns[name]
+    if isinstance(column.type, JSONB):
+        value = column.op("#>")(literal(rest.split("."), ARRAY(TEXT))) if rest else column
+        items = func.jsonb_array_elements_text(
+            case((func.jsonb_typeof(value) == "array", value), else_=func.jsonb_build_array(value))
+        ).table_valued("value")
+        return exists(select(literal(1)).select_from(items).where(items.c.value.in_(left_values)))
+    try:
+        # AutoString and GUID decorate the types that tell the python type
+        python_type = getattr(column.type, "impl_instance", column.type).python_type
+    except NotImplementedError:
+        return None
+    if rest or not issubclass(python_type, (str, int, UUID)):
+        return None
+    return cast(column, TEXT).in_(left_values)
+
+
+def apply_query_projection(statement, table, query: api.Query) -> Any:
+    """
+    Selects the columns of a listing statement left by query_projection, as plain rows rather than ORM instances,
+    and adds its payload expression, if any, as the projected_payload column.
+    """
+    loaded_columns, payload_expression = query_projection(table, query)
+    columns = table.__table__.columns
+    if loaded_columns is None:
+        loaded_columns = [column.name for column in columns if column.name not in ("media", "search_vector")]
+    statement = statement.with_only_columns(*[columns[name] for name in loaded_columns], maintain_column_froms=True)
+    if payload_expression is not None:
+        statement = statement.add_columns(payload_expression.label("projected_payload"))
+    return statement
+
+
+_ROW_RECORD_KEYS = frozenset(
+    ("uuid", "resource_type", "shortname", "subpath", "projected_payload", "total_count", "random_leg")
+)
+
+
+def record_from_row(row: Any, resource_type: ResourceType | None = None) -> core.Record:
+    """
+    core.Record of a row mapping selected by apply_query_projection, the same the table's to_record gives.
+    It's built with model_construct, skipping the validation of data the database already holds, and its
+    attributes are the row values themselves. `resource_type` is for the tables without that column.
+    """
+    attributes = {key: value for key, value in row.items() if key not in _ROW_RECORD_KEYS}
+    if "projected_payload" in row:
+        attributes["payload"] = row["projected_payload"]
+    subpath = row["subpath"]
+    return core.Record.model_construct(
+        resource_type=ResourceType(row.get("resource_type", resource_type)),
+        uuid=row["uuid"],
+        shortname=row["shortname"],
+        subpath=subpath if subpath == "/" else subpath.strip("/"),
+        attributes=attributes,
+    )
+
+
 async def set_sql_statement_from_query(table, statement, query, is_for_count):
     try:
         if query.type == QueryType.attachments_aggregation and not is_for_count:
@@ -233,14 +475,6 @@ async def set_sql_statement_from_query(table, statement, query, is_for_count):
         if query.type == QueryType.aggregation and not is_for_count:
             statement = query_aggregation(table, query)
 
-        if query.type == QueryType.tags and not is_for_count:
-            if query.retrieve_json_payload:
-                statement = select(
-                    func.jsonb_array_elements_text(table.tags).label("tag"), func.count("*").label("count")
-                ).group_by("tag")
-            else:
-                statement = select(func.jsonb_array_elements_text(table.tags).label("tag")).distinct()
-
     except Exception as e:
         print("[!query]", e)
         raise api.Exception(
@@ -258,27 +492,34 @@ async def set_sql_statement_from_query(table, statement, query, is_for_count):
         if query.exact_subpath:
             statement = statement.where(table.subpath == query.subpath)
         else:
-            # Use bind parameter for the ILIKE pattern to avoid string interpolation
-            subpath_like = f"{query.subpath}/%".replace("//", "/")
+            # Prefix-anchored LIKE, served by the subpath text_pattern_ops index and implying the predicates of the
+            # folder indexes. It matches case-sensitively, unlike the former ILIKE, as the subpath equality above
+            # and the permission subpaths already did
+            subpath_like = like_escape(f"{query.subpath}/".replace("//", "/")) + "%"
             statement = statement.where(
-                or_(table.subpath == query.subpath, text("subpath ILIKE :subpath_like").bindparams(bindparam("subpath_like")))
+                or_(table.subpath == query.subpath, text("subpath LIKE :subpath_like").bindparams(bindparam("subpath_like")))
             ).params(subpath_like=subpath_like)
 
     if query.search:
         _search_has_operators = "(" in query.search or ")" in query.search
         if not query.search.startswith("@") and not query.search.startswith("-") and not _search_has_operators:
-            try:
-                table_columns = {c.name: c for c in table.__table__.columns}  # type: ignore[attr-defined]
-                p_parts = [f"COALESCE({col_name}::text, '')" for col_name in table_columns]
-                p = " || ' ' || ".join(p_parts) if p_parts else "''"
-            except Exception:
-                p = "shortname || ' ' || tags || ' ' || displayname || ' ' || description || ' ' || payload"
-                if table is Users:
-                    p += " || ' ' || COALESCE(email, '') || ' ' || COALESCE(msisdn, '') || ' ' || roles"
-                if table is Roles:
-                    p += " || ' ' || permissions"
-            # Parameterize search string
-            statement = statement.where(text("(" + p + ") ILIKE :search")).params(search=f"%{query.search}%")
+            if hasattr(table, "search_vector"):
+                statement = statement.where(text(f"search_vector @@ {search_tsquery_sql('search')}")).params(
+                    search=query.search, search_space=query.space_name
+                )
+            else:
+                try:
+                    table_columns = {c.name: c for c in table.__table__.columns}  # type: ignore[attr-defined]
+                    p_parts = [f"COALESCE({col_name}::text, '')" for col_name in table_columns]
+                    p = " || ' ' || ".join(p_parts) if p_parts else "''"
+                except Exception:
+                    p = "shortname || ' ' || tags || ' ' || displayname || ' ' || description || ' ' || payload"
+                    if table is Users:
+                        p += " || ' ' || COALESCE(email, '') || ' ' || COALESCE(msisdn, '') || ' ' || roles"
+                    if table is Roles:
+                        p += " || ' ' || permissions"
+                # Parameterize search string
+                statement = statement.where(text("(" + p + ") ILIKE :search")).params(search=f"%{query.search}%")
         else:
             search_groups = parse_search_expression(query.search)
             bind_params = {}
@@ -632,6 +873,13 @@ async def set_sql_statement_from_query(table, statement, query, is_for_count):
                                         bool_condition = f"(jsonb_typeof(payload::jsonb->{payload_path}) = 'boolean' AND ({_payload_text_extract})::boolean = CAST(:{p_bool} AS boolean))"
                                         string_condition = f"(jsonb_typeof(payload::jsonb->{payload_path}) = 'string' AND ({_payload_text_extract})::boolean = CAST(:{p_bool} AS boolean))"
                                         conditions.append(f"({bool_condition} OR {string_condition})")
+                            elif "*" in value and not comparison_operator:
+                                p_pat = f"s_p_{param_counter}"
+                                param_counter += 1
+                                bind_params[p_pat] = wildcard_like_pattern(value)
+                                # Served by the trigram index of the path when it is in trigram_payload_paths
+                                string_condition = f"jsonb_typeof(payload::jsonb->{payload_path}) = 'string' AND {_payload_text_extract} ILIKE :{p_pat}"
+                                conditions.append(f"(NOT ({string_condition}))" if negative else f"({string_condition})")
                             else:
                                 is_numeric = False
                                 try:
@@ -923,15 +1171,16 @@ async def set_sql_statement_from_query(table, statement, query, is_for_count):
                                         conditions = []
                                         for value in values:
                                             if "*" in value:
-                                                pattern = value.replace("*", "%")
                                                 p_pat = f"s_p_{param_counter}"
                                                 param_counter += 1
-                                                bind_params[p_pat] = pattern
+                                                bind_params[p_pat] = wildcard_like_pattern(value)
+                                                # LIKE can use the text_pattern_ops index, ILIKE the trigram one
+                                                like_operator = "LIKE" if is_case_free_prefix(value) else "ILIKE"
                                                 use_not_equal = negative or comparison_operator == "!"
                                                 if use_not_equal:
-                                                    conditions.append(f"{field} NOT ILIKE :{p_pat}")
+                                                    conditions.append(f"{field} NOT {like_operator} :{p_pat}")
                                                 else:
-                                                    conditions.append(f"{field} ILIKE :{p_pat}")
+                                                    conditions.append(f"{field} {like_operator} :{p_pat}")
                                             else:
                                                 p_val = f"s_p_{param_counter}"
                                                 param_counter += 1
@@ -951,8 +1200,13 @@ async def set_sql_statement_from_query(table, statement, query, is_for_count):
                 for _text_term in _group.get("text_terms", []):
                     _p_val = f"s_p_{param_counter}"
                     param_counter += 1
-                    bind_params[_p_val] = f"%{_text_term}%"
-                    field_conditions.append(f"({_text_concat}) ILIKE :{_p_val}")
+                    if hasattr(table, "search_vector"):
+                        bind_params[_p_val] = _text_term
+                        bind_params["search_space"] = query.space_name
+                        field_conditions.append(f"search_vector @@ {search_tsquery_sql(_p_val)}")
+                    else:
+                        bind_params[_p_val] = f"%{_text_term}%"
+                        field_conditions.append(f"({_text_concat}) ILIKE :{_p_val}")
 
                 if field_conditions:
                     all_group_sql.append("(" + " AND ".join(field_conditions) + ")")
@@ -980,15 +1234,38 @@ async def set_sql_statement_from_query(table, statement, query, is_for_count):
     if query.filter_types:
         statement = statement.where(col(table.resource_type).in_(query.filter_types))
     if query.filter_tags:
-        statement = statement.where(col(table.tags).in_(query.filter_tags))
+        if table is Entries:
+            tagged = select(col(EntryTags.entry_uuid)).where(col(EntryTags.tag).in_(query.filter_tags))
+            if query.space_name:
+                tagged = tagged.where(col(EntryTags.space_name) == query.space_name)
+            statement = statement.where(col(table.uuid).in_(tagged))
+        else:
+            statement = statement.where(col(table.tags).op("?|")(literal(query.filter_tags, ARRAY(TEXT))))
     if query.from_date:
         statement = statement.where(table.created_at >= query.from_date)
     if query.to_date:
         statement = statement.where(table.created_at <= query.to_date)
 
+    keyset_keys = None
     try:
         if not is_for_count and query.sort_by:
             query.sort_by = str(query.sort_by).replace("attributes.", "")
+        if not is_for_count:
+            keyset_keys = query_keyset_keys(table, query)
+
+        if keyset_keys is not None:
+            descending = query.sort_type == SortType.descending
+            if query.cursor:
+                values, last_uuid = decode_query_cursor(query.cursor, query_sort_signature(query))
+                if len(values) != len(keyset_keys) - 1:
+                    raise api.Exception(
+                        status.HTTP_400_BAD_REQUEST,
+                        api.Error(type="request", code=InternalErrorCode.INVALID_DATA, message="Invalid query cursor"),
+                    )
+                values = [decode_cursor_value(key, value) for (key, _), value in zip(keyset_keys[:-1], values, strict=True)]
+                statement = statement.where(keyset_condition(keyset_keys, [*values, last_uuid], descending))
+            statement = statement.order_by(*[key.desc() if descending else key for key, _ in keyset_keys])
+        elif not is_for_count and query.sort_by:
             if "." in query.sort_by:
                 # Normalize JSON path for sorting as well (handle leading '@' and body.* shortcut)
                 sort_expression = transform_keys_to_sql(
@@ -1005,46 +1282,79 @@ async def set_sql_statement_from_query(table, statement, query, is_for_count):
                 if query.sort_type == SortType.descending:
                     statement = statement.order_by(getattr(table, query.sort_by).desc())
 
+    except api.Exception as e:
+        raise e
     except Exception as e:
         print("[!set_sql_statement_from_query]", e)
 
     if not is_for_count:
-        if query.offset:
+        # The cursor already positions the page, an offset on top of it would skip rows
+        if query.offset and not (keyset_keys is not None and query.cursor):
             statement = statement.offset(query.offset)
 
         statement = statement.limit(query.limit)
 
     if query.type == QueryType.tags and not is_for_count and hasattr(table, "tags"):
-        if query.retrieve_json_payload:
-            statement = (
-                select(func.jsonb_array_elements_text(col(table.tags)).label("tag"), func.count("*").label("count"))
-                .where(
-                    col(table.uuid).in_(
-                        select(col(table.uuid)).where(statement.whereclause)  # type: ignore
-                    )
-                )
-                .group_by("tag")
-            )
+        # The whole filtered statement, not only its WHERE clause, so the parameters bound by .params() follow
+        matched = statement.with_only_columns(col(table.uuid), maintain_column_froms=True)
+        matched = matched.order_by(None).limit(None).offset(None)
+        if table is Entries:
+            statement = select(col(EntryTags.tag)).where(col(EntryTags.entry_uuid).in_(matched))
         else:
-            statement = (
-                select(func.jsonb_array_elements_text(col(table.tags)).label("tag"))
-                .where(
-                    col(table.uuid).in_(
-                        select(col(table.uuid)).where(statement.whereclause)  # type: ignore
-                    )
-                )
-                .distinct()
+            statement = select(func.jsonb_array_elements_text(col(table.tags)).label("tag")).where(
+                col(table.uuid).in_(matched)
             )
+        if query.retrieve_json_payload:
+            statement = statement.add_columns(func.count().label("count")).group_by("tag")
+        else:
+            statement = statement.distinct()
 
     return statement
 
 
+def tag_counts_statement(table, query: api.Query) -> Any:
+    """
+    Tags query served by the subpath_tag_counts counters, reading a row per subpath, resource type and tag instead
+    of the tags of every entry. None when the query filters entries on more than their subpath and resource type.
+    """
+    if (
+        table is not Entries
+        or not query.space_name
+        or query.search
+        or query.filter_shortnames
+        or query.filter_tags
+        or query.from_date
+        or query.to_date
+        or any(name != "meta" for name in query.filter_schema_names or [])
+    ):
+        return None
+
+    count = func.sum(col(SubpathTagCounts.count))
+    statement = select(col(SubpathTagCounts.tag), count.label("count")).where(
+        col(SubpathTagCounts.space_name) == query.space_name
+    )
+    if query.exact_subpath:
+        statement = statement.where(col(SubpathTagCounts.subpath) == query.subpath)
+    elif query.subpath != "/":
+        statement = statement.where(
+            or_(
+                col(SubpathTagCounts.subpath) == query.subpath,
+                col(SubpathTagCounts.subpath).like(like_escape(f"{query.subpath}/") + "%"),
+            )
+        )
+    if query.filter_types:
+        statement = statement.where(col(SubpathTagCounts.resource_type).in_(query.filter_types))
+    return statement.group_by(col(SubpathTagCounts.tag)).having(count > 0)
+
+
 class SQLAdapter(BaseDataAdapter):
     _engine = None
     _async_session_factory = None
+    _replicas: ReplicaPool | None = None
     session: Session
-    async_session: sessionmaker
+    async_session: async_sessionmaker
     engine: Any
+    permissions_cache: UserPermissionsLRU
 
     def locators_query(self, query: api.Query) -> tuple[int, list[core.Locator]]:
         locators: list[core.Locator] = []
@@ -1138,10 +1448,45 @@ class SQLAdapter(BaseDataAdapter):
                 pool_timeout=settings.database_pool_timeout,
                 pool_recycle=settings.database_pool_recycle,
             )
+            if settings.database_replica_hosts and "sqlite" not in settings.database_driver:
+                replicas = []
+                for replica_host in settings.database_replica_hosts:
+                    host, _, port = replica_host.partition(":")
+                    replica_url = url.set(host=host, port=int(port) if port else settings.database_port)
+                    replica_engine = create_async_engine(
+                        replica_url,
+                        echo=False,
+                        pool_pre_ping=True,
+                        pool_size=settings.database_pool_size,
+                        max_overflow=settings.database_max_overflow,
+                        pool_timeout=settings.database_pool_timeout,
+                        pool_recycle=settings.database_pool_recycle,
+                    )
+                    replicas.append(Replica(replica_host, replica_engine))
+                SQLAdapter._replicas = ReplicaPool(
+                    replicas,
+                    strategy=settings.database_replica_strategy,
+                    read_your_writes=settings.database_replica_read_your_writes,
+                    eject_secs=settings.database_replica_eject_secs,
+                )
         self.engine = SQLAdapter._engine
+        self.replicas = SQLAdapter._replicas
+        self.permissions_cache = UserPermissionsLRU(settings.permissions_cache_size)
+        self.acl_holders: set[str] | None = None
+        self.acl_holders_version = -1
+        self.acl_users_version = 0
+        self.permissions_version: int = 0
+        self.permissions_version_read_at: float | None = None
+        self._folder_indexes_lock = asyncio.Lock()
+        self._background_tasks: set[asyncio.Task] = set()
         try:
             if SQLAdapter._async_session_factory is None:
-                SQLAdapter._async_session_factory = sessionmaker(self.engine, class_=AsyncSession, expire_on_commit=False)  # type: ignore
+                # With replicas, the primary sessions flag their writes for the read-your-writes window
+                SQLAdapter._async_session_factory = async_sessionmaker(
+                    self.engine,
+                    expire_on_commit=False,
+                    sync_session_class=WriteTrackingSession if self.replicas else OrmSession,
+                )
             self.async_session = SQLAdapter._async_session_factory
         except Exception as e:
             print("[!FATAL]", e)
@@ -1155,14 +1500,84 @@ class SQLAdapter(BaseDataAdapter):
             print("[!FATAL]", e)
             sys.exit(127)
 
+    async def sync_folder_indexes(self, space_name: str | None = None) -> dict[str, list[str]]:
+        """
+        Create and drop the payload indexes declared by the folders, see data_adapters.sql.folder_indexes.
+        Waits for the syncs running in other processes to end first.
+        """
+        async with self._folder_indexes_lock, self.engine.connect() as conn:
+            autocommit_conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+            while True:
+                report: dict[str, list[str]] | None = await autocommit_conn.run_sync(sync_folder_indexes, space_name)  # type: ignore
+                if report is not None:
+                    return report
+                await asyncio.sleep(FOLDER_INDEXES_SYNC_RETRY_SECS)
+
+    def schedule_folder_indexes_sync(self, space_name: str) -> None:
+        if not settings.folder_indexes_auto_sync or "sqlite" in settings.database_driver:
+            return
+
+        def _done(task: asyncio.Task) -> None:
+            self._background_tasks.discard(task)
+            if not task.cancelled() and task.exception() is not None:
+                logger.warning(f"Folder indexes sync of {space_name} failed: {task.exception()}")
+
+        task = asyncio.create_task(self.sync_folder_indexes(space_name))
+        self._background_tasks.add(task)
+        task.add_done_callback(_done)
+
+    def invalidate_public_queries(self, space_name: str, subpath: str, shortname: str, meta: core.Meta) -> None:
+        """Stale the cached anonymous queries a write to the entry may change"""
+        if not public_query_cache.enabled:
+            return
+        if isinstance(meta, (core.Space, core.Role, core.Permission)) or (
+            isinstance(meta, core.User) and meta.shortname == "anonymous"
+        ):
+            public_query_cache.clear()
+        else:
+            # The entry path covers its attachments, and the entries under it for folders
+            entry_path = f"{subpath}/{shortname}".replace("//", "/")
+            public_query_cache.invalidate(space_name, entry_path, subtree=isinstance(meta, core.Folder))
+
+    async def get_index_usage(self) -> list[dict]:
+        async with self.engine.connect() as conn:
+            return await conn.run_sync(index_usage)  # type: ignore
+
+    def database_stats(self) -> dict:
+        """Connection pool usage of the primary engine and of the read replicas"""
+        stats: dict = {"primary": {"pool": pool_stats(self.engine)}}
+        if self.replicas:
+            stats.update(self.replicas.stats())
+        return stats
+
     @asynccontextmanager
-    async def get_session(self):
-        async_session = self.async_session()
+    async def get_session(self, read_only: bool = False):
+        """
+        Session committed on exit. `read_only` sessions run on a read replica when some are configured, see
+        data_adapters.sql.replicas, and must not write.
+        """
+        replica = self.replicas.pick(get_request_user()) if read_only and self.replicas else None
+        if replica is not None:
+            async_session = replica.session_factory()
+            try:
+                await async_session.connection()
+            except (OperationalError, InterfaceError, OSError) as e:
+                logger.warning(f"Read replica {replica.name} is out of rotation: {e}")
+                await async_session.close()  # type: ignore
+                self.replicas.eject(replica)  # type: ignore
+                replica = None
+                async_session = self.async_session()
+        else:
+            async_session = self.async_session()
         try:
             yield async_session
             await async_session.commit()
-        except Exception:
+            if replica is None and self.replicas and async_session.sync_session.info.get("wrote"):
+                self.replicas.note_write(get_request_user())
+        except Exception as e:
             await async_session.rollback()
+            if replica is not None and isinstance(e, (OperationalError, InterfaceError)):
+                self.replicas.eject(replica)  # type: ignore
             raise
         finally:
             await async_session.close()  # type: ignore
@@ -1230,51 +1645,98 @@ class SQLAdapter(BaseDataAdapter):
         filter_shortnames: list | None = None,
         retrieve_json_payload: bool = False,
     ) -> dict:
-        attachments_dict: dict[ResourceType, list] = {}
-        async with self.get_session() as session:
-            if not subpath.startswith("/"):
-                subpath = f"/{subpath}"
+        if not subpath.startswith("/"):
+            subpath = f"/{subpath}"
+
+        if str(settings.spaces_folder) in str(attachments_path):
+            attachments_path = attachments_path.relative_to(settings.spaces_folder)
+        space_name = attachments_path.parts[0]
+        shortname = attachments_path.parts[-1]
+        parent_path = f"{subpath}/{shortname}".replace("//", "/")
+        attachments = await self.get_entries_attachments(
+            space_name,
+            [parent_path],
+            filter_types=filter_types,
+            include_fields=include_fields,
+            filter_shortnames=filter_shortnames,
+        )
+        return attachments.get(parent_path, {})
 
-            if str(settings.spaces_folder) in str(attachments_path):
-                attachments_path = attachments_path.relative_to(settings.spaces_folder)
-            space_name = attachments_path.parts[0]
-            shortname = attachments_path.parts[-1]
+    async def get_entries_attachments(
+        self,
+        space_name: str,
+        parent_paths: list[str],
+        filter_types: list | None = None,
+        include_fields: list | None = None,
+        filter_shortnames: list | None = None,
+        limit_per_type: int = 0,
+    ) -> dict[str, dict[ResourceType, list]]:
+        """
+        Attachments of many entries in one query, grouped by the entry path (`subpath/shortname`) then resource type.
+        `media` is never loaded, `include_fields` narrows the loaded attributes and `limit_per_type` keeps the first
+        (oldest) attachments of every type of an entry.
+        """
+        grouped: dict[str, dict[ResourceType, list]] = {}
+        if not parent_paths:
+            return grouped
+
+        conditions = [
+            col(Attachments.space_name) == space_name,
+            col(Attachments.subpath) == any_(cast(literal(list(set(parent_paths))), ARRAY(TEXT))),
+        ]
+        if filter_types:
+            conditions.append(col(Attachments.resource_type).in_(filter_types))
+        if filter_shortnames:
+            conditions.append(col(Attachments.shortname).in_(filter_shortnames))
+
+        statement = select(Attachments).where(*conditions)
+        if limit_per_type > 0:
+            ranked = (
+                select(
+                    col(Attachments.uuid).label("uuid"),
+                    func.row_number()
+                    .over(
+                        partition_by=(col(Attachments.subpath), col(Attachments.resource_type)),
+                        order_by=(col(Attachments.created_at), col(Attachments.shortname)),
+                    )
+                    .label("type_rank"),
+                )
+                .where(*conditions)
+                .subquery()
+            )
             statement = (
                 select(Attachments)
-                .where(Attachments.space_name == space_name)
-                .where(Attachments.subpath == f"{subpath}/{shortname}".replace("//", "/"))
+                .join(ranked, ranked.c.uuid == col(Attachments.uuid))
+                .where(ranked.c.type_rank <= limit_per_type)
             )
-            results = list((await session.execute(statement)).all())
-
-            if len(results) == 0:
-                return attachments_dict
-
-            for _idx, item in enumerate(results):
-                item = item[0]
-                attachment_record = Attachments.model_validate(item)
-                attachment_json = attachment_record.model_dump()
-                attachment = {
-                    "resource_type": attachment_json["resource_type"],
-                    "uuid": attachment_json["uuid"],
-                    "shortname": attachment_json["shortname"],
-                    "subpath": "/".join(attachment_json["subpath"].split("/")[:-1]),  # join(),
-                }
-                del attachment_json["resource_type"]
-                del attachment_json["uuid"]
-                del attachment_json["media"]
-                del attachment_json["shortname"]
-                del attachment_json["subpath"]
-                del attachment_json["relationships"]
-                del attachment_json["acl"]
-                del attachment_json["space_name"]
-                attachment["attributes"] = {**attachment_json}
-                key = ResourceType(attachment_record.resource_type)
-                if key in attachments_dict:
-                    attachments_dict[key].append(attachment)
-                else:
-                    attachments_dict[key] = [attachment]
-
-        return attachments_dict
+        statement = statement.order_by(col(Attachments.created_at), col(Attachments.shortname))
+
+        identity_fields = ["uuid", "shortname", "subpath", "resource_type"]
+        if include_fields:
+            loaded_fields = identity_fields + [
+                field for field in include_fields if field in Attachments.__table__.columns and field != "media"  # type: ignore
+            ]
+            statement = statement.options(load_only(*[getattr(Attachments, field) for field in loaded_fields]))
+        else:
+            statement = statement.options(defer(Attachments.media))  # type: ignore
+
+        async with self.get_session(read_only=True) as session:
+            items = (await session.execute(statement)).scalars().all()
+
+        hidden_fields = {"_sa_instance_state", "media", "relationships", "acl", "space_name"}
+        for item in items:
+            attributes = {
+                key: value for key, value in item.__dict__.items() if key not in hidden_fields and key not in identity_fields
+            }
+            attachment = {
+                "resource_type": item.resource_type,
+                "uuid": item.uuid,
+                "shortname": item.shortname,
+                "subpath": "/".join(item.subpath.split("/")[:-1]),
+                "attributes": attributes,
+            }
+            grouped.setdefault(item.subpath, {}).setdefault(ResourceType(item.resource_type), []).append(attachment)
+        return grouped
 
     def payload_path(
         self,
@@ -1416,16 +1878,17 @@ class SQLAdapter(BaseDataAdapter):
             except Exception as _:  # type: ignore
                 return None
 
-    async def query(self, query: api.Query, user_shortname: str | None = None) -> tuple[int, list[core.Record]]:
-        total: int
-        results: list
-
+    async def _query_scope(self, query: api.Query, user_shortname: str) -> tuple[Any, Any, list[str]] | None:
+        """
+        Normalizes the query subpath, resolves the user's query policies and folds the filter_fields_values of their
+        permissions into query.search. Returns the queried table, its base select and the policies, or None when no
+        policy of the user covers the query.
+        """
         if not query.subpath.startswith("/"):
             query.subpath = f"/{query.subpath}"
         if query.subpath == "//":
             query.subpath = "/"
 
-        user_shortname = user_shortname if user_shortname else "anonymous"
         if user_shortname == "anonymous" and query.type in [QueryType.history, QueryType.events]:
             raise api.Exception(
                 status.HTTP_401_UNAUTHORIZED,
@@ -1445,7 +1908,7 @@ class SQLAdapter(BaseDataAdapter):
             user_query_policies.extend(r)
 
         if len(user_query_policies) == 0:
-            return 0, []
+            return None
 
         if query.type in [QueryType.attachments, QueryType.attachments_aggregation]:
             table = Attachments
@@ -1453,6 +1916,8 @@ class SQLAdapter(BaseDataAdapter):
         else:
             table = set_table_for_query(query)
             statement = select(table)
+            if hasattr(table, "search_vector"):
+                statement = statement.options(defer(table.search_vector))  # type: ignore
 
         user_permissions = await self.get_user_permissions(user_shortname)
         filtered_policies = []
@@ -1492,6 +1957,19 @@ class SQLAdapter(BaseDataAdapter):
                     seen.add(p)
                     deduped_parts.append(p)
             query.search = " ".join(deduped_parts)
+
+        return table, statement, user_query_policies
+
+    async def query(self, query: api.Query, user_shortname: str | None = None) -> tuple[int, list[core.Record]]:
+        total: int
+        results: list
+
+        user_shortname = user_shortname if user_shortname else "anonymous"
+        with query.phase("policies"):
+            scope = await self._query_scope(query, user_shortname)
+        if scope is None:
+            return 0, []
+        table, statement, user_query_policies = scope
         statement_total = select(func.count(col(table.uuid)))
 
         if query and query.type == QueryType.events:
@@ -1503,9 +1981,13 @@ class SQLAdapter(BaseDataAdapter):
 
         if query and query.type == QueryType.tags:
             try:
-                statement = await set_sql_statement_from_query(table, statement, query, False)
+                counters = tag_counts_statement(table, query)
+                if counters is None:
+                    statement = await set_sql_statement_from_query(table, statement, query, False)
+                else:
+                    statement = counters
                 statement_total = await set_sql_statement_from_query(table, statement_total, query, True)
-                async with self.get_session() as session:
+                async with self.get_session(read_only=True) as session:
                     results = list((await session.execute(statement)).all())
                     if len(results) == 0:
                         return 0, []
@@ -1523,9 +2005,11 @@ class SQLAdapter(BaseDataAdapter):
                     for result in results:
                         if result and len(result) > 0 and result[0]:
                             tags.append(result[0])
-                async with self.get_session() as session:
-                    _total = (await session.execute(statement_total)).one()
-                    total = int(_total[0])
+                total = -1
+                if query.effective_total_mode != TotalMode.none:
+                    async with self.get_session(read_only=True) as session:
+                        _total = (await session.execute(statement_total)).one()
+                        total = int(_total[0])
 
                 attributes = {"tags": tags}
                 if query.retrieve_json_payload and tag_counts:
@@ -1561,16 +2045,39 @@ class SQLAdapter(BaseDataAdapter):
                 subq = statement_total.subquery()
                 statement_total = select(func.sum(subq.c["count"]).label("total_count"))
 
-            async with self.get_session() as session:
-                if query.retrieve_total:
-                    try:
-                        _total = (await session.execute(statement_total)).one()
-                        total = int(_total[0])
-                    except Exception as e:
-                        logger.warning(f"failed to retrieve total count {e}")
-                        total = -1
-                else:
-                    total = -1
+            total_mode = query.effective_total_mode
+            is_listing = query.type in KEYSET_QUERY_TYPES and not is_fetching_spaces
+            # The window count runs over the page's own WHERE, a cursor condition would make it partial
+            use_window_total = (
+                total_mode == TotalMode.exact
+                and is_listing
+                and not query.cursor
+                and query.limit <= settings.query_window_total_limit
+            )
+            is_random = query.type == QueryType.random
+            if is_listing or is_random:
+                statement = apply_query_projection(statement, table, query)
+            if is_random:
+                statement = random_sample_statement(statement, table, query)
+            if use_window_total:
+                statement = statement.add_columns(func.count().over().label("total_count"))  # type: ignore
+
+            estimated = total_mode == TotalMode.estimated and (is_listing or is_random)
+            counted = total_mode != TotalMode.none and not use_window_total and not estimated
+            default_resource_type = ResourceType.history if table is Histories else None
+            last_row: Any = None
+            async with self.get_session(read_only=True) as session:
+                total = -1
+                with query.phase("count_query"):
+                    if estimated:
+                        total = await self._estimate_query_total(session, table, statement_total)
+                    elif counted:
+                        try:
+                            _total = (await session.execute(statement_total)).one()
+                            total = int(_total[0])
+                        except Exception as e:
+                            logger.warning(f"failed to retrieve total count {e}")
+                            total = -1
                 if query.type == QueryType.counters:
                     results = list((await session.execute(statement)).all())
                     return total, results
@@ -1594,44 +2101,84 @@ class SQLAdapter(BaseDataAdapter):
                 elif query.type == QueryType.aggregation:
                     results = list((await session.execute(statement)).all())
                     await session.close()
+                elif is_listing or is_random:
+                    results = []
+                    if use_window_total:
+                        total = 0
+                    with query.phase("page_query"):
+                        page = await session.execute(statement)
+                    with query.phase("hydration"):
+                        for last_row in page.mappings():
+                            if use_window_total:
+                                total = int(last_row["total_count"])
+                            results.append(record_from_row(last_row, default_resource_type))
+                    await session.close()
                 else:
                     # Non-aggregation: fetch ORM instances directly
                     results = []
-                    cursor = (await session.execute(statement)).scalars()
-                    for row in cursor:
-                        try:
-                            _ = row.shortname
-                            results.append(row)
-                        except Exception as e:
-                            logger.warning(f"skipping row due an error: {e}")
+                    with query.phase("page_query"):
+                        page = await session.execute(statement)
+                    with query.phase("hydration"):
+                        for row in page.scalars():
+                            try:
+                                _ = row.shortname
+                                results.append(row)
+                            except Exception as e:
+                                logger.warning(f"skipping row due an error: {e}")
                     await session.close()
 
+            if query.profile is not None:
+                query.profile["statements"]["page"] = await self._explain_statement(statement)
+                if counted:
+                    query.profile["statements"]["count"] = await self._explain_statement(statement_total)
+
+            # A first page that isn't full holds every matching row
+            if (
+                total_mode == TotalMode.estimated
+                and is_listing
+                and not query.offset
+                and not query.cursor
+                and len(results) < query.limit
+            ):
+                total = len(results)
+
             if is_fetching_spaces:
                 from utils.access_control import access_control
 
                 _user = user_shortname if user_shortname else "anonymous"
-                results = [
-                    r
-                    for r in results
-                    if await access_control.check_access(
-                        user_shortname=_user,
-                        space_name=r.shortname,
-                        subpath="/",
-                        resource_type=ResourceType.space,
-                        action_type=core.ActionType.query,
-                        entry_shortname=r.shortname,
-                    )
-                ]
+                allowed = await access_control.check_access_many(
+                    _user,
+                    [
+                        {
+                            "space_name": r.shortname,
+                            "subpath": "/",
+                            "resource_type": ResourceType.space,
+                            "action_type": core.ActionType.query,
+                            "entry_shortname": r.shortname,
+                        }
+                        for r in results
+                    ],
+                )
+                results = [r for r, is_allowed in zip(results, allowed, strict=True) if is_allowed]
             if len(results) == 0:
                 return 0, []
 
-            results = await self._set_query_final_results(query, results)
+            if is_listing and len(results) >= query.limit:
+                query.next_cursor = await self._next_query_cursor(table, query, last_row)
+            elif is_random and query.seed is not None and len(results) >= query.limit:
+                query.next_cursor = encode_query_cursor(
+                    random_query_signature(query), [last_row["random_leg"]], last_row["uuid"]
+                )
+
+            with query.phase("final_results"):
+                results = await self._set_query_final_results(query, results)
 
             if getattr(query, "join", None):
                 try:
-                    results = await self._apply_client_joins(results, query.join, user_shortname or "anonymous")  # type: ignore
+                    with query.phase("joins"):
+                        results = await self._apply_joins(results, query.join, user_shortname or "anonymous")  # type: ignore
                 except Exception as e:
-                    print("[!client_join]", e)
+                    print("[!join]", e)
 
         except Exception as e:
             print("[!!query]", e)
@@ -1645,64 +2192,99 @@ class SQLAdapter(BaseDataAdapter):
             ) from e
         return total, results
 
-    async def _apply_client_joins(
-        self, base_records: list[core.Record], joins: list[api.JoinQuery], user_shortname: str
-    ) -> list[core.Record]:
-        def parse_join_on(expr: str) -> list[tuple[str, bool, str, bool]]:
-            joins_list = []
-            for part in expr.split(","):
-                part = part.strip()
-                if not part:
-                    continue
-                parts = [p.strip() for p in part.split(":", 1)]
-                if len(parts) != 2:
-                    raise ValueError(f"Invalid join_on expression: {expr}")
-                left, right = parts[0], parts[1]
-                _l_arr = left.endswith("[]")
-                _r_arr = right.endswith("[]")
-                if _l_arr:
-                    left = left[:-2]
-                if _r_arr:
-                    right = right[:-2]
-                joins_list.append((left, _l_arr, right, _r_arr))
-            return joins_list
-
-        def get_values_from_record(rec: core.Record, path: str, array_hint: bool) -> list:
-            try:
-                if path in ("shortname", "resource_type", "subpath", "uuid"):
-                    val = getattr(rec, path, None)
-                elif path == "space_name":
-                    val = rec.attributes.get("space_name") if rec.attributes else None
-                else:
-                    container = rec.attributes or {}
-                    val = get_nested_value(container, path)
-
-                if val is None:
-                    return []
-                if isinstance(val, list):
-                    out = []
-                    for item in val:
-                        if isinstance(item, (str, int, float, bool)) or item is None:
-                            out.append(item)
-                    return out
-
-                if array_hint:
-                    return [val]
-                return [val]
-            except Exception as e:
-                logger.warning(
-                    f"Skipping bad record value extraction for path '{path}' on record '{getattr(rec, 'shortname', '?')}': {e}"
+    async def stream_query(self, query: api.Query, user_shortname: str | None = None) -> AsyncGenerator[core.Record, None]:
+        """
+        Records of a search, subpath, history or attachments query read through a server-side cursor, converted
+        query_stream_batch_size rows at a time. Memory stays bounded by the batch size whatever the number of
+        matched rows, and rows are only fetched as fast as they are consumed.
+        """
+        if query.type not in KEYSET_QUERY_TYPES:
+            raise api.Exception(
+                status.HTTP_400_BAD_REQUEST,
+                api.Error(
+                    type="query",
+                    code=InternalErrorCode.INVALID_DATA,
+                    message=f"{query.type} queries can't be streamed",
+                ),
+            )
+
+        user_shortname = user_shortname if user_shortname else "anonymous"
+        scope = await self._query_scope(query, user_shortname)
+        if scope is None:
+            return
+        table, statement, user_query_policies = scope
+
+        statement = await set_sql_statement_from_query(table, statement, query, False)
+        statement = apply_acl_and_query_policies(statement, table, user_shortname, user_query_policies)
+        statement = apply_query_projection(statement, table, query)
+        statement = statement.execution_options(yield_per=settings.query_stream_batch_size)
+        default_resource_type = ResourceType.history if table is Histories else None
+
+        async with self.get_session(read_only=True) as session:
+            result = await session.stream(statement)
+            # The projected rows are read as plain mappings, not ORM instances, so the session's identity map never
+            # holds them and there is nothing to expunge between batches
+            async for partition in result.mappings().partitions():
+                records = await self._set_query_final_results(
+                    query, [record_from_row(row, default_resource_type) for row in partition]
                 )
-                return []
+                for record in records:
+                    yield record
+
+    async def _explain_statement(self, statement) -> dict:
+        """Compiled SQL, bound parameters and EXPLAIN (ANALYZE, BUFFERS) plan of a query statement"""
+        compiled = statement.compile(dialect=self.engine.dialect)
+        explained: dict = {"sql": str(compiled), "params": json.loads(json.dumps(compiled.params, default=str))}
+        try:
+            async with self.get_session(read_only=True) as session:
+                plan = (await session.execute(Explain(statement, analyze=True, buffers=True))).scalar_one()
+            explained["plan"] = json.loads(plan) if isinstance(plan, str) else plan
+        except Exception as e:
+            logger.warning(f"failed to explain the query {e}")
+            explained["plan_error"] = str(e)
+        return explained
+
+    async def _estimate_query_total(self, session: AsyncSession, table, statement_total) -> int:
+        """
+        Planner row estimate of the rows matched by the count statement, read from EXPLAIN.
+        Postgres derives it from pg_statistic (most common values and histograms of subpath, space_name, ...),
+        so it costs a planning pass instead of a scan.
+        """
+        try:
+            plan = (await session.execute(Explain(statement_total.with_only_columns(col(table.uuid))))).scalar_one()
+            return plan_rows_estimate(plan)
+        except Exception as e:
+            logger.warning(f"failed to estimate total count {e}")
+            return -1
+
+    async def _next_query_cursor(self, table, query: api.Query, last_row: Any) -> str | None:
+        """Cursor of the page after the one ending with `last_row`, a row mapping of the listing statement"""
+        keyset_keys = query_keyset_keys(table, query)
+        if keyset_keys is None:
+            return None
+
+        sort_keys = [key for key, _ in keyset_keys[:-1]]
+        if query.sort_by and query.sort_by in table.__table__.columns:
+            values = [last_row[query.sort_by]]
+        elif sort_keys:
+            # JSON path and relevance sort keys are computed by Postgres, read them back for the last row of the page
+            async with self.get_session(read_only=True) as session:
+                values = list(
+                    (await session.execute(select(*sort_keys).where(col(table.uuid) == last_row["uuid"]))).one()
+                )
+        else:
+            values = []
+        return encode_query_cursor(query_sort_signature(query), values, last_row["uuid"])
 
+    async def _apply_joins(
+        self, base_records: list[core.Record], joins: list[api.JoinQuery], user_shortname: str
+    ) -> list[core.Record]:
         for rec in base_records:
             if rec.attributes is None:
                 rec.attributes = {}
             if rec.attributes.get("join") is None:
                 rec.attributes["join"] = {}
 
-        import models.api as api
-
         for join_item in joins:
             join_on = getattr(join_item, "join_on", None)
             alias = getattr(join_item, "alias", None)
@@ -1719,164 +2301,180 @@ class SQLAdapter(BaseDataAdapter):
             user_limit = q_raw.get("limit") or q_raw.get("limit_")
             sub_query = copy(sub_query)
 
-            search_terms = []
-            possible_match = True
+            sql_matches = await self._join_matches_sql(base_records, parsed_joins, sub_query, user_limit, user_shortname)
+            if sql_matches is not None:
+                matched_list = sql_matches
+            else:
+                matched_list = await self._join_matches_client(
+                    base_records, parsed_joins, sub_query, user_limit, user_shortname
+                )
 
-            for l_path, l_arr, r_path, _r_arr in parsed_joins:
-                left_values = set()
-                for br in base_records:
-                    l_vals = get_values_from_record(br, l_path, l_arr)
-                    for v in l_vals:
-                        if v is not None:
-                            left_values.add(str(v))
+            if sub_query.jq_filter:
+                matched_list = await jq_engine.run(
+                    f"map( [ {sub_query.jq_filter} ] )",
+                    [[record.model_dump() for record in matched] for matched in matched_list],
+                )
 
-                if not left_values:
-                    possible_match = False
-                    break
+            for i, br in enumerate(base_records):
+                br.attributes["join"][alias] = matched_list[i] if i < len(matched_list) else []
 
-                search_val = "|".join(left_values)
-                search_terms.append(f"@{r_path}:{search_val}")
+        return base_records
 
-            if not possible_match:
-                right_records: list[core.Record] = []
-            else:
-                search_term = " ".join(search_terms)
-                if sub_query.search:
-                    sub_query.search = f"{sub_query.search} {search_term}"
-                else:
-                    sub_query.search = search_term
-                sub_query.limit = 1000
-                _total, right_records = await self.query(sub_query, user_shortname)
-
-            first_join = parsed_joins[0]
-            l_path_0, l_arr_0, r_path_0, r_arr_0 = first_join
-
-            right_index: dict[str, list[core.Record]] = {}
-            for rr in right_records:
-                r_vals = get_values_from_record(rr, r_path_0, r_arr_0)
-                for v in r_vals:
-                    if v is None:
-                        continue
-                    key = str(v)
-                    right_index.setdefault(key, []).append(rr)
+    async def _join_matches_sql(
+        self,
+        base_records: list[core.Record],
+        parsed_joins: list[tuple[str, bool, str, bool]],
+        sub_query: api.Query,
+        user_limit: int | None,
+        user_shortname: str,
+    ) -> list[list[core.Record]] | None:
+        """
+        Right records of each base record in one statement: the left values of every base record are sent as a
+        jsonb recordset, and a LEFT JOIN LATERAL runs the sub query, with its ACL and query policies, once per base
+        record with the join conditions and the per-record limit. None when the join can't be expressed in SQL.
+        """
+        if sub_query.type not in KEYSET_QUERY_TYPES:
+            return None
 
-            matched_list = []
-            for br in base_records:
-                l_vals = get_values_from_record(br, l_path_0, l_arr_0)
-                candidates: list[core.Record] = []
-                for v in l_vals:
-                    if v is None:
-                        continue
-                    key = str(v)
-                    if key in right_index:
-                        candidates.extend(right_index[key])
-
-                seen = set()
-                unique_candidates = []
-                for c in candidates:
-                    uid = f"{c.subpath}:{c.shortname}:{c.resource_type}"
-                    if uid in seen:
-                        continue
-                    seen.add(uid)
-                    unique_candidates.append(c)
+        lefts_data = []
+        for i, br in enumerate(base_records):
+            values = [
+                sorted({join_value_text(v) for v in join_record_values(br, l_path) if v is not None})
+                for l_path, _l_arr, _r_path, _r_arr in parsed_joins
+            ]
+            if all(values):
+                lefts_data.append({"i": i, "v": values})
+        matched_list: list[list[core.Record]] = [[] for _ in base_records]
+        if not lefts_data:
+            return matched_list
+
+        scope = await self._query_scope(sub_query, user_shortname)
+        if scope is None:
+            return matched_list
+        table, statement, user_query_policies = scope
+
+        lefts = (
+            func.jsonb_to_recordset(bindparam("join_lefts", value=lefts_data, type_=JSONB))
+            .table_valued(literal_column("i", Integer), literal_column("v", JSONB))
+            .render_derived(name="join_lefts", with_types=True)
+        )
+        conditions = []
+        for index, (_l_path, _l_arr, r_path, _r_arr) in enumerate(parsed_joins):
+            left_values = select(func.jsonb_array_elements_text(lefts.c.v.op("->")(index))).correlate(lefts)
+            condition = join_right_condition(table, r_path, left_values)
+            if condition is None:
+                return None
+            conditions.append(condition)
+
+        sub_query.cursor = None
+        sub_query.limit = user_limit or settings.max_query_limit
+        statement = await set_sql_statement_from_query(table, statement, sub_query, False)
+        statement = apply_acl_and_query_policies(statement, table, user_shortname, user_query_policies)
+        right = aliased(table, statement.where(*conditions).lateral("join_right"))
+        joined = select(lefts.c.i, right).select_from(lefts).join(right, true(), isouter=True).order_by(lefts.c.i)
+        if hasattr(table, "media"):
+            joined = joined.options(defer(right.media))  # type: ignore
+        if hasattr(table, "search_vector"):
+            joined = joined.options(defer(right.search_vector))  # type: ignore
+
+        async with self.get_session(read_only=True) as session:
+            rows = [(i, item) for i, item in (await session.execute(joined)).all() if item is not None]
+
+        unique_items = list({id(item): item for _, item in rows}.values())
+        right_records = await self._set_query_final_results(sub_query, unique_items)
+        if sub_query.join:
+            right_records = await self._apply_joins(right_records, sub_query.join, user_shortname)
+        records = {record.uuid: record for record in right_records}
+        for i, item in rows:
+            if item.uuid in records:
+                matched_list[i].append(records[item.uuid])
+        return matched_list
+
+    async def _join_matches_client(
+        self,
+        base_records: list[core.Record],
+        parsed_joins: list[tuple[str, bool, str, bool]],
+        sub_query: api.Query,
+        user_limit: int | None,
+        user_shortname: str,
+    ) -> list[list[core.Record]]:
+        """Right records of each base record matched in Python, for the joins _join_matches_sql can't express"""
+        search_terms = []
+        possible_match = True
 
-                matched = []
-                for cand in unique_candidates:
-                    all_match = True
-                    for i in range(1, len(parsed_joins)):
-                        l_p, l_a, r_p, r_a = parsed_joins[i]
-                        l_vs = {str(x) for x in get_values_from_record(br, l_p, l_a) if x is not None}
-                        r_vs = {str(x) for x in get_values_from_record(cand, r_p, r_a) if x is not None}
+        for l_path, _l_arr, r_path, _r_arr in parsed_joins:
+            left_values = set()
+            for br in base_records:
+                for v in join_record_values(br, l_path):
+                    if v is not None:
+                        left_values.add(str(v))
 
-                        if not l_vs.intersection(r_vs):
-                            all_match = False
-                            break
+            if not left_values:
+                possible_match = False
+                break
 
-                    if all_match:
-                        matched.append(cand)
+            search_val = "|".join(left_values)
+            search_terms.append(f"@{r_path}:{search_val}")
 
-                if user_limit:
-                    matched = matched[:user_limit]
+        if not possible_match:
+            right_records: list[core.Record] = []
+        else:
+            search_term = " ".join(search_terms)
+            if sub_query.search:
+                sub_query.search = f"{sub_query.search} {search_term}"
+            else:
+                sub_query.search = search_term
+            sub_query.limit = settings.max_query_limit
+            _total, right_records = await self.query(sub_query, user_shortname)
 
-                matched_list.append(matched)
+        l_path_0, _l_arr_0, r_path_0, _r_arr_0 = parsed_joins[0]
 
-            if getattr(sub_query, "jq_filter", None):
-                try:
-                    import subprocess
+        right_index: dict[str, list[core.Record]] = {}
+        for rr in right_records:
+            for v in join_record_values(rr, r_path_0):
+                if v is None:
+                    continue
+                right_index.setdefault(str(v), []).append(rr)
 
-                    from utils.helpers import jq_dict_parser
+        matched_list = []
+        for br in base_records:
+            candidates: list[core.Record] = []
+            for v in join_record_values(br, l_path_0):
+                if v is None:
+                    continue
+                key = str(v)
+                if key in right_index:
+                    candidates.extend(right_index[key])
 
-                    def _run_jq_subprocess(matched_list=matched_list, sub_query=sub_query) -> list:
-                        _input_local = []
-                        for m_list in matched_list:
-                            _m_local = [record.model_dump() for record in m_list]
-                            _m_local = jq_dict_parser(_m_local)
-                            _input_local.append(_m_local)
+            seen = set()
+            unique_candidates = []
+            for c in candidates:
+                uid = f"{c.subpath}:{c.shortname}:{c.resource_type}"
+                if uid in seen:
+                    continue
+                seen.add(uid)
+                unique_candidates.append(c)
 
-                        input_json = json.dumps(_input_local)
-                        vectorized_filter = f"map( [ {sub_query.jq_filter} ] )"
-                        cmd = ["jq", "-c", vectorized_filter]
+            matched = []
+            for cand in unique_candidates:
+                all_match = True
+                for i in range(1, len(parsed_joins)):
+                    l_p, _l_a, r_p, _r_a = parsed_joins[i]
+                    l_vs = {str(x) for x in join_record_values(br, l_p) if x is not None}
+                    r_vs = {str(x) for x in join_record_values(cand, r_p) if x is not None}
 
-                        try:
-                            completed = subprocess.run(
-                                cmd,
-                                input=input_json.encode("utf-8"),
-                                capture_output=True,
-                                timeout=settings.jq_timeout,
-                                check=False,
-                            )
-                        except subprocess.TimeoutExpired as e:
-                            raise api.Exception(
-                                status.HTTP_400_BAD_REQUEST,
-                                api.Error(
-                                    type="request",
-                                    code=InternalErrorCode.JQ_TIMEOUT,
-                                    message="jq filter took too long to execute",
-                                ),
-                            ) from e
-
-                        if completed.returncode != 0:
-                            raise api.Exception(
-                                status.HTTP_400_BAD_REQUEST,
-                                api.Error(
-                                    type="request",
-                                    code=InternalErrorCode.JQ_ERROR,
-                                    message="jq filter failed to be executed",
-                                ),
-                            )
+                    if not l_vs.intersection(r_vs):
+                        all_match = False
+                        break
 
-                        stdout = completed.stdout.decode("utf-8")
-                        results: list = []
-                        if stdout.startswith("[") and stdout.endswith("]\n"):
-                            results = json.loads(stdout)
-                        else:
-                            for line in stdout.splitlines():
-                                line = line.strip()
-                                if not line:
-                                    continue
-                                results.append(json.loads(line))
-
-                        return results
-
-                    loop = asyncio.get_running_loop()
-                    matched_list = await asyncio.wait_for(
-                        loop.run_in_executor(None, _run_jq_subprocess),
-                        timeout=settings.jq_timeout,
-                    )
-                except FileNotFoundError as e:
-                    raise api.Exception(
-                        status.HTTP_400_BAD_REQUEST,
-                        api.Error(
-                            type="request",
-                            code=InternalErrorCode.NOT_ALLOWED,
-                            message="jq is not installed!",
-                        ),
-                    ) from e
+                if all_match:
+                    matched.append(cand)
 
-            for i, br in enumerate(base_records):
-                br.attributes["join"][alias] = matched_list[i] if i < len(matched_list) else []
+            if user_limit:
+                matched = matched[:user_limit]
 
-        return base_records
+            matched_list.append(matched)
+        return matched_list
 
     async def load_or_none(
         self,
@@ -1887,6 +2485,8 @@ class SQLAdapter(BaseDataAdapter):
         user_shortname: str | None = None,
         schema_shortname: str | None = None,
     ) -> MetaChild | None:
+        # Single entries are read from the primary: users, roles and permissions feed the permissions cache and
+        # the credential checks, locks guard concurrent writes, none of them may come from a lagging replica
         result = await self.db_load_or_none(space_name, subpath, shortname, class_type, user_shortname, schema_shortname)
         if not result:
             return None
@@ -2092,7 +2692,10 @@ class SQLAdapter(BaseDataAdapter):
                     await session.commit()
                     await session.refresh(data)
                     if isinstance(meta, (core.User, core.Role, core.Permission)):
-                        await self.clear_cached_user_permission()
+                        await self.clear_cached_user_permission(meta)
+                    if isinstance(meta, core.Folder):
+                        self.schedule_folder_indexes_sync(space_name)
+                    self.invalidate_public_queries(space_name, subpath, meta.shortname, meta)
                 except Exception as e:
                     await session.rollback()
                     raise e
@@ -2172,6 +2775,7 @@ class SQLAdapter(BaseDataAdapter):
             result.sqlmodel_update(meta.model_dump())
             async with self.get_session() as session:
                 session.add(result)
+            self.invalidate_public_queries(space_name, subpath, meta.shortname, meta)
         except Exception as e:
             print("[!save_payload_from_json]", e)
             logger.error(f"Failed parsing an entry. Error: {e}")
@@ -2244,7 +2848,10 @@ class SQLAdapter(BaseDataAdapter):
                 session.add(result)
                 await session.commit()
                 if isinstance(meta, (core.User, core.Role, core.Permission)):
-                    await self.clear_cached_user_permission()
+                    await self.clear_cached_user_permission(meta)
+                if isinstance(meta, core.Folder):
+                    self.schedule_folder_indexes_sync(space_name)
+                self.invalidate_public_queries(space_name, subpath, meta.shortname, meta)
 
             # try:
             #     if isinstance(result, (Users, Roles, Permissions)):
@@ -2556,6 +3163,16 @@ class SQLAdapter(BaseDataAdapter):
                     ),
                 ) from e
 
+        if isinstance(meta, (core.User, core.Role, core.Permission)):
+            await self.clear_cached_user_permission(meta)
+        if isinstance(meta, (core.Folder, core.Space)):
+            # The folder indexes are named and filtered by the space and subpath the move changed
+            self.schedule_folder_indexes_sync(src_space_name)
+            if dest_space_name and dest_space_name != src_space_name:
+                self.schedule_folder_indexes_sync(dest_space_name)
+        self.invalidate_public_queries(src_space_name, src_subpath, src_shortname, meta)
+        self.invalidate_public_queries(dest_space_name, dest_subpath or src_subpath, dest_shortname or src_shortname, meta)
+
     def delete_empty(self, path: Path):
         pass
 
@@ -2705,7 +3322,10 @@ class SQLAdapter(BaseDataAdapter):
 
                 await session.commit()
                 if isinstance(meta, (core.User, core.Role, core.Permission)):
-                    await self.clear_cached_user_permission()
+                    await self.clear_cached_user_permission(meta)
+                if isinstance(meta, core.Folder):
+                    self.schedule_folder_indexes_sync(space_name)
+                self.invalidate_public_queries(space_name, subpath, meta.shortname, meta)
 
                 # Refresh authz MVs only when Users/Roles/Permissions changed
                 # try:
@@ -2793,20 +3413,27 @@ class SQLAdapter(BaseDataAdapter):
 
     async def set_user_session(self, user_shortname: str, token: str, firebase_token: str | None = None) -> bool:
         try:
-            total, last_session = await self.get_user_session(user_shortname, token)
+            async with self.get_session() as session:
+                total = (
+                    await session.execute(
+                        select(func.count(col(Sessions.uuid))).where(col(Sessions.shortname) == user_shortname)
+                    )
+                ).scalar_one()
 
-            if (settings.max_sessions_per_user == 1 and last_session is not None) or (
+            if (settings.max_sessions_per_user == 1 and total > 0) or (
                 settings.max_sessions_per_user != 0 and total >= settings.max_sessions_per_user
             ):
                 await self.remove_user_session(user_shortname)
 
+            digest = token_digest(token)
             timestamp = datetime.now()
             async with self.get_session() as session:
                 session.add(
                     Sessions(
                         uuid=uuid4(),
                         shortname=user_shortname,
-                        token=hash_password(token),
+                        token=digest,
+                        token_digest=digest,
                         timestamp=timestamp,
                         firebase_token=firebase_token,
                     )
@@ -2817,42 +3444,62 @@ class SQLAdapter(BaseDataAdapter):
             print("[!set_sql_user_session]", e)
             return False
 
+    async def _upgrade_legacy_session(self, session: AsyncSession, user_shortname: str, token: str, digest: str) -> Sessions | None:
+        """
+        Sessions created before token digests were introduced only carry an Argon2 hash of the token.
+        Verify those once and stamp the digest on the matching row so later lookups hit the index.
+        The expired ones are deleted rather than verified, they would cost a hash on every miss forever.
+        """
+        cutoff = datetime.now() - timedelta(seconds=settings.session_inactivity_ttl)
+        legacy_sessions = (col(Sessions.shortname) == user_shortname, col(Sessions.token_digest).is_(None))
+        await session.execute(delete(Sessions).where(*legacy_sessions).where(col(Sessions.timestamp) < cutoff))
+        statement = select(Sessions).where(*legacy_sessions).where(col(Sessions.timestamp) >= cutoff)
+        for r in (await session.execute(statement)).scalars().all():
+            if await hashing_pool.verify(token, r.token):
+                r.token = digest
+                r.token_digest = digest
+                session.add(r)
+                await session.flush()
+                return r
+        return None
+
     async def get_user_session(self, user_shortname: str, token: str) -> tuple[int, str | None]:
+        digest = token_digest(token)
         async with self.get_session() as session:
-            statement = select(Sessions).where(col(Sessions.shortname) == user_shortname)
-
-            results = (await session.execute(statement)).all()
-            results = [result[0] for result in results]
+            statement = select(Sessions).where(col(Sessions.token_digest) == digest)
+            user_session = (await session.execute(statement)).scalars().first()
+
+            if user_session is None:
+                user_session = await self._upgrade_legacy_session(session, user_shortname, token, digest)
+            if (
+                user_session is None
+                or user_session.shortname != user_shortname
+                or not verify_token_digest(token, user_session.token_digest)
+            ):
+                return 0, None
 
-            if len(results) == 0:
+            now = time.time()
+            last_seen = user_session.timestamp.timestamp()
+            if settings.session_inactivity_ttl + last_seen < now:
+                await session.execute(delete(Sessions).where(col(Sessions.uuid) == user_session.uuid))
                 return 0, None
 
-            for r in results:
-                if settings.session_inactivity_ttl + r.timestamp.timestamp() < time.time():
-                    await session.execute(delete(Sessions).where(col(Sessions.uuid) == r.uuid))
-                    continue
-                if verify_password(token, r.token):
-                    r.timestamp = datetime.now()
-                    session.add(r)
-                    await session.commit()
-                    return len(results), token
-                # else:
-                #     await session.execute(delete(Sessions).where(col(Sessions.uuid) == r.uuid))
-        return len(results), None
+            if now - last_seen >= settings.session_touch_interval:
+                await session.execute(
+                    update(Sessions).where(col(Sessions.uuid) == user_session.uuid).values(timestamp=datetime.now())
+                )
+        return 1, token
 
     async def remove_user_session(self, user_shortname: str) -> bool:
         async with self.get_session() as session:
             try:
-                statement = (
-                    select(Sessions)
+                oldest_sessions = (
+                    select(Sessions.uuid)
                     .where(col(Sessions.shortname) == user_shortname)
                     .order_by(col(Sessions.timestamp).desc())
                     .offset(settings.max_sessions_per_user - 1)
                 )
-                oldest_sessions = (await session.execute(statement)).all()
-                oldest_sessions = [oldest_session[0] for oldest_session in oldest_sessions]
-                for oldest_session in oldest_sessions:
-                    await session.delete(oldest_session)
+                await session.execute(delete(Sessions).where(col(Sessions.uuid).in_(oldest_sessions)))
                 await session.commit()
                 return True
             except Exception as e:
@@ -2874,17 +3521,24 @@ class SQLAdapter(BaseDataAdapter):
             return tokens
 
     async def update_session_firebase_token(self, user_shortname: str, token: str, firebase_token: str) -> bool:
+        digest = token_digest(token)
         async with self.get_session() as session:
-            statement = select(Sessions).where(col(Sessions.shortname) == user_shortname)
-            results = (await session.execute(statement)).all()
-            for result in results:
-                r = result[0]
-                if verify_password(token, r.token):
-                    r.firebase_token = firebase_token
-                    session.add(r)
-                    await session.commit()
-                    return True
-        return False
+            statement = (
+                update(Sessions)
+                .where(col(Sessions.token_digest) == digest)
+                .where(col(Sessions.shortname) == user_shortname)
+                .values(firebase_token=firebase_token)
+            )
+            result = await session.execute(statement)
+            if result.rowcount > 0:  # type: ignore
+                return True
+
+            legacy_session = await self._upgrade_legacy_session(session, user_shortname, token, digest)
+            if legacy_session is None:
+                return False
+            legacy_session.firebase_token = firebase_token
+            session.add(legacy_session)
+        return True
 
     async def set_invitation(self, invitation_token: str, invitation_value):
         async with self.get_session() as session:
@@ -2972,32 +3626,21 @@ class SQLAdapter(BaseDataAdapter):
                 print("[!delete_url_shortner_by_token]", e)
                 return False
 
-    @staticmethod
-    def _sanitize_large_integers(obj):
-        _INT64_MIN = -(2**63)
-        _INT64_MAX = 2**63 - 1
-        if isinstance(obj, dict):
-            return {k: SQLAdapter._sanitize_large_integers(v) for k, v in obj.items()}
-        elif isinstance(obj, list):
-            return [SQLAdapter._sanitize_large_integers(v) for v in obj]
-        elif isinstance(obj, int) and not isinstance(obj, bool) and (obj < _INT64_MIN or obj > _INT64_MAX):
-            return str(obj)
-        return obj
-
     async def _set_query_final_results(self, query, results):
         is_aggregation = query.type == QueryType.aggregation
         is_attachment_query = query.type == QueryType.attachments
         process_payload = query.type not in [QueryType.history, QueryType.events]
 
+        # Listing queries give records built from their rows, the others ORM instances
+        def _to_record(item) -> core.Record:
+            return item if isinstance(item, core.Record) else item.to_record(item.subpath, item.shortname)
+
         # Case 1: Attachment query  → Direct conversion of all items
         if is_attachment_query:
             converted = []
             for item in results:
                 try:
-                    rec = item.to_record(item.subpath, item.shortname)
-                    if rec.attributes:
-                        rec.attributes = self._sanitize_large_integers(rec.attributes)
-                    converted.append(rec)
+                    converted.append(_to_record(item))
                 except Exception as e:
                     logger.warning(f"Skipping attachment record due to conversion error: {e}")
             return converted
@@ -3009,13 +3652,11 @@ class SQLAdapter(BaseDataAdapter):
             return results
 
         # Case 3: Standard query → convert and optionally fetch attachments
-        attachment_tasks = []
-        attachment_indices = []
         valid_results: list[core.Record] = []
 
         for item in results:
             try:
-                rec = item.to_record(item.subpath, item.shortname)
+                rec = _to_record(item)
             except Exception as e:
                 logger.warning(f"Skipping record due to conversion error: {e}")
                 continue
@@ -3027,8 +3668,8 @@ class SQLAdapter(BaseDataAdapter):
                 del rec.attributes["query_policies"]
 
             if query.type == QueryType.history:
-                del rec.attributes["request_headers"]
-                for main_key, changes in rec.attributes["diff"].items():
+                rec.attributes.pop("request_headers", None)
+                for main_key, changes in rec.attributes.get("diff", {}).items():
                     if main_key == "password":
                         rec.attributes["diff"][main_key] = {"old": "********", "new": "********"}
                     if not isinstance(changes, dict):
@@ -3038,33 +3679,28 @@ class SQLAdapter(BaseDataAdapter):
                         if isinstance(value, dict):
                             value.pop("headers", None)
 
-            if process_payload:
-                # Strip payload body early (if disabled)
-                if not query.retrieve_json_payload:
-                    payload = rec.attributes.get("payload", {})
-                    if payload and payload.get("body"):
-                        payload["body"] = None
-
-                # Queue attachments if requested
-                if query.retrieve_attachments:
-                    attachment_tasks.append(
-                        self.get_entry_attachments(
-                            rec.subpath,
-                            Path(f"{query.space_name}/{rec.shortname}"),
-                            retrieve_json_payload=True,
-                        )
-                    )
-                    attachment_indices.append(len(valid_results))
+            # Strip payload body early (if disabled)
+            if process_payload and not query.retrieve_json_payload:
+                payload = rec.attributes.get("payload", {})
+                if payload and payload.get("body"):
+                    payload["body"] = None
 
-            if rec.attributes:
-                rec.attributes = self._sanitize_large_integers(rec.attributes)
             valid_results.append(rec)
 
-        # Run all attachment retrievals concurrently
-        if attachment_tasks:
-            attachments_list = await asyncio.gather(*attachment_tasks)
-            for idx, attachments in zip(attachment_indices, attachments_list, strict=False):
-                valid_results[idx].attachments = attachments
+        # Load the attachments of the whole page at once
+        if process_payload and query.retrieve_attachments and valid_results:
+            def _entry_path(rec: core.Record) -> str:
+                subpath = rec.subpath if rec.subpath.startswith("/") else f"/{rec.subpath}"
+                return f"{subpath}/{rec.shortname}".replace("//", "/")
+
+            with query.phase("attachments"):
+                page_attachments = await self.get_entries_attachments(
+                    query.space_name,
+                    [_entry_path(rec) for rec in valid_results],
+                    limit_per_type=settings.query_attachments_per_type_limit,
+                )
+            for rec in valid_results:
+                rec.attachments = page_attachments.get(_entry_path(rec), {})
 
         return valid_results
 
@@ -3361,6 +3997,11 @@ class SQLAdapter(BaseDataAdapter):
             return {}
 
     async def load_user_meta(self, user_shortname: str) -> Any:
+        request_memo = get_request_memo()
+        memo_key = ("user_meta", user_shortname)
+        if request_memo is not None and memo_key in request_memo:
+            return request_memo[memo_key]
+
         user = await self.load(
             space_name=settings.management_space,
             shortname=user_shortname,
@@ -3369,9 +4010,16 @@ class SQLAdapter(BaseDataAdapter):
             user_shortname=user_shortname,
         )
 
+        if request_memo is not None:
+            request_memo[memo_key] = user
         return user
 
     async def generate_user_permissions(self, user_shortname: str) -> dict:
+        user_permissions, _, _ = await self._generate_user_permissions(user_shortname)
+        return user_permissions
+
+    async def _generate_user_permissions(self, user_shortname: str) -> tuple[dict, set[str], set[str]]:
+        """Build the permissions map of the user along with the role and permission shortnames it depends on"""
         user_permissions: dict = {}
 
         user_meta = await self.load_or_none(
@@ -3382,9 +4030,15 @@ class SQLAdapter(BaseDataAdapter):
         )
         owner_shortname = user_meta.owner_shortname if user_meta else None
 
+        role_shortnames: set[str] = set(user_meta.roles) if user_meta and user_meta.roles else set()
+        if user_shortname != "anonymous":
+            role_shortnames.add("logged_in")
+        permission_shortnames: set[str] = {"world"} if user_shortname == "anonymous" else set()
+
         user_roles = await self.get_user_roles(user_shortname)
 
         for _, role in user_roles.items():
+            permission_shortnames.update(role.permissions or [])
             role_permissions = await self.get_role_permissions(role)
             if user_shortname == "anonymous":
                 permission_world_record = await self.load_or_none(
@@ -3419,29 +4073,165 @@ class SQLAdapter(BaseDataAdapter):
                                 "allowed_fields_values": permission.allowed_fields_values,
                                 "filter_fields_values": permission.filter_fields_values,
                             }
-        return user_permissions
+        return user_permissions, role_shortnames, permission_shortnames
+
+    async def get_permissions_version(self, fresh: bool = False) -> int:
+        """
+        Shared version of the users, roles and permissions. The worker reads it from the primary at most once per
+        permissions_version_poll_ms, so the changes made by the other workers show up within that delay.
+        """
+        now = time.monotonic()
+        if (
+            not fresh
+            and self.permissions_version_read_at is not None
+            and now - self.permissions_version_read_at < settings.permissions_version_poll_ms / 1000
+        ):
+            return self.permissions_version
+
+        async with self.get_session() as session:
+            permissions_version, acl_version = (
+                await session.execute(
+                    text(
+                        "SELECT (SELECT CASE WHEN is_called THEN last_value ELSE 0 END FROM permissions_version_seq),"
+                        " (SELECT CASE WHEN is_called THEN last_value ELSE 0 END FROM acl_users_version_seq)"
+                    )
+                )
+            ).one()
+        # Read in the same round trip, get_acl_holders reloads its set once it falls behind
+        self.acl_users_version = int(acl_version or 0)
+        self.permissions_version = int(permissions_version)
+        self.permissions_version_read_at = now
+        return self.permissions_version
+
+    async def get_acl_holders(self) -> set[str]:
+        """
+        Users granted access by the acl of any meta, from the acl_users reverse index. The set is reloaded when
+        acl_users_version_seq moved since, as last read along with the permissions version.
+        """
+        if self.acl_holders is None or self.acl_holders_version != self.acl_users_version:
+            version = self.acl_users_version
+            async with self.get_session() as session:
+                holders = (await session.execute(select(AclUsers.user_shortname).distinct())).scalars().all()
+            self.acl_holders = set(holders)
+            self.acl_holders_version = version
+        return self.acl_holders
+
+    async def sync_permissions_cache(self, version: int) -> None:
+        """
+        Drop the local entries that another worker invalidated since the last sync,
+        i.e. whose shared cache row is gone or was regenerated with a different version.
+        """
+        local_versions = self.permissions_cache.row_versions()
+        if local_versions:
+            async with self.get_session() as session:
+                statement = select(UserPermissionsCache.user_shortname, UserPermissionsCache.version).where(
+                    col(UserPermissionsCache.user_shortname).in_(list(local_versions.keys()))
+                )
+                shared_versions = {row[0]: row[1] for row in (await session.execute(statement)).all()}
+            for user_shortname, row_version in local_versions.items():
+                if shared_versions.get(user_shortname) != row_version:
+                    self.permissions_cache.invalidate_user(user_shortname)
+        self.permissions_cache.version = version
 
     async def get_user_permissions(self, user_shortname: str) -> dict:
+        request_memo = get_request_memo()
+        memo_key = ("user_permissions", user_shortname)
+        if request_memo is not None and memo_key in request_memo:
+            return request_memo[memo_key]  # type: ignore
+
+        user_permissions = await self._resolve_user_permissions(user_shortname)
+        if request_memo is not None:
+            request_memo[memo_key] = user_permissions
+        return user_permissions
+
+    async def _resolve_user_permissions(self, user_shortname: str) -> dict:
+        version = await self.get_permissions_version()
+        if version != self.permissions_cache.version:
+            await self.sync_permissions_cache(version)
+
+        cached_permissions = self.permissions_cache.get(user_shortname)
+        if cached_permissions is not None:
+            return cached_permissions
+
         async with self.get_session() as session:
             statement = select(UserPermissionsCache).where(col(UserPermissionsCache.user_shortname) == user_shortname)
             cached = (await session.execute(statement)).scalars().first()
             if cached:
+                self.permissions_cache.put(
+                    user_shortname,
+                    cached.permissions,
+                    cached.version,
+                    cached.role_shortnames,
+                    cached.permission_shortnames,
+                )
                 return cached.permissions  # type: ignore
 
-        user_permissions = await self.generate_user_permissions(user_shortname)
+        user_permissions, role_shortnames, permission_shortnames = await self._generate_user_permissions(user_shortname)
+        values = {
+            "permissions": user_permissions,
+            "version": version,
+            "role_shortnames": sorted(role_shortnames),
+            "permission_shortnames": sorted(permission_shortnames),
+        }
         async with self.get_session() as session:
-            stmt = insert(UserPermissionsCache).values(
-                user_shortname=user_shortname,
-                permissions=user_permissions
-            )
-            stmt = stmt.on_conflict_do_update(
-                index_elements=["user_shortname"],
-                set_={"permissions": user_permissions}
-            )
+            stmt = insert(UserPermissionsCache).values(user_shortname=user_shortname, **values)
+            stmt = stmt.on_conflict_do_update(index_elements=["user_shortname"], set_=values)
             await session.execute(stmt)
 
+        # A user, role or permission changed while the map was being generated, it may be stale
+        if await self.get_permissions_version(fresh=True) != version:
+            async with self.get_session() as session:
+                await session.execute(
+                    delete(UserPermissionsCache)
+                    .where(col(UserPermissionsCache.user_shortname) == user_shortname)
+                    .where(col(UserPermissionsCache.version) == version)
+                )
+            return user_permissions
+
+        self.permissions_cache.put(user_shortname, user_permissions, version, role_shortnames, permission_shortnames)
         return user_permissions
 
+    async def get_entries_acl(self, entries: list[tuple[str, str, str, str]]) -> dict[tuple[str, str, str, str], list[dict]]:
+        """
+        ACLs of many entries, given as (space_name, subpath, shortname, resource_type), in one query per table.
+        Entries that don't exist are left out.
+        """
+        lookups: dict[Any, dict[tuple[str, ...], list[tuple[str, str, str, str]]]] = {}
+        for entry in entries:
+            space_name, subpath, shortname, resource_type = entry
+            class_type = getattr(sys.modules["models.core"], camel_case(resource_type), None)
+            if class_type is None:
+                continue
+            table = self.get_table(class_type)
+            if not hasattr(table, "acl"):
+                continue
+            if not subpath.startswith("/"):
+                subpath = f"/{subpath}"
+            # Same lookup as db_load_or_none, only these tables match the subpath
+            if table in [Users, Entries, Attachments]:
+                key: tuple[str, ...] = (space_name, subpath, shortname.replace("/", ""))
+            else:
+                key = (space_name, shortname.replace("/", ""))
+            lookups.setdefault(table, {}).setdefault(key, []).append(entry)
+
+        acls: dict[tuple[str, str, str, str], list[dict]] = {}
+        if not lookups:
+            return acls
+        # Like the permissions, the ACLs are read from the primary so a revoked grant is never served by a replica
+        async with self.get_session() as session:
+            for table, keys in lookups.items():
+                if table in [Users, Entries, Attachments]:
+                    key_columns = [col(table.space_name), col(table.subpath), col(table.shortname)]
+                else:
+                    key_columns = [col(table.space_name), col(table.shortname)]
+                statement = select(*key_columns, col(table.acl)).where(tuple_(*key_columns).in_(list(keys)))  # type: ignore
+                for row in (await session.execute(statement)).all():
+                    for entry in keys.get(tuple(row[:-1]), []):
+                        acls[entry] = [
+                            access.model_dump() if isinstance(access, core.ACL) else access for access in row[-1] or []
+                        ]
+        return acls
+
     async def get_user_by_criteria(self, key: str, value: str) -> str | None:
         async with self.get_session() as session:
             statement = select(Users).where(
@@ -3485,10 +4275,37 @@ class SQLAdapter(BaseDataAdapter):
     async def create_user_premission_index(self) -> None:
         return None
 
-    async def clear_cached_user_permission(self) -> None:
+    async def clear_cached_user_permission(self, meta: core.Meta | None = None) -> None:
+        """
+        Invalidate the cached permissions of the users depending on the given user, role or permission,
+        following user -> roles -> permissions. Without a meta, the whole cache is dropped.
+        """
+        clear_request_memo()
+        statement = delete(UserPermissionsCache)
+        if isinstance(meta, core.User):
+            self.permissions_cache.invalidate_user(meta.shortname)
+            statement = statement.where(col(UserPermissionsCache.user_shortname) == meta.shortname)
+        elif isinstance(meta, core.Role):
+            self.permissions_cache.invalidate_role(meta.shortname)
+            statement = statement.where(
+                col(UserPermissionsCache.role_shortnames).op("?")(bindparam("dependency", meta.shortname))
+            )
+        elif isinstance(meta, core.Permission):
+            self.permissions_cache.invalidate_permission(meta.shortname)
+            statement = statement.where(
+                col(UserPermissionsCache.permission_shortnames).op("?")(bindparam("dependency", meta.shortname))
+            )
+        else:
+            self.permissions_cache.clear()
+
         async with self.get_session() as session:
-            await session.execute(delete(UserPermissionsCache))
+            await session.execute(statement)
             await session.commit()
+        # Bumped only once the deletion is committed, so other workers never sync against stale rows
+        async with self.get_session() as session:
+            await session.execute(text("SELECT nextval('permissions_version_seq')"))
+        # This worker sees its own change right away
+        self.permissions_version_read_at = None
 
     async def store_modules_to_redis(self, roles, groups, permissions) -> None:
         pass
@@ -3580,17 +4397,23 @@ class SQLAdapter(BaseDataAdapter):
 
         from utils.access_control import access_control
 
-        if not await access_control.check_access(
-            user_shortname=logged_in_user,
-            space_name=_result.attributes["space_name"],
-            subpath=_result.subpath,
-            resource_type=_result.resource_type,
-            action_type=core.ActionType.view,
-            resource_is_active=_result.attributes["is_active"],
-            resource_owner_shortname=_result.attributes["owner_shortname"],
-            resource_owner_group=_result.attributes["owner_group_shortname"],
-            entry_shortname=_result.shortname,
-        ):
+        if not (
+            await access_control.check_access_many(
+                logged_in_user,
+                [
+                    {
+                        "space_name": _result.attributes["space_name"],
+                        "subpath": _result.subpath,
+                        "resource_type": _result.resource_type,
+                        "action_type": core.ActionType.view,
+                        "resource_is_active": _result.attributes["is_active"],
+                        "resource_owner_shortname": _result.attributes["owner_shortname"],
+                        "resource_owner_group": _result.attributes["owner_group_shortname"],
+                        "entry_shortname": _result.shortname,
+                    }
+                ],
+            )
+        )[0]:
             raise api.Exception(
                 status.HTTP_401_UNAUTHORIZED,
                 api.Error(
@@ -3621,7 +4444,7 @@ class SQLAdapter(BaseDataAdapter):
             statement = select(Users.shortname).where(col(Users.groups).contains([group_name]))
             result = await session.execute(statement)
             shortnames = result.scalars().all()
-            return shortnames
+            return list(shortnames)
 
     async def is_user_verified(self, user_shortname: str | None, identifier: str | None) -> bool:
         async with self.get_session() as session:
@@ -1,15 +1,42 @@
+import base64
+import hashlib
 import json
 import re
+from datetime import datetime
 from pathlib import Path
+from typing import Any
+from uuid import UUID, uuid4
+
+from fastapi import status
+from sqlalchemy import (
+    DateTime,
+    Float,
+    Uuid,
+    and_,
+    cast,
+    false,
+    func,
+    literal,
+    literal_column,
+    or_,
+    select,
+    tuple_,
+    union_all,
+)
+from sqlalchemy.dialects.postgresql import TSQUERY
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import ClauseElement, Executable
+from sqlmodel import col
 
 import models.api as api
 import models.core as core
 from data_adapters.sql.create_tables import Aggregated, Entries, Histories, Permissions, Roles, Spaces, Users
-from models.enums import QueryType
+from models.enums import QueryType, SortType
 from utils.helpers import (
     process_jsonl_file,
     str_to_datetime,
 )
+from utils.internal_error_code import InternalErrorCode
 from utils.settings import settings
 
 postgres_aggregate_functions = [
@@ -435,6 +462,7 @@ async def events_query(query: api.Query, user_shortname: str | None = None) -> t
 
     total, result = await process_jsonl_file(path, limit=query.limit, offset=query.offset, search=query.search, reverse=True)
 
+    actions = []
     for line in result:
         action_obj = json.loads(line)
         if query.from_date and str_to_datetime(action_obj["timestamp"]) < query.from_date:
@@ -442,14 +470,22 @@ async def events_query(query: api.Query, user_shortname: str | None = None) -> t
 
         if query.to_date and str_to_datetime(action_obj["timestamp"]) > query.to_date:
             continue
-
-        if not await access_control.check_access(
-            user_shortname=str(user_shortname),
-            space_name=query.space_name,
-            subpath=action_obj.get("resource", {}).get("subpath", "/"),
-            resource_type=action_obj["resource"]["type"],
-            action_type=core.ActionType(action_obj["request"]),
-        ):
+        actions.append(action_obj)
+
+    allowed = await access_control.check_access_many(
+        str(user_shortname),
+        [
+            {
+                "space_name": query.space_name,
+                "subpath": action_obj.get("resource", {}).get("subpath", "/"),
+                "resource_type": action_obj["resource"]["type"],
+                "action_type": core.ActionType(action_obj["request"]),
+            }
+            for action_obj in actions
+        ],
+    )
+    for action_obj, is_allowed in zip(actions, allowed, strict=True):
+        if not is_allowed:
             continue
 
         records.append(
@@ -524,3 +560,216 @@ def build_query_filter_for_allowed_field_values(perm_value) -> str:
                 filters.append(f"@{k}:{values}")
 
     return " ".join(filters)
+
+
+def like_escape(value: str) -> str:
+    """Escape the LIKE wildcards of a literal value, with Postgres' default backslash escape"""
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def wildcard_like_pattern(value: str) -> str:
+    """LIKE pattern of a search value using `*` as its only wildcard"""
+    return "%".join(like_escape(part) for part in value.split("*"))
+
+
+def is_case_free_prefix(value: str) -> bool:
+    """
+    Whether the `*` pattern `value` is prefix-anchored (a single trailing `*`) with no cased letters in its prefix,
+    so a case-sensitive LIKE matches the same rows as ILIKE and can use a text_pattern_ops index.
+    """
+    prefix = value[:-1]
+    return value.endswith("*") and bool(prefix) and "*" not in prefix and prefix.lower() == prefix.upper()
+
+
+# sort_by value ordering full-text search results by their ts_rank_cd
+SEARCH_RELEVANCE_SORT = "relevance"
+
+
+def search_tsquery_sql(term_param: str, space_param: str = "search_space") -> str:
+    """
+    Raw SQL tsquery of the search text bound to `term_param`, parsed by websearch_to_tsquery.
+    It matches both the exact tokens and the stemmed words in the language of the space bound to `space_param`,
+    the same way the search_vector column is built.
+    """
+    return (
+        f"(websearch_to_tsquery('simple', :{term_param})"
+        f" || websearch_to_tsquery(dmart_space_regconfig(:{space_param}), :{term_param}))"
+    )
+
+
+def search_tsquery(search: str, space_name: str) -> Any:
+    """The expression form of `search_tsquery_sql`"""
+    return func.websearch_to_tsquery(literal_column("'simple'::regconfig"), search).op("||", return_type=TSQUERY())(
+        func.websearch_to_tsquery(func.dmart_space_regconfig(space_name), search)
+    )
+
+
+def search_text_terms(search: str) -> str:
+    """The free text of a search expression, without its @field conditions"""
+    if not search.startswith("@") and not search.startswith("-") and "(" not in search and ")" not in search:
+        return search
+    return " ".join(term for group in parse_search_expression(search) for term in group["text_terms"])
+
+
+def search_relevance(table: Any, query: api.Query) -> Any:
+    """Relevance of the rows of a search_vector table to the free text of the query search, None without one"""
+    terms = search_text_terms(query.search or "")
+    if not terms or not hasattr(table, "search_vector"):
+        return None
+    return cast(func.ts_rank_cd(table.search_vector, search_tsquery(terms, query.space_name)), Float)
+
+
+# Query types whose rows are plain table rows and can be paged by keyset
+KEYSET_QUERY_TYPES = [QueryType.search, QueryType.subpath, QueryType.history, QueryType.attachments]
+
+
+def query_sort_signature(query: api.Query) -> str:
+    return f"{query.sort_by or ''}:{query.sort_type or SortType.ascending}"
+
+
+def random_sample_pivot(seed: str | None) -> UUID:
+    """Where a random query starts on the uuid ring: drawn per query, or derived from its seed"""
+    if seed is None:
+        return uuid4()
+    return UUID(bytes=hashlib.sha256(seed.encode()).digest()[:16])
+
+
+def random_sample_statement(statement, table, query: api.Query) -> Any:
+    """
+    Random sample of the rows a filtered statement matches, without sorting them all.
+
+    Row uuids are random, so the rows are read in uuid order from a pivot uuid, wrapping around the ring:
+    first `uuid >= pivot`, then `uuid < pivot`. Each leg is a primary key range scan stopped by its LIMIT, and the
+    outer query only orders the two short legs, tagged by the random_leg column. A seed fixes the pivot, so the
+    same seed gives the same order and its pages, by offset or by cursor, follow each other.
+    """
+    uuid = col(table.uuid)
+    pivot = random_sample_pivot(query.seed)
+    statement = statement.order_by(None).limit(None).offset(None)
+
+    start_leg, last_uuid = 0, None
+    if query.cursor and query.seed is not None:
+        values, last_uuid = decode_query_cursor(query.cursor, random_query_signature(query))
+        if values not in ([0], [1]):
+            raise api.Exception(
+                status.HTTP_400_BAD_REQUEST,
+                api.Error(type="request", code=InternalErrorCode.INVALID_DATA, message="Invalid query cursor"),
+            )
+        start_leg = values[0]
+    offset = 0 if last_uuid is not None else query.offset
+    span = offset + query.limit
+
+    legs = []
+    for leg, condition in ((0, uuid >= pivot), (1, uuid < pivot)):
+        if leg < start_leg:
+            continue
+        leg_statement = statement.where(condition)
+        if leg == start_leg and last_uuid is not None:
+            leg_statement = leg_statement.where(uuid > last_uuid)
+        legs.append(leg_statement.add_columns(literal(leg).label("random_leg")).order_by(uuid).limit(span))
+
+    sample = union_all(*legs).subquery("random_sample")
+    return select(*sample.c).order_by(sample.c.random_leg, sample.c.uuid).offset(offset).limit(query.limit)
+
+
+def random_query_signature(query: api.Query) -> str:
+    return f"random:{query.seed or ''}"
+
+
+def _cursor_value_default(value: Any) -> str:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+def encode_query_cursor(signature: str, values: list, last_uuid: UUID | str) -> str:
+    payload = json.dumps(
+        {"s": signature, "k": values, "u": str(last_uuid)}, default=_cursor_value_default, separators=(",", ":")
+    )
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_query_cursor(cursor: str, signature: str) -> tuple[list, UUID]:
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        values, last_uuid = data["k"], UUID(data["u"])
+        if not isinstance(values, list) or data["s"] != signature:
+            raise ValueError("cursor does not match the query sorting")
+    except Exception as e:
+        raise api.Exception(
+            status.HTTP_400_BAD_REQUEST,
+            api.Error(
+                type="request",
+                code=InternalErrorCode.INVALID_DATA,
+                message="Invalid query cursor",
+            ),
+        ) from e
+    return values, last_uuid
+
+
+def decode_cursor_value(expression: Any, value: Any) -> Any:
+    """Restore the python type a cursor value lost in its JSON encoding, based on the sort expression type"""
+    if not isinstance(value, str):
+        return value
+    sql_type = getattr(expression.type, "impl_instance", expression.type)
+    if isinstance(sql_type, DateTime):
+        return datetime.fromisoformat(value)
+    if isinstance(sql_type, Uuid):
+        return UUID(value)
+    return value
+
+
+def keyset_condition(keys: list[tuple[Any, bool]], values: list, descending: bool) -> Any:
+    """
+    Condition selecting the rows that come strictly after the cursor `values` when ordering by `keys`,
+    a list of (expression, nullable), all in the same direction.
+    Follows Postgres' NULL placement: last when ascending, first when descending.
+    """
+    if not any(nullable for _, nullable in keys):
+        key_tuple = tuple_(*[expression for expression, _ in keys])
+        return key_tuple < tuple(values) if descending else key_tuple > tuple(values)
+
+    def _is_equal(idx: int) -> Any:
+        expression, value = keys[idx][0], values[idx]
+        return expression.is_(None) if value is None else expression == literal(value, type_=expression.type)
+
+    alternatives = []
+    for idx, (expression, nullable) in enumerate(keys):
+        value = values[idx]
+        if value is None:
+            after = expression.is_not(None) if descending else false()
+        else:
+            bound_value = literal(value, type_=expression.type)
+            after = expression < bound_value if descending else expression > bound_value
+            if nullable and not descending:
+                after = or_(after, expression.is_(None))
+        alternatives.append(and_(*[_is_equal(i) for i in range(idx)], after))
+    return or_(*alternatives)
+
+
+class Explain(Executable, ClauseElement):
+    """EXPLAIN of a statement, keeping its bound parameters"""
+
+    inherit_cache = False
+
+    def __init__(self, statement: Any, analyze: bool = False, buffers: bool = False):
+        self.statement = statement
+        self.analyze = analyze
+        self.buffers = buffers
+
+
+@compiles(Explain, "postgresql")
+def _compile_explain(element: Explain, compiler: Any, **kw: Any) -> str:
+    options = ["FORMAT JSON"]
+    if element.analyze:
+        options.append("ANALYZE")
+    if element.buffers:
+        options.append("BUFFERS")
+    return f"EXPLAIN ({', '.join(options)}) {compiler.process(element.statement, **kw)}"
+
+
+def plan_rows_estimate(plan: Any) -> int:
+    """Row estimate of the top node of an `EXPLAIN (FORMAT JSON)` output"""
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
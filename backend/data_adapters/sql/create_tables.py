@@ -1,11 +1,12 @@
 #!/usr/bin/env -S BACKEND_ENV=config.env python3
+import re
 import sys
 from datetime import datetime
 from typing import Any
 from uuid import UUID, uuid4
 
-from sqlalchemy import URL, LargeBinary, text
-from sqlalchemy.dialects.postgresql import ARRAY, HSTORE, JSONB, TEXT
+from sqlalchemy import URL, Index, LargeBinary, Sequence, text
+from sqlalchemy.dialects.postgresql import ARRAY, HSTORE, JSONB, TEXT, TSVECTOR
 from sqlmodel import Column, Enum, Field, SQLModel, UniqueConstraint, create_engine
 from sqlmodel._compat import SQLModelConfig  # type: ignore
 
@@ -18,6 +19,11 @@ from utils.settings import settings
 
 metadata = SQLModel.metadata
 
+# Bumped on every write to users, roles or permissions; workers compare it against their local permissions cache
+permissions_version_seq = Sequence("permissions_version_seq", metadata=metadata)
+# Bumped when a user starts or stops being granted access by some acl; workers reload their set of acl holders
+acl_users_version_seq = Sequence("acl_users_version_seq", metadata=metadata)
+
 
 def get_model_from_sql_instance(db_record_type):
     match db_record_type:
@@ -152,7 +158,9 @@ class Metas(Unique, table=False):
             attributes={
                 key: value
                 for key, value in self.__dict__.items()
-                if key != "_sa_instance_state" and (not include or key in include) and key not in local_prop_list
+                if key not in ("_sa_instance_state", "search_vector")
+                and (not include or key in include)
+                and key not in local_prop_list
             },
         )
 
@@ -182,12 +190,14 @@ class Users(Metas, table=True):
     notes: str | None = None
     last_checksum_history: str | None = Field(default=None)
     query_policies: list[str] = Field(default=[], sa_type=ARRAY(TEXT))  # type: ignore
+    search_vector: str | None = Field(default=None, sa_type=TSVECTOR, exclude=True)  # set by trg_*_search_vector
 
 
 class Roles(Metas, table=True):
     permissions: list[str] = Field(default_factory=dict, sa_type=JSONB)
     owner_shortname: str = Field(foreign_key="users.shortname")
     query_policies: list[str] = Field(default=[], sa_type=ARRAY(TEXT))  # type: ignore
+    search_vector: str | None = Field(default=None, sa_type=TSVECTOR, exclude=True)  # set by trg_*_search_vector
     last_checksum_history: str | None = Field(default=None)
 
 
@@ -201,11 +211,15 @@ class Permissions(Metas, table=True):
     filter_fields_values: str | None = None
     last_checksum_history: str | None = Field(default=None)
     query_policies: list[str] = Field(default=[], sa_type=ARRAY(TEXT))  # type: ignore
+    search_vector: str | None = Field(default=None, sa_type=TSVECTOR, exclude=True)  # set by trg_*_search_vector
 
 
 class UserPermissionsCache(SQLModel, table=True):
     user_shortname: str = Field(primary_key=True)
     permissions: dict = Field(default_factory=dict, sa_type=JSONB)
+    version: int = Field(default=0)
+    role_shortnames: list[str] = Field(default_factory=list, sa_type=JSONB)
+    permission_shortnames: list[str] = Field(default_factory=list, sa_type=JSONB)
 
 
 class Entries(Metas, table=True):
@@ -218,6 +232,48 @@ class Entries(Metas, table=True):
     resolution_reason: str | None = None
     last_checksum_history: str | None = Field(default=None)
     query_policies: list[str] = Field(default=[], sa_type=ARRAY(TEXT))  # type: ignore
+    search_vector: str | None = Field(default=None, sa_type=TSVECTOR, exclude=True)  # set by trg_*_search_vector
+
+
+class EntryTags(SQLModel, table=True):
+    """One row per distinct tag of each entry, maintained by the trg_entries_tags_* triggers"""
+
+    __tablename__ = "entry_tags"  # type: ignore
+    __table_args__ = (
+        Index("idx_entry_tags_space_tag", "space_name", "tag", "subpath"),
+        Index("idx_entry_tags_space_subpath", "space_name", "subpath"),
+    )
+
+    entry_uuid: UUID = Field(primary_key=True)
+    tag: str = Field(primary_key=True)
+    space_name: str
+    subpath: str
+
+
+class SubpathTagCounts(SQLModel, table=True):
+    """Entries of each resource type carrying a tag in a subpath, maintained by the trg_entries_tags_* triggers"""
+
+    __tablename__ = "subpath_tag_counts"  # type: ignore
+
+    space_name: str = Field(primary_key=True)
+    subpath: str = Field(primary_key=True)
+    resource_type: str = Field(primary_key=True)
+    tag: str = Field(primary_key=True)
+    count: int = 0
+
+
+class AclUsers(SQLModel, table=True):
+    """One row per user granted access by the acl of a meta, of any table, maintained by the trg_*_acl_users triggers"""
+
+    __tablename__ = "acl_users"  # type: ignore
+    __table_args__ = (Index("idx_acl_users_entry", "entry_uuid"),)
+
+    user_shortname: str = Field(primary_key=True)
+    entry_uuid: UUID = Field(primary_key=True)
+    space_name: str
+    subpath: str
+    shortname: str
+    resource_type: str
 
 
 class Attachments(Metas, table=True):
@@ -365,6 +421,7 @@ class Sessions(SQLModel, table=True):
     shortname: str = Field(regex=regex.SHORTNAME)
     uuid: UUID = Field(default_factory=UUID, primary_key=True)
     token: str = Field(...)
+    token_digest: str | None = Field(default=None, unique=True, index=True)
     timestamp: datetime = Field(default_factory=datetime.now)
     firebase_token: str | None = None
 
@@ -389,6 +446,267 @@ class OTP(SQLModel, table=True):
     timestamp: datetime = Field(default_factory=datetime.now)
 
 
+SEARCH_VECTOR_TABLES = ["entries", "users", "roles", "permissions"]
+_SEARCH_VECTOR_PATH_RE = re.compile(r"^[A-Za-z0-9_]+(\.[A-Za-z0-9_]+)*$")
+
+
+def search_vector_ddl() -> list[str]:
+    """
+    Functions and triggers maintaining the search_vector column of the searchable tables.
+    Shortname and displayname weigh A, description and tags B, the configured paths C.
+    Every text is indexed with the 'simple' config, for exact tokens, and with the config of the first language of
+    the row's space, for stemmed matches. Re-run after changing search_vector_paths.
+    """
+    statements = [
+        """
+        CREATE OR REPLACE FUNCTION dmart_space_regconfig(p_space_name text) RETURNS regconfig
+        LANGUAGE sql STABLE AS $$
+            SELECT COALESCE(
+                (
+                    SELECT c.cfgname::regconfig
+                    FROM spaces s
+                    JOIN pg_ts_config c ON c.cfgname = s.languages->>0
+                    WHERE s.shortname = p_space_name
+                    LIMIT 1
+                ),
+                'simple'::regconfig
+            )
+        $$
+        """,
+        """
+        CREATE OR REPLACE FUNCTION dmart_jsonb_text(value jsonb) RETURNS text
+        LANGUAGE sql IMMUTABLE AS $$
+            SELECT CASE jsonb_typeof(value)
+                WHEN 'object' THEN (SELECT string_agg(v, ' ') FROM jsonb_each_text(value) AS e(k, v))
+                WHEN 'array' THEN (SELECT string_agg(v, ' ') FROM jsonb_array_elements_text(value) AS a(v))
+                ELSE value #>> '{}'
+            END
+        $$
+        """,
+        """
+        CREATE OR REPLACE FUNCTION dmart_search_vector() RETURNS trigger
+        LANGUAGE plpgsql AS $$
+        DECLARE
+            doc jsonb := to_jsonb(NEW);
+            cfg regconfig := dmart_space_regconfig(NEW.space_name);
+            title_text text := concat_ws(' ', doc->>'shortname', dmart_jsonb_text(doc->'displayname'));
+            about_text text := concat_ws(' ', dmart_jsonb_text(doc->'description'), dmart_jsonb_text(doc->'tags'));
+            extra_text text := '';
+        BEGIN
+            FOR i IN 0 .. TG_NARGS - 1 LOOP
+                extra_text := concat_ws(' ', extra_text, dmart_jsonb_text(doc #> string_to_array(TG_ARGV[i], '.')));
+            END LOOP;
+            NEW.search_vector :=
+                setweight(to_tsvector('simple', title_text), 'A') || setweight(to_tsvector(cfg, title_text), 'A')
+                || setweight(to_tsvector('simple', about_text), 'B') || setweight(to_tsvector(cfg, about_text), 'B')
+                || setweight(to_tsvector('simple', extra_text), 'C') || setweight(to_tsvector(cfg, extra_text), 'C');
+            RETURN NEW;
+        END
+        $$
+        """,
+    ]
+
+    for table in SEARCH_VECTOR_TABLES:
+        paths = list(settings.search_vector_paths)
+        if table == "users":
+            paths += ["email", "msisdn"]
+        args = ", ".join(f"'{path}'" for path in paths if _SEARCH_VECTOR_PATH_RE.match(path))
+        statements += [
+            f"DROP TRIGGER IF EXISTS trg_{table}_search_vector ON {table}",
+            f"CREATE TRIGGER trg_{table}_search_vector BEFORE INSERT OR UPDATE ON {table} "
+            f"FOR EACH ROW EXECUTE FUNCTION dmart_search_vector({args})",
+            f"CREATE INDEX IF NOT EXISTS idx_{table}_search_vector ON {table} USING GIN (search_vector)",
+        ]
+    return statements
+
+
+def entry_tags_ddl() -> list[str]:
+    """
+    Function and triggers keeping entry_tags and subpath_tag_counts in step with the tags of the entries, whichever
+    write (save, update, move or delete, one row or many) changes them.
+    """
+    return [
+        """
+        CREATE OR REPLACE FUNCTION dmart_entry_tags() RETURNS trigger
+        LANGUAGE plpgsql AS $$
+        BEGIN
+            IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                DELETE FROM entry_tags WHERE entry_uuid = OLD.uuid;
+                UPDATE subpath_tag_counts AS c SET count = c.count - 1
+                FROM (
+                    SELECT DISTINCT t.tag FROM jsonb_array_elements_text(
+                        CASE WHEN jsonb_typeof(OLD.tags) = 'array' THEN OLD.tags ELSE '[]'::jsonb END
+                    ) AS t(tag)
+                ) AS old_tags
+                WHERE c.space_name = OLD.space_name AND c.subpath = OLD.subpath
+                    AND c.resource_type = OLD.resource_type AND c.tag = old_tags.tag;
+                DELETE FROM subpath_tag_counts
+                WHERE space_name = OLD.space_name AND subpath = OLD.subpath AND count <= 0;
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                INSERT INTO entry_tags (entry_uuid, tag, space_name, subpath)
+                SELECT DISTINCT NEW.uuid, t.tag, NEW.space_name, NEW.subpath FROM jsonb_array_elements_text(
+                    CASE WHEN jsonb_typeof(NEW.tags) = 'array' THEN NEW.tags ELSE '[]'::jsonb END
+                ) AS t(tag)
+                ON CONFLICT DO NOTHING;
+                INSERT INTO subpath_tag_counts (space_name, subpath, resource_type, tag, count)
+                SELECT DISTINCT NEW.space_name, NEW.subpath, NEW.resource_type, t.tag, 1 FROM jsonb_array_elements_text(
+                    CASE WHEN jsonb_typeof(NEW.tags) = 'array' THEN NEW.tags ELSE '[]'::jsonb END
+                ) AS t(tag)
+                ON CONFLICT (space_name, subpath, resource_type, tag) DO UPDATE SET count = subpath_tag_counts.count + 1;
+            END IF;
+            RETURN NULL;
+        END
+        $$
+        """,
+        "DROP TRIGGER IF EXISTS trg_entries_tags_write ON entries",
+        "CREATE TRIGGER trg_entries_tags_write AFTER INSERT OR DELETE ON entries "
+        "FOR EACH ROW EXECUTE FUNCTION dmart_entry_tags()",
+        "DROP TRIGGER IF EXISTS trg_entries_tags_update ON entries",
+        "CREATE TRIGGER trg_entries_tags_update AFTER UPDATE ON entries FOR EACH ROW "
+        "WHEN (OLD.tags IS DISTINCT FROM NEW.tags OR OLD.uuid IS DISTINCT FROM NEW.uuid "
+        "OR OLD.space_name IS DISTINCT FROM NEW.space_name OR OLD.subpath IS DISTINCT FROM NEW.subpath "
+        "OR OLD.resource_type IS DISTINCT FROM NEW.resource_type) "
+        "EXECUTE FUNCTION dmart_entry_tags()",
+    ]
+
+
+ACL_TABLES = ["entries", "spaces", "users", "roles", "permissions", "attachments"]
+
+
+def acl_users_ddl() -> list[str]:
+    """Functions and triggers keeping acl_users, and its version, in step with the acl of the metas of ACL_TABLES"""
+    ddl = [
+        """
+        CREATE OR REPLACE FUNCTION dmart_acl_users() RETURNS trigger
+        LANGUAGE plpgsql AS $$
+        DECLARE
+            removed text[] := '{}';
+            added text[] := '{}';
+        BEGIN
+            IF TG_OP IN ('UPDATE', 'DELETE') AND jsonb_typeof(OLD.acl) = 'array' AND jsonb_array_length(OLD.acl) > 0 THEN
+                WITH deleted AS (DELETE FROM acl_users WHERE entry_uuid = OLD.uuid RETURNING user_shortname)
+                SELECT coalesce(array_agg(user_shortname), '{}') INTO removed FROM deleted;
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') AND jsonb_typeof(NEW.acl) = 'array' AND jsonb_array_length(NEW.acl) > 0 THEN
+                WITH inserted AS (
+                    INSERT INTO acl_users (user_shortname, entry_uuid, space_name, subpath, shortname, resource_type)
+                    SELECT DISTINCT a.access->>'user_shortname', NEW.uuid, NEW.space_name, NEW.subpath, NEW.shortname,
+                        NEW.resource_type
+                    FROM jsonb_array_elements(NEW.acl) AS a(access)
+                    WHERE a.access->>'user_shortname' IS NOT NULL
+                    ON CONFLICT DO NOTHING
+                    RETURNING user_shortname
+                )
+                SELECT coalesce(array_agg(user_shortname), '{}') INTO added FROM inserted;
+                -- Joining the holders: the user is new to this meta and has no other one
+                IF EXISTS (
+                    SELECT 1 FROM unnest(added) AS u(name)
+                    WHERE u.name <> ALL(removed)
+                    AND NOT EXISTS (SELECT 1 FROM acl_users WHERE user_shortname = u.name AND entry_uuid <> NEW.uuid)
+                ) THEN
+                    PERFORM set_config('dmart.acl_users_changed', 'on', true);
+                END IF;
+            END IF;
+            -- Leaving the holders: the user has no meta left
+            IF EXISTS (
+                SELECT 1 FROM unnest(removed) AS u(name)
+                WHERE NOT EXISTS (SELECT 1 FROM acl_users WHERE user_shortname = u.name)
+            ) THEN
+                PERFORM set_config('dmart.acl_users_changed', 'on', true);
+            END IF;
+            RETURN NULL;
+        END
+        $$
+        """,
+        # Deferred to the commit, the version moves once per transaction and only when its changes are about to be
+        # visible, so the workers don't reload the holders before them
+        """
+        CREATE OR REPLACE FUNCTION dmart_acl_users_version() RETURNS trigger
+        LANGUAGE plpgsql AS $$
+        BEGIN
+            IF current_setting('dmart.acl_users_changed', true) = 'on' THEN
+                PERFORM set_config('dmart.acl_users_changed', 'off', true);
+                PERFORM nextval('acl_users_version_seq');
+            END IF;
+            RETURN NULL;
+        END
+        $$
+        """,
+        "DROP TRIGGER IF EXISTS trg_acl_users_version ON acl_users",
+        "CREATE CONSTRAINT TRIGGER trg_acl_users_version AFTER INSERT OR DELETE ON acl_users "
+        "DEFERRABLE INITIALLY DEFERRED FOR EACH ROW EXECUTE FUNCTION dmart_acl_users_version()",
+    ]
+    for table in ACL_TABLES:
+        ddl += [
+            f"DROP TRIGGER IF EXISTS trg_{table}_acl_users_write ON {table}",
+            f"CREATE TRIGGER trg_{table}_acl_users_write AFTER INSERT OR DELETE ON {table} "
+            "FOR EACH ROW EXECUTE FUNCTION dmart_acl_users()",
+            f"DROP TRIGGER IF EXISTS trg_{table}_acl_users_update ON {table}",
+            f"CREATE TRIGGER trg_{table}_acl_users_update AFTER UPDATE ON {table} FOR EACH ROW "
+            "WHEN (OLD.acl IS DISTINCT FROM NEW.acl OR OLD.uuid IS DISTINCT FROM NEW.uuid "
+            "OR OLD.space_name IS DISTINCT FROM NEW.space_name OR OLD.subpath IS DISTINCT FROM NEW.subpath "
+            "OR OLD.shortname IS DISTINCT FROM NEW.shortname) "
+            "EXECUTE FUNCTION dmart_acl_users()",
+        ]
+    return ddl
+
+
+TRIGRAM_INDEXES = {
+    "entries": ["shortname", "subpath", "(displayname::text)", "(displayname->>'en')", "(displayname->>'ar')", "(displayname->>'ku')"],
+    "users": ["shortname", "(displayname::text)", "email", "msisdn"],
+    "attachments": ["subpath"],
+}
+PATTERN_OPS_INDEXES = {
+    "entries": ["shortname", "subpath"],
+    "users": ["shortname", "msisdn"],
+    "attachments": ["subpath"],
+}
+
+
+def _index_suffix(expression: str) -> str:
+    return re.sub(r"[^a-z0-9]+", "_", expression.lower()).strip("_")
+
+
+def trigram_index_ddl() -> dict[str, str]:
+    """
+    Trigram GIN indexes, serving ILIKE '%...%' searches, and text_pattern_ops B-tree indexes, serving
+    prefix-anchored LIKE, keyed by index name. Payload fields come from the trigram_payload_paths setting.
+    """
+    indexes = {}
+    for table, expressions in TRIGRAM_INDEXES.items():
+        for expression in expressions:
+            name = f"idx_{table}_{_index_suffix(expression)}_trgm"
+            indexes[name] = f"CREATE INDEX IF NOT EXISTS {name} ON {table} USING GIN (({expression}) gin_trgm_ops)"
+    for table, columns in PATTERN_OPS_INDEXES.items():
+        for column in columns:
+            name = f"idx_{table}_{column}_pattern"
+            indexes[name] = f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({column} text_pattern_ops)"
+    for path in settings.trigram_payload_paths:
+        if not _SEARCH_VECTOR_PATH_RE.match(path):
+            continue
+        # Same extraction as the query builder emits for @payload.<path> searches
+        *parents, leaf = path.split(".")
+        expression = "payload" + "".join(f"->'{key}'" for key in parents) + f"->>'{leaf}'"
+        name = f"idx_entries_payload_{_index_suffix(path)}_trgm"
+        indexes[name] = f"CREATE INDEX IF NOT EXISTS {name} ON entries USING GIN (({expression}) gin_trgm_ops)"
+    return indexes
+
+
+def sync_trigram_indexes(conn: Any) -> None:
+    """Create the trigram indexes and drop the payload ones whose path left trigram_payload_paths"""
+    conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+    indexes = trigram_index_ddl()
+    for ddl in indexes.values():
+        conn.execute(text(ddl))
+    existing = conn.execute(
+        text("SELECT indexname FROM pg_indexes WHERE tablename = 'entries' AND indexname LIKE 'idx_entries_payload_%'")
+    ).scalars()
+    for name in existing:
+        if name.endswith("_trgm") and name not in indexes:
+            conn.execute(text(f"DROP INDEX IF EXISTS {name}"))
+
+
 def generate_tables():
     postgresql_url = URL.create(
         drivername=settings.database_driver.replace("+asyncpg", "+psycopg"),
@@ -501,6 +819,25 @@ def generate_tables():
                 conn.execute(text(idx_sql))
         conn.commit()
 
+    with engine.connect() as conn:
+        for ddl in search_vector_ddl():
+            conn.execute(text(ddl))
+        conn.commit()
+
+    with engine.connect() as conn:
+        for ddl in entry_tags_ddl():
+            conn.execute(text(ddl))
+        conn.commit()
+
+    with engine.connect() as conn:
+        for ddl in acl_users_ddl():
+            conn.execute(text(ddl))
+        conn.commit()
+
+    with engine.connect() as conn:
+        sync_trigram_indexes(conn)
+        conn.commit()
+
 
 # ALERMBIC
 def init_db():
@@ -0,0 +1,196 @@
+#!/usr/bin/env -S BACKEND_ENV=config.env python3
+"""
+Partial expression indexes for the payload fields folders declare in their index_attributes, csv_columns and
+unique_fields. Each index only covers the entries under its folder, with the same subpath condition the query
+builder emits, so Postgres can match it for filters on the folder or its subtree.
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import re
+import time
+
+from sqlalchemy import URL, Connection, create_engine, select, text
+from sqlmodel import col
+
+from data_adapters.sql.adapter_helpers import like_escape
+from data_adapters.sql.create_tables import Entries
+from utils.settings import settings
+
+FOLDER_INDEX_PREFIX = "idx_fld_"
+# Session advisory lock serializing the syncs of all the processes, as they drop each other's invalid indexes
+FOLDER_INDEXES_LOCK_KEY = 0x646D6172745F6978
+FOLDER_INDEXES_SYNC_RETRY_SECS = 1
+_PAYLOAD_KEY_PREFIXES = ("attributes.payload.body.", "payload.body.")
+_PATH_RE = re.compile(r"^[A-Za-z0-9_]+(\.[A-Za-z0-9_]+)*$")
+
+
+def folder_index_paths(body: dict) -> list[str]:
+    """Payload body paths declared by a folder payload, in declaration order"""
+    keys: list[str] = []
+    for declaration in ("index_attributes", "csv_columns"):
+        attributes = body.get(declaration)
+        for attribute in attributes if isinstance(attributes, list) else []:
+            if isinstance(attribute, dict) and isinstance(attribute.get("key"), str):
+                keys.append(attribute["key"])
+    unique_fields = body.get("unique_fields")
+    for compound in unique_fields if isinstance(unique_fields, list) else []:
+        if isinstance(compound, list):
+            keys.extend(key for key in compound if isinstance(key, str))
+
+    paths: list[str] = []
+    for key in keys:
+        for prefix in _PAYLOAD_KEY_PREFIXES:
+            if key.startswith(prefix):
+                path = key[len(prefix) :]
+                if _PATH_RE.match(path) and path not in paths:
+                    paths.append(path)
+                break
+    return paths
+
+
+def _sql_literal(value: str) -> str:
+    return "'" + value.replace("'", "''") + "'"
+
+
+def _digest(value: str, size: int) -> str:
+    return hashlib.sha1(value.encode()).hexdigest()[:size]
+
+
+def folder_index_name(space_name: str, subpath: str, path: str) -> str:
+    # Within Postgres' 63 chars limit; the space part lets a space be synced alone
+    return f"{FOLDER_INDEX_PREFIX}{_digest(space_name, 8)}_{_digest(f'{subpath}:{path}', 16)}"
+
+
+def folder_index_ddl(space_name: str, subpath: str, path: str) -> str:
+    """CREATE INDEX CONCURRENTLY of `path` in the payload body of the entries under the folder `subpath`"""
+    *parents, leaf = path.split(".")
+    expression = "payload->'body'" + "".join(f"->'{key}'" for key in parents) + f"->>'{leaf}'"
+    subtree = like_escape(f"{subpath}/".replace("//", "/")) + "%"
+    return (
+        f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {folder_index_name(space_name, subpath, path)} ON entries "
+        f"(({expression})) WHERE space_name = {_sql_literal(space_name)} "
+        f"AND (subpath = {_sql_literal(subpath)} OR subpath LIKE {_sql_literal(subtree)})"
+    )
+
+
+def declared_folder_indexes(conn: Connection, space_name: str | None = None) -> dict[str, str]:
+    """Index name to DDL of every index the folders (of `space_name`, or all spaces) declare"""
+    statement = select(col(Entries.space_name), col(Entries.subpath), col(Entries.shortname), col(Entries.payload)).where(
+        col(Entries.resource_type) == "folder"
+    )
+    if space_name:
+        statement = statement.where(col(Entries.space_name) == space_name)
+
+    indexes: dict[str, str] = {}
+    for folder_space, folder_subpath, folder_shortname, payload in conn.execute(statement).all():
+        body = payload.get("body") if isinstance(payload, dict) else None
+        if not isinstance(body, dict):
+            continue
+        subpath = f"{folder_subpath}/{folder_shortname}".replace("//", "/")
+        for path in folder_index_paths(body):
+            indexes[folder_index_name(folder_space, subpath, path)] = folder_index_ddl(folder_space, subpath, path)
+    return indexes
+
+
+def sync_folder_indexes(conn: Connection, space_name: str | None = None) -> dict[str, list[str]] | None:
+    """
+    Create the declared folder indexes that are missing, rebuild the invalid ones left by failed concurrent builds,
+    and drop the ones no folder declares anymore. `conn` must be in AUTOCOMMIT, as CONCURRENTLY can't run in a
+    transaction.
+
+    Returns None without syncing while another process holds the sync lock.
+    """
+    if not conn.execute(text("SELECT pg_try_advisory_lock(:key)"), {"key": FOLDER_INDEXES_LOCK_KEY}).scalar():
+        return None
+    try:
+        return _sync_folder_indexes(conn, space_name)
+    finally:
+        conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": FOLDER_INDEXES_LOCK_KEY})
+
+
+def _sync_folder_indexes(conn: Connection, space_name: str | None) -> dict[str, list[str]]:
+    declared = declared_folder_indexes(conn, space_name)
+    prefix = f"{FOLDER_INDEX_PREFIX}{_digest(space_name, 8)}_" if space_name else FOLDER_INDEX_PREFIX
+    existing: dict[str, bool] = dict(
+        conn.execute(
+            text(
+                "SELECT c.relname, i.indisvalid FROM pg_index i "
+                "JOIN pg_class c ON c.oid = i.indexrelid JOIN pg_class t ON t.oid = i.indrelid "
+                "WHERE t.relname = 'entries' AND starts_with(c.relname, :prefix)"
+            ),
+            {"prefix": prefix},
+        ).all()
+    )
+
+    # A build in progress is invalid until it ends, whoever runs it, and is left alone
+    building = set(
+        conn.execute(
+            text(
+                "SELECT c.relname FROM pg_stat_progress_create_index p JOIN pg_class c ON c.oid = p.index_relid "
+                "WHERE starts_with(c.relname, :prefix)"
+            ),
+            {"prefix": prefix},
+        ).scalars().all()
+    )
+
+    report: dict[str, list[str]] = {"created": [], "dropped": []}
+    for name, is_valid in existing.items():
+        if name in building:
+            continue
+        if name not in declared or not is_valid:
+            conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+            report["dropped"].append(name)
+    for name, ddl in declared.items():
+        if name not in building and (name not in existing or not existing[name]):
+            conn.execute(text(ddl))
+            report["created"].append(name)
+    return report
+
+
+def index_usage(conn: Connection) -> list[dict]:
+    """pg_stat_user_indexes of the database, least scanned first"""
+    rows = conn.execute(
+        text(
+            "SELECT s.relname AS table_name, s.indexrelname AS index_name, s.idx_scan, s.idx_tup_read, "
+            "s.idx_tup_fetch, pg_relation_size(s.indexrelid) AS size_bytes, i.indisvalid AS is_valid "
+            "FROM pg_stat_user_indexes s JOIN pg_index i ON i.indexrelid = s.indexrelid "
+            "ORDER BY s.idx_scan, size_bytes DESC"
+        )
+    )
+    return [dict(row) for row in rows.mappings().all()]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog="dmart.py folder_indexes",
+        description="Sync the payload indexes declared by folders and report index usage",
+    )
+    parser.add_argument("-s", "--space", help="Sync the folders of this space only (default: all)")
+    parser.add_argument("--report", action="store_true", help="Only print the pg_stat_user_indexes report")
+    args, _ = parser.parse_known_args()
+
+    postgresql_url = URL.create(
+        drivername=settings.database_driver.replace("+asyncpg", "+psycopg"),
+        host=settings.database_host,
+        port=settings.database_port,
+        username=settings.database_username,
+        password=settings.database_password,
+        database=settings.database_name,
+    )
+    engine = create_engine(postgresql_url, echo=False, isolation_level="AUTOCOMMIT")
+    with engine.connect() as conn:
+        if args.report:
+            print(json.dumps(index_usage(conn), indent=2))
+        else:
+            while (report := sync_folder_indexes(conn, args.space)) is None:
+                print("Waiting for another folder indexes sync to end")
+                time.sleep(FOLDER_INDEXES_SYNC_RETRY_SECS)
+            print(f"Created {len(report['created'])} and dropped {len(report['dropped'])} folder indexes")
+
+
+if __name__ == "__main__":
+    main()
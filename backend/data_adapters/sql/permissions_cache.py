@@ -0,0 +1,118 @@
+from collections import OrderedDict
+
+
+class UserPermissionsLRU:
+    """
+    Per-worker LRU of generated user permission maps.
+
+    Every entry remembers the roles and permissions it was built from, so a change to one role or
+    permission only evicts the users that depend on it. `version` is the last value of the global
+    permissions version counter (stored in the database) this worker has synced with.
+    """
+
+    def __init__(self, maxsize: int = 1024):
+        self.maxsize = maxsize
+        self.version: int | None = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._entries: OrderedDict[str, tuple[dict, int, frozenset[str], frozenset[str]]] = OrderedDict()
+        self._role_users: dict[str, set[str]] = {}
+        self._permission_users: dict[str, set[str]] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, user_shortname: str) -> bool:
+        return user_shortname in self._entries
+
+    def get(self, user_shortname: str) -> dict | None:
+        entry = self._entries.get(user_shortname)
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(user_shortname)
+        self.hits += 1
+        return entry[0]
+
+    def put(
+        self,
+        user_shortname: str,
+        permissions: dict,
+        row_version: int,
+        roles: list[str] | set[str],
+        permission_shortnames: list[str] | set[str],
+    ) -> None:
+        if self.maxsize <= 0:
+            return
+        self._drop(user_shortname)
+        entry = (permissions, row_version, frozenset(roles), frozenset(permission_shortnames))
+        self._entries[user_shortname] = entry
+        for role in entry[2]:
+            self._role_users.setdefault(role, set()).add(user_shortname)
+        for permission in entry[3]:
+            self._permission_users.setdefault(permission, set()).add(user_shortname)
+        while len(self._entries) > self.maxsize:
+            oldest = next(iter(self._entries))
+            self._drop(oldest)
+            self.evictions += 1
+
+    def row_versions(self) -> dict[str, int]:
+        return {user_shortname: entry[1] for user_shortname, entry in self._entries.items()}
+
+    def invalidate_user(self, user_shortname: str) -> set[str]:
+        if self._drop(user_shortname):
+            self.invalidations += 1
+            return {user_shortname}
+        return set()
+
+    def invalidate_role(self, role_shortname: str) -> set[str]:
+        return self._invalidate_users(self._role_users.get(role_shortname, set()))
+
+    def invalidate_permission(self, permission_shortname: str) -> set[str]:
+        return self._invalidate_users(self._permission_users.get(permission_shortname, set()))
+
+    def clear(self) -> None:
+        self.invalidations += len(self._entries)
+        self._entries.clear()
+        self._role_users.clear()
+        self._permission_users.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "version": self.version,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+    def _invalidate_users(self, user_shortnames: set[str]) -> set[str]:
+        invalidated = set(user_shortnames)
+        for user_shortname in invalidated:
+            self._drop(user_shortname)
+        self.invalidations += len(invalidated)
+        return invalidated
+
+    def _drop(self, user_shortname: str) -> bool:
+        entry = self._entries.pop(user_shortname, None)
+        if entry is None:
+            return False
+        for role in entry[2]:
+            users = self._role_users.get(role)
+            if users is not None:
+                users.discard(user_shortname)
+                if not users:
+                    del self._role_users[role]
+        for permission in entry[3]:
+            users = self._permission_users.get(permission)
+            if users is not None:
+                users.discard(user_shortname)
+                if not users:
+                    del self._permission_users[permission]
+        return True
@@ -0,0 +1,142 @@
+import time
+from collections import OrderedDict
+from typing import Any
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker
+from sqlalchemy.orm import Session
+
+
+class WriteTrackingSession(Session):
+    """Session flagging `info["wrote"]` once it flushed changes or ran an INSERT, UPDATE or DELETE statement"""
+
+
+@event.listens_for(WriteTrackingSession, "after_flush")
+def _flag_flush(session: Session, _flush_context: Any) -> None:
+    session.info["wrote"] = True
+
+
+@event.listens_for(WriteTrackingSession, "do_orm_execute")
+def _flag_dml(orm_execute_state: Any) -> None:
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        orm_execute_state.session.info["wrote"] = True
+
+
+def pool_stats(engine: AsyncEngine) -> dict:
+    pool: Any = engine.sync_engine.pool
+    stats: dict = {}
+    for metric in ("size", "checkedin", "checkedout", "overflow"):
+        if hasattr(pool, metric):
+            stats[metric] = getattr(pool, metric)()
+    return stats
+
+
+class Replica:
+    def __init__(self, name: str, engine: AsyncEngine):
+        self.name = name
+        self.engine = engine
+        self.session_factory = async_sessionmaker(engine, expire_on_commit=False)
+        self.ejected_until = 0.0
+        self.reads = 0
+        self.failures = 0
+        self.ejections = 0
+
+    def healthy(self, now: float) -> bool:
+        return now >= self.ejected_until
+
+    def in_use(self) -> int:
+        return int(pool_stats(self.engine).get("checkedout", 0))
+
+
+class ReplicaPool:
+    """
+    Read replicas serving the read-only queries of a worker, picked round robin or by the fewest checked out
+    connections (`least_loaded`). A replica failing to serve a connection leaves the rotation for `eject_secs`,
+    the reads fall back to the primary while none is left.
+
+    A user's reads stay on the primary for `read_your_writes` secs after one of their own writes, so the
+    replication lag never hides a change from the user who made it. Writes handled by other workers aren't seen
+    here, like the other per-worker caches.
+    """
+
+    def __init__(
+        self,
+        replicas: list[Replica],
+        strategy: str = "round_robin",
+        read_your_writes: int = 5,
+        eject_secs: int = 30,
+        max_writers: int = 10000,
+    ):
+        self.replicas = replicas
+        self.strategy = strategy
+        self.read_your_writes = read_your_writes
+        self.eject_secs = eject_secs
+        self.max_writers = max_writers
+        self.primary_reads = 0
+        self._next = 0
+        self._writers: OrderedDict[str, float] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self.replicas)
+
+    def note_write(self, user_shortname: str | None) -> None:
+        if not user_shortname or self.read_your_writes <= 0:
+            return
+        self._writers.pop(user_shortname, None)
+        self._writers[user_shortname] = time.monotonic() + self.read_your_writes
+        while len(self._writers) > self.max_writers:
+            self._writers.popitem(last=False)
+
+    def wrote_recently(self, user_shortname: str | None) -> bool:
+        if not user_shortname:
+            return False
+        until = self._writers.get(user_shortname)
+        if until is None:
+            return False
+        if time.monotonic() < until:
+            return True
+        del self._writers[user_shortname]
+        return False
+
+    def pick(self, user_shortname: str | None = None) -> Replica | None:
+        """The replica to read from, None for the primary"""
+        if not self.replicas or self.wrote_recently(user_shortname):
+            self.primary_reads += 1
+            return None
+        now = time.monotonic()
+        healthy = [replica for replica in self.replicas if replica.healthy(now)]
+        if not healthy:
+            self.primary_reads += 1
+            return None
+        if self.strategy == "least_loaded":
+            replica = min(healthy, key=lambda item: item.in_use())
+        else:
+            replica = healthy[self._next % len(healthy)]
+            self._next += 1
+        replica.reads += 1
+        return replica
+
+    def eject(self, replica: Replica) -> None:
+        replica.failures += 1
+        if replica.healthy(time.monotonic()):
+            replica.ejections += 1
+        replica.ejected_until = time.monotonic() + self.eject_secs
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        return {
+            "strategy": self.strategy,
+            "primary_reads": self.primary_reads,
+            "recent_writers": len(self._writers),
+            "replicas": [
+                {
+                    "name": replica.name,
+                    "healthy": replica.healthy(now),
+                    "reads": replica.reads,
+                    "failures": replica.failures,
+                    "ejections": replica.ejections,
+                    "pool": pool_stats(replica.engine),
+                }
+                for replica in self.replicas
+            ],
+        }
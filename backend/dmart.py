@@ -48,6 +48,7 @@ commands = """
     json_to_db
     db_to_json
     update_query_policies
+    folder_indexes
     help
     version
     info
@@ -909,6 +910,10 @@ def main():
             from data_adapters.sql.update_query_policies import main as update_query_policies
 
             update_query_policies()
+        case "folder_indexes":
+            from data_adapters.sql.folder_indexes import main as folder_indexes
+
+            folder_indexes()
         case "help":
             print("Available commands:")
             print(commands)
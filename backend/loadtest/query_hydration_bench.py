@@ -0,0 +1,116 @@
+#!/usr/bin/env -S BACKEND_ENV=config.env python3
+"""
+Time to turn a page of rows into core.Record objects and encode them as the query response, through the ORM
+(SQLModel instances, to_record, then sanitizing every attribute tree) and through the row mappings of
+apply_query_projection converted by record_from_row, which the query path uses.
+
+    python loadtest/query_hydration_bench.py --space applications --subpath /bench --limit 10000
+    python loadtest/query_hydration_bench.py --space applications --subpath /bench --populate 10000
+
+--populate first inserts that many content entries under the subpath, the space must exist.
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+from uuid import uuid4
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy.orm import defer
+from sqlmodel import col, func, select
+
+import models.api as api
+import models.core as core
+from data_adapters.sql.adapter import SQLAdapter, apply_query_projection, record_from_row
+from data_adapters.sql.create_tables import Entries
+from models.enums import QueryType, ResourceType
+
+
+async def populate(adapter: SQLAdapter, space_name: str, subpath: str, count: int) -> None:
+    async with adapter.get_session() as session:
+        session.add_all(
+            Entries(
+                uuid=uuid4(),
+                shortname=f"bench_{uuid4().hex[:12]}",
+                space_name=space_name,
+                subpath=subpath,
+                resource_type=ResourceType.content,
+                is_active=True,
+                tags=["bench", f"group_{i % 10}"],
+                displayname={"en": f"Bench entry {i}"},
+                owner_shortname="dmart",
+                acl=[],
+                relationships=[],
+                payload={
+                    "content_type": "json",
+                    "body": {"index": i, "title": f"Entry {i}", "values": list(range(20)), "nested": {"a": {"b": i}}},
+                },
+            )
+            for i in range(count)
+        )
+
+
+async def orm_records(adapter: SQLAdapter, statement) -> list[core.Record]:
+    async with adapter.get_session() as session:
+        rows = (await session.execute(statement.options(defer(Entries.search_vector)))).scalars().all()  # type: ignore
+    records = []
+    for row in rows:
+        _ = row.shortname
+        record = row.to_record(row.subpath, row.shortname)
+        record.attributes = core.sanitize_large_integers(record.attributes)
+        records.append(record)
+    return records
+
+
+async def row_records(adapter: SQLAdapter, statement, query: api.Query) -> list[core.Record]:
+    async with adapter.get_session() as session:
+        rows = (await session.execute(apply_query_projection(statement, Entries, query))).mappings().all()
+    return [record_from_row(row) for row in rows]
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--space", required=True)
+    parser.add_argument("--subpath", default="/bench")
+    parser.add_argument("--limit", type=int, default=10000)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--populate", type=int, default=0, help="entries to insert first")
+    args = parser.parse_args()
+
+    adapter = SQLAdapter()
+    if args.populate:
+        await populate(adapter, args.space, args.subpath, args.populate)
+
+    query = api.Query(
+        type=QueryType.search, space_name=args.space, subpath=args.subpath, limit=args.limit, retrieve_json_payload=True
+    )
+    statement = (
+        select(Entries)
+        .where(col(Entries.space_name) == args.space, col(Entries.subpath) == args.subpath)
+        .order_by(col(Entries.uuid))
+        .limit(args.limit)
+    )
+    async with adapter.get_session() as session:
+        matched = (await session.execute(select(func.count()).select_from(statement.subquery()))).scalar_one()
+    print(f"{matched} rows per page, best of {args.rounds} rounds")
+
+    for label, build in (
+        ("orm", lambda: orm_records(adapter, statement)),
+        ("row mapping", lambda: row_records(adapter, statement, query)),
+    ):
+        hydrate = encode = float("inf")
+        for _ in range(args.rounds):
+            started = time.perf_counter()
+            records = await build()
+            built = time.perf_counter()
+            api.Response(status=api.Status.success, records=records).model_dump_json(exclude_none=True)
+            hydrate = min(hydrate, built - started)
+            encode = min(encode, time.perf_counter() - built)
+        print(f"{label:>12}: fetch + records {hydrate * 1000:.1f} ms, encode {encode * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
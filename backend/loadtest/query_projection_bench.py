@@ -0,0 +1,74 @@
+#!/usr/bin/env -S BACKEND_ENV=config.env python3
+"""
+Bytes a listing page transfers with and without the query projection (include_fields / exclude_fields /
+retrieve_json_payload=false), measured by Postgres as the sum of pg_column_size of the selected rows.
+
+    python loadtest/query_projection_bench.py --space applications --subpath /api --limit 100
+    python loadtest/query_projection_bench.py --space applications --subpath /api --payload --include displayname
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlmodel import func, select
+
+import models.api as api
+from data_adapters.sql.adapter import SQLAdapter, query_projection, set_sql_statement_from_query
+from data_adapters.sql.adapter_helpers import set_table_for_query
+from models.enums import QueryType
+
+
+async def page_bytes(adapter: SQLAdapter, statement) -> tuple[int, int, float]:
+    page = statement.subquery()
+    measure = select(func.count(), func.coalesce(func.sum(func.pg_column_size(page.table_valued())), 0)).select_from(page)
+    async with adapter.get_session() as session:
+        started = time.perf_counter()
+        await session.execute(statement)
+        elapsed = time.perf_counter() - started
+        rows, size = (await session.execute(measure)).one()
+    return int(rows), int(size), elapsed
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--space", required=True)
+    parser.add_argument("--subpath", default="/")
+    parser.add_argument("--limit", type=int, default=100)
+    parser.add_argument("--payload", action="store_true", help="retrieve_json_payload=true")
+    parser.add_argument("--include", nargs="*", default=None, help="include_fields")
+    parser.add_argument("--exclude", nargs="*", default=None, help="exclude_fields")
+    args = parser.parse_args()
+
+    query = api.Query(
+        type=QueryType.search,
+        space_name=args.space,
+        subpath=args.subpath,
+        limit=args.limit,
+        retrieve_json_payload=args.payload,
+        include_fields=args.include,
+        exclude_fields=args.exclude,
+    )
+    table = set_table_for_query(query)
+    adapter = SQLAdapter()
+
+    columns = [column for column in table.__table__.columns if column.name not in ("media", "search_vector")]
+    full = await set_sql_statement_from_query(table, select(*columns), query, False)
+    loaded_columns, payload_expression = query_projection(table, query)
+    projected_columns = [column for column in columns if loaded_columns is None or column.name in loaded_columns]
+    if payload_expression is not None:
+        projected_columns.append(payload_expression.label("payload"))
+    projected = await set_sql_statement_from_query(table, select(*projected_columns), query, False)
+
+    for label, statement in (("full rows", full), ("projected", projected)):
+        rows, size, elapsed = await page_bytes(adapter, statement)
+        per_row = size / rows if rows else 0
+        print(f"{label:>10}: {rows} rows, {size} bytes ({per_row:.0f} per row), {elapsed * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
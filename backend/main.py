@@ -41,9 +41,11 @@ from api.user.router import router as user
 from data_adapters.adapter import data_adapter as db
 from languages.loader import load_langs
 from utils.internal_error_code import InternalErrorCode
+from utils.jq_engine import jq_engine
 from utils.jwt import decode_jwt
 from utils.logger import logging_schema
 from utils.middleware import ChannelMiddleware, CustomRequestMiddleware
+from utils.password_hashing import hashing_pool
 from utils.plugin_manager import plugin_manager
 from utils.settings import settings
 
@@ -83,6 +85,8 @@ async def lifespan(app: FastAPI):
     print('{"stage":"shutting down"}')
     if hasattr(db, "engine"):
         await db.engine.dispose()  # type: ignore[attr-defined]
+    hashing_pool.shutdown()
+    jq_engine.shutdown()
 
 
 app = FastAPI(
@@ -370,8 +374,8 @@ async def middle(request: Request, call_next):
     response = set_middleware_response_headers(request, response)
 
     # Extract user_shortname for logging without re-decoding the JWT.
-    # For login requests, use the request body; for other requests, use
-    # a lightweight cookie/header peek instead of full JWTBearer validation.
+    # For login requests, use the request body; for other requests, reuse
+    # the claims JWTBearer verified, else the cached ones of the token.
     user_shortname = "guest"
     if request.url.path == "/user/login":
         try:
@@ -386,8 +390,10 @@ async def middle(request: Request, call_next):
         try:
             auth_header = request.headers.get("authorization", "")
             auth_token = auth_header[7:] if auth_header.startswith("Bearer ") else request.cookies.get("auth_token")
-            if auth_token:
+            decoded = getattr(request.state, "jwt_data", None)
+            if decoded is None and auth_token:
                 decoded = decode_jwt(auth_token)
+            if decoded:
                 user_shortname = decoded.get("shortname", "guest")
         except Exception:
             user_shortname = "guest"
@@ -1,9 +1,12 @@
 import re
+import time
 from builtins import Exception as PyException
+from collections.abc import Iterator
+from contextlib import contextmanager
 from datetime import datetime
 from typing import Any
 
-from pydantic import BaseModel, Field, ValidationInfo, field_validator
+from pydantic import BaseModel, Field, PrivateAttr, ValidationInfo, field_validator
 
 import models.core as core
 import utils.regex as regex
@@ -14,6 +17,7 @@ from models.enums import (
     ResourceType,
     SortType,
     Status,
+    TotalMode,
 )
 from utils.settings import settings
 
@@ -136,13 +140,59 @@ class Query(BaseModel):
     retrieve_json_payload: bool = False
     retrieve_attachments: bool = False
     retrieve_total: bool = True
+    # Overrides retrieve_total: exact count, planner estimate or no total at all
+    total_mode: TotalMode | None = None
     validate_schema: bool = True
     retrieve_lock_status: bool = False
     jq_filter: str | None = Field(default=None, max_length=1024)
     limit: int = 10
     offset: int = 0
+    # Opaque keyset position, the next_cursor of the previous page. An empty string starts keyset pagination
+    cursor: str | None = Field(default=None, max_length=2048)
+    # Random queries: the same seed samples in the same order, so its pages (offset or cursor) follow each other
+    seed: str | None = Field(default=None, max_length=256)
     aggregation_data: RedisAggregate | None = None
     join: list[JoinQuery] | None = None
+    # Admin only, returns the compiled SQL, its EXPLAIN ANALYZE plan and the time spent in each phase of the query
+    explain: bool = False
+
+    _next_cursor: str | None = PrivateAttr(default=None)
+    _profile: dict | None = PrivateAttr(default=None)
+    _nested_phases: list[float] = PrivateAttr(default_factory=list)
+
+    @property
+    def next_cursor(self) -> str | None:
+        return self._next_cursor
+
+    @next_cursor.setter
+    def next_cursor(self, value: str | None) -> None:
+        self._next_cursor = value
+
+    @property
+    def profile(self) -> dict | None:
+        """Statements and phase timings gathered while serving an explained query"""
+        return self._profile
+
+    def start_profile(self) -> None:
+        self._profile = {"timings_ms": {}, "statements": {}}
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """Adds the time spent in the block, minus its nested phases, to the `name` timing of the profile"""
+        if self._profile is None:
+            yield
+            return
+        started = time.perf_counter()
+        self._nested_phases.append(0.0)
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            nested = self._nested_phases.pop()
+            if self._nested_phases:
+                self._nested_phases[-1] += elapsed
+            timings = self._profile["timings_ms"]
+            timings[name] = round(timings.get(name, 0.0) + (elapsed - nested) * 1000, 3)
 
     @field_validator("sort_by")
     @classmethod
@@ -168,6 +218,15 @@ class Query(BaseModel):
                     raise ValueError(f"filter_shortnames item '{item}' contains invalid characters")
         return v
 
+    @property
+    def effective_total_mode(self) -> TotalMode:
+        if self.total_mode:
+            return self.total_mode
+        if self.type == QueryType.random:
+            # A sample doesn't need the size of the whole match, it's counted only for an explicit total_mode
+            return TotalMode.none
+        return TotalMode.exact if self.retrieve_total else TotalMode.none
+
     # Replace -1 limit by settings.max_query_limit
     def __init__(self, **data):
         BaseModel.__init__(self, **data)
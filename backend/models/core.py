@@ -7,7 +7,7 @@ from hashlib import sha256 as hashlib_sha256
 from typing import Any, TypeVar
 from uuid import uuid4
 
-from pydantic import BaseModel, ConfigDict, Field
+from pydantic import BaseModel, ConfigDict, Field, field_serializer
 from pydantic.types import UUID4 as UUID
 
 import utils.password_hashing as password_hashing
@@ -49,6 +49,21 @@ def deep_update(mapping: dict[KeyType, Any], *updating_mappings: dict[KeyType, A
 #    dist_subpath: str = Field(default=None, regex=regex.SUBPATH)
 
 
+_INT64_MIN = -(2**63)
+_INT64_MAX = 2**63 - 1
+
+
+def sanitize_large_integers(obj: Any) -> Any:
+    """Integers out of the int64 range as strings, the rest of the tree as is"""
+    if isinstance(obj, dict):
+        return {k: sanitize_large_integers(v) for k, v in obj.items()}
+    elif isinstance(obj, list):
+        return [sanitize_large_integers(v) for v in obj]
+    elif isinstance(obj, int) and not isinstance(obj, bool) and (obj < _INT64_MIN or obj > _INT64_MAX):
+        return str(obj)
+    return obj
+
+
 class Resource(BaseModel):
     model_config = ConfigDict(use_enum_values=True, arbitrary_types_allowed=True)
 
@@ -134,6 +149,12 @@ class Record(BaseModel):
     def to_dict(self):
         return self.model_dump(exclude_none=True, warnings="error")
 
+    @field_serializer("attributes", when_used="always")
+    def serialize_attributes(self, attributes: dict[str, Any]) -> Any:
+        # Sanitized once per dump rather than on every record a query builds; the python dumps feed jq, the CSV
+        # exports and the plugins, so they are sanitized too
+        return sanitize_large_integers(attributes)
+
     def __eq__(self, other):
         return isinstance(other, Record) and self.shortname == other.shortname and self.subpath == other.subpath
 
@@ -226,7 +247,7 @@ class Meta(Resource):
     model_config = ConfigDict(validate_assignment=True)
 
     @staticmethod
-    def from_record(record: Record, owner_shortname: str):
+    def from_record(record: Record, owner_shortname: str, password_hashed: bool = False):
         if record.shortname == settings.auto_uuid_rule:
             record.uuid = uuid4()
             record.shortname = str(record.uuid)[:8]
@@ -235,7 +256,7 @@ class Meta(Resource):
         meta_class = getattr(sys.modules["models.core"], camel_case(record.resource_type))
 
         if issubclass(meta_class, User):
-            if record.attributes.get("password"):
+            if record.attributes.get("password") and not password_hashed:
                 hashed_pass = password_hashing.hash_password(record.attributes["password"])
                 record.attributes["password"] = hashed_pass
             if record.attributes.get("email"):
@@ -256,7 +277,9 @@ class Meta(Resource):
         )
         return meta_obj
 
-    def update_from_record(self, record: Record, old_body: dict | None = None, replace: bool = False) -> dict | None:
+    def update_from_record(
+        self, record: Record, old_body: dict | None = None, replace: bool = False, password_hashed: bool = False
+    ) -> dict | None:
         restricted_fields = [
             "uuid",
             "shortname",
@@ -268,7 +291,7 @@ class Meta(Resource):
         ]
         for field_name, _ in self.__dict__.items():
             if field_name in record.attributes and field_name not in restricted_fields:
-                if isinstance(self, User) and field_name == "password":
+                if isinstance(self, User) and field_name == "password" and not password_hashed:
                     self.__setattr__(
                         field_name,
                         password_hashing.hash_password(record.attributes[field_name]),
@@ -218,6 +218,12 @@ class SortType(StrEnum):
     descending = "descending"
 
 
+class TotalMode(StrEnum):
+    exact = "exact"
+    estimated = "estimated"
+    none = "none"
+
+
 class Status(StrEnum):
     success = "success"
     failed = "failed"
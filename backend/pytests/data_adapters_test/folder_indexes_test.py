@@ -0,0 +1,98 @@
+from data_adapters.sql.folder_indexes import (
+    FOLDER_INDEX_PREFIX,
+    folder_index_ddl,
+    folder_index_name,
+    folder_index_paths,
+    sync_folder_indexes,
+)
+
+
+class _Result:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def all(self):
+        return self.rows
+
+    def scalars(self):
+        return _Result([row[0] for row in self.rows])
+
+    def scalar(self):
+        return self.rows[0][0]
+
+
+class _Connection:
+    """Answers the catalog queries of a sync, records the DDL it runs"""
+
+    def __init__(self, folders, existing, building=(), locked=False):
+        self.folders = folders
+        self.existing = existing
+        self.building = building
+        self.locked = locked
+        self.ddl: list[str] = []
+        self.unlocked = False
+
+    def execute(self, statement, params=None):
+        sql = str(statement)
+        if "pg_try_advisory_lock" in sql:
+            return _Result([(not self.locked,)])
+        if "pg_advisory_unlock" in sql:
+            self.unlocked = True
+            return _Result([(True,)])
+        if "pg_stat_progress_create_index" in sql:
+            return _Result([(name,) for name in self.building])
+        if "indisvalid" in sql:
+            return _Result(list(self.existing.items()))
+        if sql.startswith(("CREATE", "DROP")):
+            self.ddl.append(sql)
+            return _Result([])
+        return _Result(self.folders)
+
+
+def test_folder_index_paths_collects_payload_declarations():
+    body = {
+        "index_attributes": [{"key": "shortname", "name": "Name"}, {"key": "payload.body.title", "name": "Title"}],
+        "csv_columns": [{"key": "attributes.payload.body.address.city", "name": "City"}, {"key": "members[0]"}],
+        "unique_fields": [["payload.body.title", "payload.body.code"], ["shortname"]],
+    }
+    assert folder_index_paths(body) == ["title", "address.city", "code"]
+
+
+def test_folder_index_paths_skips_unsafe_paths():
+    body = {"index_attributes": [{"key": "payload.body.x'); DROP TABLE entries; --"}], "unique_fields": "bad"}
+    assert folder_index_paths(body) == []
+
+
+def test_folder_index_name_is_stable_and_short():
+    name = folder_index_name("acme", "/products", "address.city")
+    assert name == folder_index_name("acme", "/products", "address.city")
+    assert name != folder_index_name("acme", "/orders", "address.city")
+    assert name.startswith(FOLDER_INDEX_PREFIX)
+    assert len(name) <= 63
+
+
+def test_folder_index_ddl_is_partial_and_concurrent():
+    ddl = folder_index_ddl("acme", "/my_products", "address.city")
+    assert ddl.startswith("CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_fld_")
+    assert "((payload->'body'->'address'->>'city'))" in ddl
+    assert "WHERE space_name = 'acme' AND (subpath = '/my_products' OR subpath LIKE '/my\\_products/%')" in ddl
+
+
+def test_sync_leaves_the_builds_in_progress_alone():
+    folder = ("acme", "/", "products", {"body": {"index_attributes": [{"key": "payload.body.title"}]}})
+    declared = folder_index_name("acme", "/products", "title")
+    stale = folder_index_name("acme", "/orders", "title")
+    conn = _Connection([folder], {declared: False, stale: False}, building=[declared])
+    assert sync_folder_indexes(conn, "acme") == {"created": [], "dropped": [stale]}
+    assert conn.ddl == [f"DROP INDEX CONCURRENTLY IF EXISTS {stale}"]
+    assert conn.unlocked
+
+    conn = _Connection([folder], {declared: False})
+    assert sync_folder_indexes(conn, "acme") == {"created": [declared], "dropped": [declared]}
+
+
+def test_sync_waits_for_the_other_processes():
+    conn = _Connection([], {"idx_fld_x": False}, locked=True)
+    assert sync_folder_indexes(conn) is None
+    assert conn.ddl == []
+    assert not conn.unlocked
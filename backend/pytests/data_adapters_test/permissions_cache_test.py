@@ -0,0 +1,96 @@
+from contextlib import asynccontextmanager
+
+import pytest
+
+from data_adapters.sql import adapter as adapter_module
+from data_adapters.sql.adapter import SQLAdapter
+from data_adapters.sql.permissions_cache import UserPermissionsLRU
+
+PERMS = {"management:users:user": {"allowed_actions": ["view"]}}
+
+
+def _cache() -> UserPermissionsLRU:
+    cache = UserPermissionsLRU(maxsize=3)
+    cache.put("alice", PERMS, 1, ["admin", "logged_in"], ["manage_users"])
+    cache.put("bob", PERMS, 1, ["editor", "logged_in"], ["edit_content"])
+    cache.put("anonymous", PERMS, 1, [], ["world"])
+    return cache
+
+
+def test_get_counts_hits_and_misses():
+    cache = _cache()
+    assert cache.get("alice") == PERMS
+    assert cache.get("carol") is None
+    stats = cache.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+    assert stats["hit_rate"] == 0.5
+
+
+def test_evicts_least_recently_used():
+    cache = _cache()
+    cache.get("alice")
+    cache.put("carol", PERMS, 1, ["logged_in"], [])
+    assert "bob" not in cache
+    assert "alice" in cache
+    assert cache.stats()["evictions"] == 1
+    assert cache.invalidate_role("editor") == set()
+
+
+def test_invalidate_role_only_drops_its_holders():
+    cache = _cache()
+    assert cache.invalidate_role("admin") == {"alice"}
+    assert "alice" not in cache
+    assert "bob" in cache and "anonymous" in cache
+
+
+def test_invalidate_shared_role_and_permission():
+    cache = _cache()
+    assert cache.invalidate_role("logged_in") == {"alice", "bob"}
+    assert cache.invalidate_permission("world") == {"anonymous"}
+    assert len(cache) == 0
+
+
+def test_invalidate_user_and_row_versions():
+    cache = _cache()
+    cache.put("alice", PERMS, 2, ["admin"], [])
+    assert cache.row_versions() == {"bob": 1, "anonymous": 1, "alice": 2}
+    assert cache.invalidate_user("alice") == {"alice"}
+    assert cache.invalidate_user("alice") == set()
+    assert cache.invalidate_permission("manage_users") == set()
+
+
+def test_zero_size_disables_caching():
+    cache = UserPermissionsLRU(maxsize=0)
+    cache.put("alice", PERMS, 1, [], [])
+    assert cache.get("alice") is None
+
+
+@pytest.mark.anyio
+async def test_permissions_version_is_polled_at_most_once_per_interval(monkeypatch):
+    adapter = SQLAdapter()
+    reads: list[int] = []
+
+    class _Result:
+        def one(self):
+            return len(reads), 0
+
+    class _Session:
+        async def execute(self, statement):
+            reads.append(1)
+            return _Result()
+
+    @asynccontextmanager
+    async def get_session(read_only: bool = False):
+        yield _Session()
+
+    monkeypatch.setattr(adapter, "get_session", get_session)
+    monkeypatch.setattr(adapter, "permissions_version_read_at", None)
+    monkeypatch.setattr(adapter_module.settings, "permissions_version_poll_ms", 60_000)
+    assert await adapter.get_permissions_version() == 1
+    assert await adapter.get_permissions_version() == 1
+    assert await adapter.get_permissions_version(fresh=True) == 2
+    assert len(reads) == 2
+
+    monkeypatch.setattr(adapter_module.settings, "permissions_version_poll_ms", 0)
+    assert await adapter.get_permissions_version() == 3
@@ -0,0 +1,85 @@
+from contextlib import asynccontextmanager
+
+import pytest
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from data_adapters.sql.adapter import SQLAdapter
+from data_adapters.sql.replicas import Replica, ReplicaPool
+from models import core
+from models.enums import ResourceType
+
+
+def _pool(strategy: str = "round_robin") -> ReplicaPool:
+    replicas = [
+        Replica(name, create_async_engine(f"postgresql+psycopg://dmart@{name}/dmart", pool_size=2))
+        for name in ("replica1", "replica2")
+    ]
+    return ReplicaPool(replicas, strategy=strategy, read_your_writes=60, eject_secs=60)
+
+
+def test_round_robin_alternates_replicas():
+    pool = _pool()
+    assert [pool.pick().name for _ in range(4)] == ["replica1", "replica2", "replica1", "replica2"]  # type: ignore
+    stats = pool.stats()
+    assert [replica["reads"] for replica in stats["replicas"]] == [2, 2]
+    assert stats["replicas"][0]["pool"]["checkedout"] == 0
+
+
+def test_least_loaded_picks_fewest_connections_in_use():
+    pool = _pool("least_loaded")
+    pool.replicas[0].in_use = lambda: 3  # type: ignore
+    assert pool.pick().name == "replica2"  # type: ignore
+
+
+def test_ejected_replicas_leave_the_rotation():
+    pool = _pool()
+    pool.eject(pool.replicas[0])
+    assert {pool.pick().name for _ in range(3)} == {"replica2"}  # type: ignore
+    pool.eject(pool.replicas[1])
+    assert pool.pick() is None
+    stats = pool.stats()
+    assert stats["primary_reads"] == 1
+    assert [replica["healthy"] for replica in stats["replicas"]] == [False, False]
+
+
+def test_recent_writers_read_from_primary():
+    pool = _pool()
+    pool.note_write("alice")
+    pool.note_write(None)
+    assert pool.pick("alice") is None
+    assert pool.pick("bob") is not None
+    assert pool.pick() is not None
+    pool.read_your_writes = 0
+    pool.note_write("bob")
+    assert pool.pick("bob") is not None
+
+
+@pytest.mark.anyio
+async def test_entries_and_acls_are_loaded_from_the_primary(monkeypatch):
+    adapter = SQLAdapter()
+    sessions: list[bool] = []
+
+    class _Result:
+        def scalars(self):
+            return self
+
+        def one_or_none(self):
+            return None
+
+        def all(self):
+            return []
+
+    class _Session:
+        async def execute(self, statement):
+            return _Result()
+
+    @asynccontextmanager
+    async def get_session(read_only: bool = False):
+        sessions.append(read_only)
+        yield _Session()
+
+    monkeypatch.setattr(adapter, "get_session", get_session)
+    for class_type in (core.User, core.Role, core.Permission, core.Content, core.Lock):
+        assert await adapter.load_or_none("management", "users", "alice", class_type) is None
+    await adapter.get_entries_acl([("applications", "/api", "entry", ResourceType.content)])
+    assert sessions and not any(sessions)
@@ -0,0 +1,28 @@
+import pytest
+from sqlalchemy.dialects import postgresql
+
+from data_adapters.sql.adapter import SQLAdapter
+
+
+@pytest.mark.anyio
+async def test_legacy_session_upgrade_skips_and_prunes_expired_rows():
+    statements: list[str] = []
+
+    class _Result:
+        def scalars(self):
+            return self
+
+        def all(self):
+            return []
+
+    class _Session:
+        async def execute(self, statement):
+            statements.append(str(statement.compile(dialect=postgresql.dialect())))
+            return _Result()
+
+    assert await SQLAdapter()._upgrade_legacy_session(_Session(), "alice", "token", "digest") is None  # type: ignore
+    pruned, selected = statements
+    assert pruned.startswith("DELETE FROM sessions")
+    assert "sessions.token_digest IS NULL" in pruned and "sessions.timestamp < " in pruned
+    assert selected.startswith("SELECT")
+    assert "sessions.token_digest IS NULL" in selected and "sessions.timestamp >= " in selected
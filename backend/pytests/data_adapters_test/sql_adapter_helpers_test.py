@@ -1,22 +1,66 @@
 """Tests for data_adapters/sql/adapter_helpers.py — covers pure functions."""
 
-import pytest
+from datetime import datetime
+from uuid import uuid4
 
+import pytest
+from sqlalchemy.dialects import postgresql
+from sqlmodel import col, select
+
+import models.api as api
+from data_adapters.sql.adapter import (
+    apply_query_projection,
+    join_right_condition,
+    join_value_text,
+    parse_join_on,
+    query_projection,
+    record_from_row,
+    set_sql_statement_from_query,
+    tag_counts_statement,
+)
 from data_adapters.sql.adapter_helpers import (
+    Explain,
     _sanitize_sql_part,
     build_query_filter_for_allowed_field_values,
+    decode_cursor_value,
+    decode_query_cursor,
+    encode_query_cursor,
     get_next_date_value,
+    is_case_free_prefix,
     is_date_time_value,
+    keyset_condition,
+    like_escape,
     parse_search_array,
     parse_search_expression,
     parse_search_string,
+    plan_rows_estimate,
+    query_sort_signature,
+    random_query_signature,
+    random_sample_pivot,
+    random_sample_statement,
+    search_relevance,
+    search_text_terms,
+    search_tsquery_sql,
     set_table_for_query,
     subpath_checker,
     transform_keys_to_sql,
     validate_search_range,
+    wildcard_like_pattern,
+)
+from data_adapters.sql.create_tables import (
+    Entries,
+    Histories,
+    Permissions,
+    Roles,
+    Spaces,
+    Users,
+    acl_users_ddl,
+    entry_tags_ddl,
+    search_vector_ddl,
+    trigram_index_ddl,
 )
-from data_adapters.sql.create_tables import Entries, Histories, Permissions, Roles, Spaces, Users
-from models.enums import QueryType
+from models.enums import QueryType, ResourceType
+from utils.settings import settings
 
 # --- subpath_checker ---
 
@@ -548,3 +592,322 @@ def test_parse_search_expression_preserves_pipe_or():
     assert len(result) == 2
     assert result[0]["fields"]["status"]["values"] == ["active", "pending"]
     assert result[0]["fields"]["status"]["operation"] == "OR"
+
+
+# --- keyset pagination cursors ---
+
+
+def test_query_cursor_roundtrip():
+    last_uuid = uuid4()
+    created_at = datetime(2024, 5, 1, 10, 30)
+    cursor = encode_query_cursor("created_at:descending", [created_at], last_uuid)
+    values, decoded_uuid = decode_query_cursor(cursor, "created_at:descending")
+    assert decoded_uuid == last_uuid
+    assert decode_cursor_value(col(Entries.created_at), values[0]) == created_at
+
+
+def test_query_cursor_sort_mismatch():
+    cursor = encode_query_cursor("created_at:descending", ["2024-05-01T10:30:00"], uuid4())
+    with pytest.raises(api.Exception):
+        decode_query_cursor(cursor, "shortname:ascending")
+
+
+def test_query_cursor_garbage():
+    with pytest.raises(api.Exception):
+        decode_query_cursor("not-a-cursor", "created_at:ascending")
+
+
+def test_query_sort_signature_defaults_to_ascending():
+    query = api.Query(type=QueryType.search, space_name="acme", subpath="/", sort_by="shortname")
+    assert query_sort_signature(query) == "shortname:ascending"
+
+
+def test_keyset_condition_uses_row_comparison_for_non_null_keys():
+    condition = keyset_condition(
+        [(col(Entries.created_at), False), (col(Entries.uuid), False)], [datetime.now(), uuid4()], True
+    )
+    sql = str(select(Entries.uuid).where(condition).compile(dialect=postgresql.dialect()))
+    assert "(entries.created_at, entries.uuid) <" in sql
+
+
+def test_keyset_condition_places_nulls_last_when_ascending():
+    condition = keyset_condition(
+        [(col(Entries.displayname), True), (col(Entries.uuid), False)], [{"en": "x"}, uuid4()], False
+    )
+    sql = str(select(Entries.uuid).where(condition).compile(dialect=postgresql.dialect()))
+    assert "entries.displayname IS NULL" in sql
+    assert "entries.uuid >" in sql
+
+
+def test_keyset_condition_null_cursor_value_descending():
+    condition = keyset_condition(
+        [(col(Entries.displayname), True), (col(Entries.uuid), False)], [None, uuid4()], True
+    )
+    sql = str(select(Entries.uuid).where(condition).compile(dialect=postgresql.dialect()))
+    assert "entries.displayname IS NOT NULL" in sql
+
+
+# --- Explain / plan_rows_estimate ---
+
+
+def test_explain_keeps_bound_params():
+    statement = select(col(Entries.uuid)).where(col(Entries.space_name) == "acme")
+    compiled = Explain(statement, analyze=True, buffers=True).compile(dialect=postgresql.dialect())
+    assert str(compiled).startswith("EXPLAIN (FORMAT JSON, ANALYZE, BUFFERS) SELECT entries.uuid")
+    assert "acme" in compiled.params.values()
+
+
+def test_plan_rows_estimate():
+    plan = [{"Plan": {"Node Type": "Seq Scan", "Plan Rows": 4200}}]
+    assert plan_rows_estimate(plan) == 4200
+    assert plan_rows_estimate('[{"Plan": {"Plan Rows": 7}}]') == 7
+
+
+# --- full-text search ---
+
+
+def test_search_text_terms_drops_field_conditions():
+    assert search_text_terms("annual report") == "annual report"
+    assert search_text_terms("@shortname:doc1 annual report") == "annual report"
+    assert search_text_terms("@shortname:doc1") == ""
+
+
+def test_search_tsquery_sql_uses_space_language():
+    sql = search_tsquery_sql("s_p_0")
+    assert "websearch_to_tsquery('simple', :s_p_0)" in sql
+    assert "dmart_space_regconfig(:search_space)" in sql
+
+
+def test_search_relevance_only_for_search_vector_tables():
+    query = api.Query(type=QueryType.search, space_name="acme", subpath="/", search="report", sort_by="relevance")
+    sql = str(select(search_relevance(Entries, query)).compile(dialect=postgresql.dialect()))
+    assert "ts_rank_cd(entries.search_vector, websearch_to_tsquery(" in sql
+    assert search_relevance(Histories, query) is None
+    assert search_relevance(Entries, api.Query(type=QueryType.search, space_name="acme", subpath="/")) is None
+
+
+def test_search_vector_ddl_covers_searchable_tables():
+    ddl = "\n".join(search_vector_ddl())
+    for table in ["entries", "users", "roles", "permissions"]:
+        assert f"CREATE TRIGGER trg_{table}_search_vector BEFORE INSERT OR UPDATE ON {table}" in ddl
+        assert f"idx_{table}_search_vector ON {table} USING GIN (search_vector)" in ddl
+    assert "'payload.body.title'" in ddl
+    assert "'msisdn'" in ddl
+
+
+# --- LIKE patterns / trigram indexes ---
+
+
+def test_like_escape_and_wildcard_pattern():
+    assert like_escape("50%_off") == "50\\%\\_off"
+    assert wildcard_like_pattern("my_doc*") == "my\\_doc%"
+    assert wildcard_like_pattern("*report*") == "%report%"
+
+
+def test_is_case_free_prefix():
+    assert is_case_free_prefix("0770*")
+    assert not is_case_free_prefix("abc*")
+    assert not is_case_free_prefix("*077")
+    assert not is_case_free_prefix("07*7*")
+
+
+def test_trigram_index_ddl_includes_payload_paths(monkeypatch):
+    monkeypatch.setattr(settings, "trigram_payload_paths", ["body.title", "bad path"])
+    indexes = trigram_index_ddl()
+    assert "idx_entries_shortname_trgm" in indexes
+    assert indexes["idx_entries_subpath_pattern"].endswith("(subpath text_pattern_ops)")
+    assert "((payload->'body'->>'title') gin_trgm_ops)" in indexes["idx_entries_payload_body_title_trgm"]
+    assert not any("bad" in name for name in indexes)
+
+
+# --- entry tags ---
+
+
+def test_entry_tags_ddl_triggers():
+    ddl = "\n".join(entry_tags_ddl())
+    assert "CREATE TRIGGER trg_entries_tags_write AFTER INSERT OR DELETE ON entries" in ddl
+    assert "CREATE TRIGGER trg_entries_tags_update AFTER UPDATE ON entries FOR EACH ROW WHEN (OLD.tags IS DISTINCT" in ddl
+    assert "ON CONFLICT (space_name, subpath, resource_type, tag) DO UPDATE" in ddl
+
+
+def test_acl_users_version_moves_at_commit_from_a_sequence():
+    ddl = "\n".join(acl_users_ddl())
+    assert "acl_users_version SET" not in ddl
+    assert "CREATE CONSTRAINT TRIGGER trg_acl_users_version AFTER INSERT OR DELETE ON acl_users " in ddl
+    assert "DEFERRABLE INITIALLY DEFERRED" in ddl
+    assert "PERFORM nextval('acl_users_version_seq')" in ddl
+    assert ddl.count("PERFORM set_config('dmart.acl_users_changed', 'on', true)") == 2
+
+
+@pytest.mark.anyio
+async def test_subtree_filter_is_a_case_sensitive_prefix_like():
+    query = api.Query(type=QueryType.search, space_name="acme", subpath="/My_Docs")
+    statement = await set_sql_statement_from_query(Entries, select(Entries), query, False)
+    compiled = statement.compile(dialect=postgresql.dialect())
+    assert "subpath LIKE %(subpath_like)s" in str(compiled) and "ILIKE" not in str(compiled)
+    assert compiled.params["subpath_like"] == "/My\\_Docs/%"
+
+
+@pytest.mark.anyio
+async def test_tags_statement_keeps_filter_params():
+    query = api.Query(type=QueryType.tags, space_name="acme", subpath="/docs", search="report", filter_tags=["a"])
+    statement = await set_sql_statement_from_query(Entries, select(Entries), query, False)
+    compiled = statement.compile(dialect=postgresql.dialect())
+    assert str(compiled).startswith("SELECT DISTINCT entry_tags.tag \nFROM entry_tags \nWHERE entry_tags.entry_uuid IN")
+    assert compiled.params["subpath_like"] == "/docs/%"
+    assert compiled.params["search"] == "report"
+    assert compiled.params["tag_1"] == ["a"]
+
+
+@pytest.mark.anyio
+async def test_filter_tags_on_jsonb_tables():
+    query = api.Query(type=QueryType.search, space_name="management", subpath="/users", filter_tags=["a", "b"])
+    statement = await set_sql_statement_from_query(Users, select(Users), query, False)
+    assert "users.tags ?| " in str(statement.compile(dialect=postgresql.dialect()))
+
+
+def test_tag_counts_statement():
+    query = api.Query(type=QueryType.tags, space_name="acme", subpath="/docs", filter_types=["content"])
+    sql = str(tag_counts_statement(Entries, query).compile(dialect=postgresql.dialect()))
+    assert "FROM subpath_tag_counts" in sql and "subpath_tag_counts.subpath LIKE" in sql
+    assert "subpath_tag_counts.resource_type IN" in sql
+    assert "HAVING sum(subpath_tag_counts.count) >" in sql
+
+    query.exact_subpath = True
+    assert "LIKE" not in str(tag_counts_statement(Entries, query).compile(dialect=postgresql.dialect()))
+    query.search = "report"
+    assert tag_counts_statement(Entries, query) is None
+    assert tag_counts_statement(Users, api.Query(type=QueryType.tags, space_name="management", subpath="/users")) is None
+
+
+# --- random sampling ---
+
+
+def test_random_sample_pivot_is_seeded():
+    assert random_sample_pivot("feed") == random_sample_pivot("feed")
+    assert random_sample_pivot("feed") != random_sample_pivot("other")
+    assert random_sample_pivot(None) != random_sample_pivot(None)
+
+
+def test_random_sample_statement_wraps_around_the_pivot():
+    query = api.Query(type=QueryType.random, space_name="acme", subpath="/", seed="feed", limit=5, offset=10)
+    statement = random_sample_statement(select(Entries).order_by(col(Entries.shortname)).limit(3), Entries, query)
+    compiled = statement.compile(dialect=postgresql.dialect())
+    sql = str(compiled)
+    assert "entries.uuid >= %(uuid_1)s::UUID ORDER BY entries.uuid" in sql
+    assert "entries.uuid < %(uuid_2)s::UUID ORDER BY entries.uuid" in sql
+    assert "UNION ALL" in sql and "ORDER BY random_sample.random_leg, random_sample.uuid" in sql
+    assert "ORDER BY entries.shortname" not in sql
+    assert compiled.params["param_2"] == compiled.params["param_4"] == 15
+    assert (compiled.params["param_5"], compiled.params["param_6"]) == (5, 10)
+
+
+def test_random_sample_statement_cursor():
+    query = api.Query(type=QueryType.random, space_name="acme", subpath="/", seed="feed", limit=5, offset=10)
+    query.cursor = encode_query_cursor(random_query_signature(query), [1], uuid4())
+    sql = str(random_sample_statement(select(Entries), Entries, query).compile(dialect=postgresql.dialect()))
+    assert "UNION ALL" not in sql and ">=" not in sql
+    assert "entries.uuid < %(uuid_1)s::UUID AND entries.uuid > %(uuid_2)s::UUID" in sql
+
+    query.cursor = encode_query_cursor(random_query_signature(query), [2], uuid4())
+    with pytest.raises(api.Exception):
+        random_sample_statement(select(Entries), Entries, query)
+    query.seed = "other"
+    with pytest.raises(api.Exception):
+        random_sample_statement(select(Entries), Entries, query)
+
+
+# --- query projection ---
+
+
+def test_query_projection_strips_payload_body_by_default():
+    query = api.Query(type=QueryType.search, space_name="acme", subpath="/")
+    columns, payload_expression = query_projection(Entries, query)
+    assert columns is not None and "payload" not in columns and "displayname" in columns
+    sql = str(select(payload_expression).compile(dialect=postgresql.dialect()))
+    assert "(entries.payload - 'body')" in sql
+
+
+def test_query_projection_include_fields():
+    query = api.Query(
+        type=QueryType.search,
+        space_name="acme",
+        subpath="/",
+        sort_by="created_at",
+        retrieve_json_payload=True,
+        include_fields=["displayname", "payload.body.title"],
+    )
+    columns, payload_expression = query_projection(Entries, query)
+    assert columns == ["created_at", "displayname", "resource_type", "shortname", "space_name", "subpath", "uuid"]
+    assert "jsonb_build_object" in str(select(payload_expression).compile(dialect=postgresql.dialect()))
+
+
+def test_query_projection_keeps_full_rows_when_not_narrowed():
+    query = api.Query(type=QueryType.search, space_name="acme", subpath="/", retrieve_json_payload=True)
+    assert query_projection(Entries, query) == (None, None)
+    query.exclude_fields = ["payload.body.big", "tags"]
+    columns, payload_expression = query_projection(Entries, query)
+    assert columns is not None and "tags" not in columns
+    assert "#-" in str(select(payload_expression).compile(dialect=postgresql.dialect()))
+
+
+def test_apply_query_projection_selects_plain_columns():
+    query = api.Query(type=QueryType.search, space_name="acme", subpath="/")
+    statement = apply_query_projection(select(Entries).where(col(Entries.subpath) == "/"), Entries, query)
+    sql = str(statement.compile(dialect=postgresql.dialect()))
+    assert sql.startswith("SELECT entries.acl,") and "entries.payload," not in sql
+    assert "AS projected_payload" in sql and "search_vector" not in sql
+    assert "WHERE entries.subpath =" in sql
+
+
+def test_record_from_row_matches_to_record():
+    entry = Entries(
+        uuid=uuid4(),
+        shortname="item",
+        space_name="acme",
+        subpath="/products/",
+        resource_type="content",
+        tags=["a"],
+        payload={"content_type": "json", "body": {"n": 1}},
+        owner_shortname="dmart",
+    )
+    row = {key: value for key, value in entry.__dict__.items() if key not in ("_sa_instance_state", "search_vector")}
+    row["total_count"] = 7
+    expected = entry.to_record(entry.subpath, entry.shortname)
+    record = record_from_row(row)
+    assert record.resource_type is ResourceType.content
+    assert record.subpath == expected.subpath == "products"
+    assert (record.uuid, record.shortname, record.attributes) == (expected.uuid, expected.shortname, expected.attributes)
+
+    row["projected_payload"] = {"content_type": "json", "body": None}
+    assert record_from_row(row).attributes["payload"] == {"content_type": "json", "body": None}
+    del row["resource_type"]
+    assert record_from_row(row, ResourceType.history).resource_type is ResourceType.history
+
+
+# --- SQL joins ---
+
+
+def test_parse_join_on():
+    assert parse_join_on("payload.body.owner:shortname, tags[]:payload.body.codes[]") == [
+        ("payload.body.owner", False, "shortname", False),
+        ("tags", True, "payload.body.codes", True),
+    ]
+    with pytest.raises(ValueError):
+        parse_join_on("shortname")
+
+
+def test_join_value_text_matches_postgres_text():
+    assert join_value_text(True) == "true"
+    assert join_value_text(ResourceType.content) == "content"
+    assert join_value_text(12) == "12"
+
+
+def test_join_right_condition():
+    left_values = select(col(Entries.shortname))
+    column_sql = str(join_right_condition(Entries, "owner_shortname", left_values).compile(dialect=postgresql.dialect()))
+    assert column_sql.startswith("CAST(entries.owner_shortname AS TEXT) IN (SELECT")
+    json_sql = str(join_right_condition(Entries, "payload.body.codes", left_values).compile(dialect=postgresql.dialect()))
+    assert "jsonb_array_elements_text(CASE WHEN" in json_sql and "jsonb_build_array(entries.payload #>" in json_sql
+    for path in ("subpath", "created_at", "body.codes", "owner_shortname.x"):
+        assert join_right_condition(Entries, path, left_values) is None
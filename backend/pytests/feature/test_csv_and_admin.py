@@ -1,12 +1,18 @@
+import csv
+from io import StringIO
+
 import pytest
 from fastapi import status
 from httpx import AsyncClient
 
-from models.enums import QueryType
+from models.enums import ContentType, QueryType, RequestType, ResourceType
 from pytests.base_test import (
+    DEMO_SPACE,
     MANAGEMENT_SPACE,
     USERS_SUBPATH,
+    assert_code_and_status_success,
 )
+from utils.settings import settings
 
 # --- CSV Export tests ---
 # The CSV endpoint requires the folder to have payload with csv_columns/index_attributes.
@@ -64,6 +70,94 @@ async def test_csv_export_nonexistent_space(client: AsyncClient):
     ]
 
 
+CSV_FOLDER = "csv_export"
+CSV_COLUMNS = [
+    {"key": "shortname", "name": "Shortname"},
+    {"key": "attributes.payload.body.price", "name": "Price"},
+    {"key": "attributes.payload.body.never_set", "name": "Never set"},
+]
+
+
+def _csv_rows(response) -> list[list[str]]:
+    assert response.status_code == status.HTTP_200_OK, response.text
+    assert "text/csv" in response.headers.get("content-type", "")
+    return list(csv.reader(StringIO(response.text.lstrip("\ufeff"))))
+
+
+def _csv_query(**kwargs) -> dict:
+    return {
+        "type": QueryType.subpath,
+        "space_name": DEMO_SPACE,
+        "subpath": CSV_FOLDER,
+        "sort_by": "shortname",
+        "sort_type": "ascending",
+        **kwargs,
+    }
+
+
+@pytest.mark.run(order=3)
+@pytest.mark.anyio
+async def test_csv_export_create_folder_with_csv_columns(client: AsyncClient):
+    folder = {
+        "resource_type": ResourceType.folder,
+        "subpath": "/",
+        "shortname": CSV_FOLDER,
+        "attributes": {"payload": {"content_type": ContentType.json, "body": {"csv_columns": CSV_COLUMNS}}},
+    }
+    entries = [
+        {
+            "resource_type": ResourceType.content,
+            "subpath": CSV_FOLDER,
+            "shortname": shortname,
+            "attributes": {"payload": {"content_type": ContentType.json, "body": body}},
+        }
+        for shortname, body in (("csv_a", {"price": 10}), ("csv_b", {"name": "no price"}))
+    ]
+    for record in [folder, *entries]:
+        request_data = {"space_name": DEMO_SPACE, "request_type": RequestType.create, "records": [record]}
+        assert_code_and_status_success(await client.post("managed/request", json=request_data))
+
+
+@pytest.mark.run(order=3)
+@pytest.mark.anyio
+async def test_csv_export_single_pass_writes_every_column(client: AsyncClient, monkeypatch):
+    monkeypatch.setattr(settings, "csv_export_single_pass", True)
+    rows = _csv_rows(await client.post("/managed/csv", json=_csv_query()))
+    assert rows == [["Shortname", "Price", "Never set"], ["csv_a", "10", ""], ["csv_b", "", ""]]
+
+
+@pytest.mark.run(order=3)
+@pytest.mark.anyio
+async def test_csv_export_two_passes_drop_the_never_set_columns(client: AsyncClient, monkeypatch):
+    monkeypatch.setattr(settings, "csv_export_single_pass", False)
+    rows = _csv_rows(await client.post("/managed/csv", json=_csv_query()))
+    assert rows == [["Shortname", "Price"], ["csv_a", "10"], ["csv_b", ""]]
+
+
+@pytest.mark.run(order=3)
+@pytest.mark.anyio
+async def test_csv_export_of_non_listing_queries(client: AsyncClient, monkeypatch):
+    monkeypatch.setattr(settings, "csv_export_single_pass", True)
+    rows = _csv_rows(await client.post("/managed/csv", json=_csv_query(type=QueryType.random, seed="csv")))
+    assert rows[0] == ["Shortname", "Price", "Never set"]
+    assert sorted(row[0] for row in rows[1:]) == ["csv_a", "csv_b"]
+
+    jq_filter = '.[] | select(.shortname == "csv_a")'
+    rows = _csv_rows(await client.post("/managed/csv", json=_csv_query(type=QueryType.search, jq_filter=jq_filter)))
+    assert rows == [["Shortname", "Price", "Never set"], ["csv_a", "10", ""]]
+
+
+@pytest.mark.run(order=3)
+@pytest.mark.anyio
+async def test_csv_export_delete_folder(client: AsyncClient):
+    request_data = {
+        "space_name": DEMO_SPACE,
+        "request_type": RequestType.delete,
+        "records": [{"resource_type": ResourceType.folder, "subpath": "/", "shortname": CSV_FOLDER, "attributes": {}}],
+    }
+    assert_code_and_status_success(await client.post("managed/request", json=request_data))
+
+
 # --- Reload Security Data tests ---
 
 
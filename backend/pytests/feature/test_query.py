@@ -1,13 +1,21 @@
+import json
+
 import pytest
 from fastapi import status
 from httpx import AsyncClient
 
-from models.enums import QueryType
+from data_adapters.adapter import data_adapter as db
+from models.enums import ContentType, QueryType, RequestType, ResourceType
 from pytests.base_test import (
     DEMO_SPACE,
     DEMO_SUBPATH,
+    assert_code_and_status_success,
 )
 from pytests.feature.test_resource_and_attachment import json_entry_shortname
+from utils.settings import settings
+
+ATTACHMENTS_FOLDER = "attachments_query"
+ATTACHMENT_PARENTS = {"parent_a": ["note_1", "note_2"], "parent_b": ["note_3"]}
 
 
 @pytest.mark.run(order=3)
@@ -42,6 +50,31 @@ async def test_query_search(client: AsyncClient) -> None:
     assert json_response["attributes"]["returned"] > 0
 
 
+@pytest.mark.run(order=3)
+@pytest.mark.anyio
+async def test_query_stream(client: AsyncClient) -> None:
+    response = await client.post(
+        "/managed/query/stream",
+        json={"type": QueryType.subpath, "space_name": DEMO_SPACE, "subpath": DEMO_SUBPATH},
+    )
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    records = [json.loads(line) for line in response.text.splitlines()]
+    assert len(records) > 0
+    assert all(record["subpath"] for record in records)
+
+
+@pytest.mark.run(order=3)
+@pytest.mark.anyio
+async def test_query_random_seed(client: AsyncClient) -> None:
+    query = {"type": QueryType.random, "space_name": DEMO_SPACE, "subpath": DEMO_SUBPATH, "seed": "demo", "limit": 2}
+    first = (await client.post("/managed/query", json=query)).json()
+    again = (await client.post("/managed/query", json=query)).json()
+    assert first["status"] == "success"
+    assert first["attributes"]["returned"] > 0
+    assert [record["shortname"] for record in first["records"]] == [record["shortname"] for record in again["records"]]
+
+
 @pytest.mark.run(order=3)
 @pytest.mark.anyio
 async def test_query_history(client: AsyncClient) -> None:
@@ -112,3 +145,79 @@ async def test_query_aggregate(client: AsyncClient) -> None:
     assert isinstance(json_response["records"][0]["attributes"], dict)
     assert "active_num" in list(json_response["records"][0]["attributes"].keys())
 
+
+
+async def _query_attachments(client: AsyncClient) -> dict[str, list[str]]:
+    response = await client.post(
+        "/managed/query",
+        json={
+            "type": QueryType.search,
+            "space_name": DEMO_SPACE,
+            "subpath": ATTACHMENTS_FOLDER,
+            "search": "",
+            "filter_shortnames": list(ATTACHMENT_PARENTS),
+            "retrieve_attachments": True,
+        },
+    )
+    assert response.status_code == status.HTTP_200_OK
+    return {
+        record["shortname"]: [comment["shortname"] for comment in record["attachments"].get("comment", [])]
+        for record in response.json()["records"]
+    }
+
+
+@pytest.mark.run(order=3)
+@pytest.mark.anyio
+async def test_query_attachments_create_entries(client: AsyncClient) -> None:
+    records = [{"resource_type": ResourceType.folder, "subpath": "/", "shortname": ATTACHMENTS_FOLDER, "attributes": {}}]
+    for parent, comments in ATTACHMENT_PARENTS.items():
+        records.append({"resource_type": ResourceType.content, "subpath": ATTACHMENTS_FOLDER, "shortname": parent, "attributes": {}})
+        records += [
+            {
+                "resource_type": ResourceType.comment,
+                "subpath": f"{ATTACHMENTS_FOLDER}/{parent}",
+                "shortname": comment,
+                "attributes": {"payload": {"content_type": ContentType.comment, "body": {"body": comment}}},
+            }
+            for comment in comments
+        ]
+    # One request per record, so the comments of an entry are created in order
+    for record in records:
+        request_data = {"space_name": DEMO_SPACE, "request_type": RequestType.create, "records": [record]}
+        assert_code_and_status_success(await client.post("managed/request", json=request_data))
+
+
+@pytest.mark.run(order=3)
+@pytest.mark.anyio
+async def test_query_attachments_are_grouped_by_entry(client: AsyncClient, monkeypatch) -> None:
+    monkeypatch.setattr(settings, "query_attachments_per_type_limit", 0)
+    assert await _query_attachments(client) == ATTACHMENT_PARENTS
+
+
+@pytest.mark.run(order=3)
+@pytest.mark.anyio
+async def test_query_attachments_per_type_limit(client: AsyncClient, monkeypatch) -> None:
+    monkeypatch.setattr(settings, "query_attachments_per_type_limit", 1)
+    assert await _query_attachments(client) == {"parent_a": ["note_1"], "parent_b": ["note_3"]}
+
+
+@pytest.mark.run(order=3)
+@pytest.mark.anyio
+async def test_entry_attachments_include_fields_and_filters() -> None:
+    attachments = await db.get_entry_attachments(
+        subpath=ATTACHMENTS_FOLDER,
+        attachments_path=settings.spaces_folder / f"{DEMO_SPACE}/{ATTACHMENTS_FOLDER}/.dm/parent_a",
+        include_fields=["payload"],
+    )
+    comments = attachments[ResourceType.comment]
+    assert [comment["shortname"] for comment in comments] == ["note_1", "note_2"]
+    assert all(set(comment["attributes"]) == {"payload"} for comment in comments)
+
+    attachments = await db.get_entry_attachments(
+        subpath=ATTACHMENTS_FOLDER,
+        attachments_path=settings.spaces_folder / f"{DEMO_SPACE}/{ATTACHMENTS_FOLDER}/.dm/parent_a",
+        filter_types=[ResourceType.comment],
+        filter_shortnames=["note_2"],
+    )
+    assert [comment["shortname"] for comment in attachments[ResourceType.comment]] == ["note_2"]
+    assert "owner_shortname" in attachments[ResourceType.comment][0]["attributes"]
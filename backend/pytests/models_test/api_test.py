@@ -1,3 +1,4 @@
+import time
 from datetime import datetime
 
 import pytest
@@ -12,6 +13,7 @@ from models.enums import (
     ResourceType,
     SortType,
     Status,
+    TotalMode,
 )
 from utils.settings import settings
 
@@ -122,6 +124,37 @@ def test_query_model():
     assert query_with_negative_limit.limit == settings.max_query_limit
 
 
+def test_query_total_mode():
+    assert Query(type=QueryType.search, space_name="acme", subpath="/").effective_total_mode == TotalMode.exact
+    query = Query(type=QueryType.search, space_name="acme", subpath="/", retrieve_total=False)
+    assert query.effective_total_mode == TotalMode.none
+    query = Query(type=QueryType.search, space_name="acme", subpath="/", retrieve_total=False, total_mode="estimated")
+    assert query.effective_total_mode == TotalMode.estimated
+    assert Query(type=QueryType.random, space_name="acme", subpath="/").effective_total_mode == TotalMode.none
+    query = Query(type=QueryType.random, space_name="acme", subpath="/", total_mode="exact")
+    assert query.effective_total_mode == TotalMode.exact
+    query = Query(type=QueryType.random, space_name="acme", subpath="/", total_mode="estimated")
+    assert query.effective_total_mode == TotalMode.estimated
+
+
+def test_query_explain_phases():
+    query = Query(type=QueryType.search, space_name="test", subpath="/", explain=True)
+    with query.phase("page_query"):
+        pass
+    assert query.profile is None
+
+    query.start_profile()
+    with query.phase("final_results"):
+        time.sleep(0.01)
+        with query.phase("attachments"):
+            time.sleep(0.02)
+    timings = query.profile["timings_ms"]
+    assert timings["attachments"] >= 20
+    assert 10 <= timings["final_results"] < timings["attachments"]
+    assert query.profile["statements"] == {}
+    assert "profile" not in query.model_dump()
+
+
 def test_error_model():
     error = Error(
         type="ValidationError", code=400, message="Invalid input", info=[{"field": "email", "error": "invalid email"}]
@@ -3,6 +3,8 @@
 import pytest
 from pydantic import ValidationError
 
+import utils.repository as repository
+from api.managed.utils import csv_entries_prepare_row
 from models.api import Query, RedisAggregate, RedisReducer
 from models.core import (
     Content,
@@ -11,6 +13,7 @@ from models.core import (
     Record,
     User,
     deep_update,
+    sanitize_large_integers,
 )
 from models.enums import (
     ContentType,
@@ -20,6 +23,52 @@ from models.enums import (
 )
 from utils.ticket_sys_utils import check_open_state, post_transite, transite
 
+# ==================== sanitize_large_integers ====================
+
+
+def test_sanitize_large_integers():
+    assert sanitize_large_integers({"a": [2**63, -(2**63) - 1, 2**63 - 1, True], "b": "x"}) == {
+        "a": [str(2**63), str(-(2**63) - 1), 2**63 - 1, True],
+        "b": "x",
+    }
+
+
+def _big_record() -> Record:
+    return Record.model_construct(
+        resource_type=ResourceType.content, shortname="item", subpath="products", attributes={"big": 2**64}
+    )
+
+
+def test_record_sanitizes_large_integers_when_dumped():
+    record = _big_record()
+    assert record.attributes["big"] == 2**64
+    assert record.to_dict()["attributes"]["big"] == str(2**64)
+    assert record.model_dump(mode="json")["attributes"]["big"] == str(2**64)
+    assert f'"big":"{2**64}"' in record.model_dump_json()
+
+
+@pytest.mark.anyio
+async def test_large_integers_reach_jq_and_csv_as_strings(monkeypatch):
+    jq_inputs: list = []
+
+    async def query(query, user_shortname):
+        return 1, [_big_record()]
+
+    async def run(jq_filter, value):
+        jq_inputs.append(value)
+        return value
+
+    monkeypatch.setattr(repository.db, "query", query)
+    monkeypatch.setattr(repository.jq_engine, "run", run)
+    await repository.serve_query(
+        Query(type=QueryType.search, space_name="acme", subpath="/products", jq_filter="."), "dmart"
+    )
+    assert jq_inputs[0][0]["attributes"]["big"] == str(2**64)
+
+    row = csv_entries_prepare_row(_big_record().model_dump(), [{"key": "attributes.big", "name": "Big"}], {})
+    assert row == {"Big": str(2**64)}
+
+
 # ==================== deep_update ====================
 
 
@@ -0,0 +1,71 @@
+import time
+
+import pytest
+
+import models.api as api
+from utils.internal_error_code import InternalErrorCode
+from utils.jq_engine import JqEngine, jq_results
+from utils.settings import settings
+
+
+def _sleeping_runner(jq_filter: str, value):
+    """Stands for a jq program running for `jq_filter` secs, while holding the process"""
+    time.sleep(float(jq_filter))
+    return [value]
+
+
+def test_jq_results_unwraps_a_single_array():
+    assert jq_results([[{"a": 1}, {"a": 2}]]) == [{"a": 1}, {"a": 2}]
+    assert jq_results([1, 2]) == [1, 2]
+    assert jq_results([{"a": 1}]) == [{"a": 1}]
+    assert jq_results([]) == []
+
+
+def test_jq_engine_latency_stats():
+    engine = JqEngine(maxsize=2, workers=1)
+    engine._record_latency(".a", "runs", 2.0)
+    engine._record_latency(".a", "timeouts", 4.0)
+    engine._record_latency(".b", "errors", 1.0)
+    engine._record_latency(".c", "runs", 1.0)
+    filters = engine.stats()["filters"]
+    assert list(filters) == [".b", ".c"]
+    engine._record_latency(".b", "runs", 3.0)
+    assert engine.stats()["filters"][".b"] == {"runs": 1, "errors": 1, "timeouts": 0, "avg_ms": 2.0, "max_ms": 3.0}
+
+
+@pytest.mark.anyio
+async def test_jq_engine_runs_compiled_filters():
+    pytest.importorskip("jq")
+    engine = JqEngine(maxsize=1, workers=1)
+    records = [{"shortname": "a", "n": 1}, {"shortname": "b", "n": 2}]
+    assert await engine.run("map(select(.n > 1) | .shortname)", records) == ["b"]
+    assert await engine.run("map(select(.n > 1) | .shortname)", records) == ["b"]
+    assert await engine.run(".[] | .n", records) == [1, 2]
+    stats = engine.stats()
+    assert (stats["hits"], stats["misses"], stats["evictions"], stats["size"]) == (1, 2, 1, 1)
+
+    with pytest.raises(api.Exception) as e:
+        engine.compile("map(")
+    assert e.value.error.code == InternalErrorCode.JQ_ERROR
+
+
+@pytest.mark.anyio
+async def test_jq_engine_kills_timed_out_programs(monkeypatch):
+    monkeypatch.setattr(settings, "jq_timeout", 1)
+    engine = JqEngine(maxsize=2, workers=1, runner=_sleeping_runner)
+    monkeypatch.setattr(engine, "compile", lambda jq_filter: None)
+    try:
+        assert await engine.run("0", {"a": 1}) == [{"a": 1}]
+        started = time.perf_counter()
+        with pytest.raises(api.Exception) as e:
+            await engine.run("60", {"a": 1})
+        assert e.value.error.code == InternalErrorCode.JQ_TIMEOUT
+        assert time.perf_counter() - started < 10
+
+        # The killed process is replaced on the next run
+        assert await engine.run("0", [2]) == [2]
+        stats = engine.stats()
+        assert (stats["restarts"], stats["idle_processes"]) == (1, 1)
+        assert stats["filters"]["60"]["timeouts"] == 1
+    finally:
+        engine.shutdown()
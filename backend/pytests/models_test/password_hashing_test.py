@@ -0,0 +1,92 @@
+import pytest
+
+import models.api as api
+import models.core as core
+from models.enums import ResourceType
+from utils import password_hashing
+from utils.internal_error_code import InternalErrorCode
+from utils.password_hashing import PasswordHashingPool
+
+
+@pytest.fixture
+def cheap_hashing(monkeypatch):
+    monkeypatch.setattr(password_hashing.settings, "password_hash_memory_cost", 1024)
+    monkeypatch.setattr(password_hashing.settings, "password_hash_time_cost", 1)
+    monkeypatch.setattr(password_hashing.settings, "password_hash_parallelism", 1)
+
+
+@pytest.mark.anyio
+async def test_pool_hashes_and_verifies(cheap_hashing):
+    pool = PasswordHashingPool(workers=1, queue_limit=4)
+    try:
+        hashed = await pool.hash("s3cret")
+        assert await pool.verify("s3cret", hashed)
+        assert not await pool.verify("wrong", hashed)
+        assert not await pool.verify("s3cret", "not a hash")
+    finally:
+        pool.shutdown()
+
+    stats = pool.stats()
+    assert (stats["in_flight"], stats["rejected"]) == (0, 0)
+    assert stats["operations"]["hash"]["calls"] == 1
+    verify = stats["operations"]["verify"]
+    assert verify["calls"] == 3
+    assert sum(verify["histogram_ms"].values()) == 3
+
+
+@pytest.mark.anyio
+async def test_login_rehashes_after_a_parameters_change(cheap_hashing, monkeypatch):
+    pool = PasswordHashingPool(workers=0)
+    hashed = await pool.hash("s3cret")
+    assert await pool.verify_and_rehash("s3cret", hashed) == (True, None)
+
+    monkeypatch.setattr(password_hashing.settings, "password_hash_time_cost", 2)
+    assert password_hashing.needs_rehash(hashed)
+    assert await pool.verify_and_rehash("wrong", hashed) == (False, None)
+    valid, rehashed = await pool.verify_and_rehash("s3cret", hashed)
+    assert valid and rehashed and rehashed != hashed
+    assert not password_hashing.needs_rehash(rehashed)
+    assert await pool.verify("s3cret", rehashed)
+
+
+@pytest.mark.anyio
+async def test_user_records_are_hashed_before_their_meta_is_built(cheap_hashing):
+    pool = PasswordHashingPool(workers=0)
+    record = core.Record(
+        resource_type=ResourceType.user, shortname="alice", subpath="/users", attributes={"password": "s3cret"}
+    )
+    password_hashed = await pool.hash_record_password(record)
+    hashed = record.attributes["password"]
+    assert password_hashed and await pool.verify("s3cret", hashed)
+
+    user = core.Meta.from_record(record=record, owner_shortname="dmart", password_hashed=password_hashed)
+    assert user.password == hashed  # type: ignore
+    user.update_from_record(record, password_hashed=password_hashed)
+    assert user.password == hashed  # type: ignore
+    assert pool.stats()["operations"]["hash"]["calls"] == 1
+
+    folder = core.Record(resource_type=ResourceType.folder, shortname="f", subpath="/", attributes={"password": "x"})
+    assert not await pool.hash_record_password(folder)
+    assert folder.attributes["password"] == "x"
+
+
+@pytest.mark.anyio
+async def test_saturated_pool_rejects(cheap_hashing):
+    pool = PasswordHashingPool(workers=1, queue_limit=1)
+    pool.in_flight = 1
+    with pytest.raises(api.Exception) as e:
+        await pool.verify("s3cret", "hash")
+    assert e.value.status_code == 503
+    assert e.value.error.code == InternalErrorCode.PASSWORD_HASHING_BUSY
+    assert pool.stats()["rejected"] == 1
+
+
+def test_latency_histogram_buckets():
+    pool = PasswordHashingPool(workers=0)
+    for elapsed_ms in (1.0, 10.0, 10.5, 7000.0):
+        pool._record_latency("verify", elapsed_ms)
+    verify = pool.stats()["operations"]["verify"]
+    assert verify["histogram_ms"]["<=10"] == 2
+    assert verify["histogram_ms"]["<=25"] == 1
+    assert verify["histogram_ms"][">5000"] == 1
+    assert verify["max_ms"] == 7000.0
@@ -0,0 +1,229 @@
+import itertools
+import random
+import time
+
+import pytest
+
+from models.core import ACL, User
+from models.enums import ActionType, ConditionType, ResourceType
+from utils.access_control import AccessControl
+from utils.helpers import flatten_dict
+from utils.permission_trie import compile_permissions
+from utils.settings import settings
+
+ALL_SPACES = settings.all_spaces_mw
+ALL_SUBPATHS = settings.all_subpaths_mw
+
+
+def _permission(actions: list[str], conditions: list[str] | None = None, restricted_fields: list[str] | None = None):
+    return {
+        "allowed_actions": actions,
+        "conditions": conditions or [],
+        "restricted_fields": restricted_fields or [],
+        "allowed_fields_values": {},
+        "filter_fields_values": {},
+    }
+
+
+def _string_keys_access(
+    user_permissions: dict,
+    space_name: str,
+    subpath_parts: list[str],
+    resource_type: str,
+    action_type: ActionType,
+    achieved: set,
+    record_attributes: dict,
+) -> bool:
+    """The prefix walk over the string keys of the permissions map that the tries replace"""
+    control = AccessControl()
+
+    def allowed(key: str) -> bool:
+        permission = user_permissions[key]
+        return (
+            action_type in permission["allowed_actions"]
+            and control.check_access_conditions(set(permission["conditions"]), achieved, action_type)
+            and control.check_access_restriction(
+                permission["restricted_fields"], permission["allowed_fields_values"], action_type, record_attributes
+            )
+        )
+
+    search_subpath = ""
+    for part in ["/", *subpath_parts]:
+        search_subpath += part
+        parts = search_subpath.split("/")
+        if len(parts) > 1:
+            parts[-2] = ALL_SUBPATHS
+            global_subpath = "/".join(parts)
+        else:
+            global_subpath = ALL_SUBPATHS
+        if global_subpath[-1] == "/" and len(global_subpath) > 1:
+            global_subpath = global_subpath[:-1]
+        global_key = None
+        for key in (
+            f"{ALL_SPACES}:{global_subpath}:{resource_type}",
+            f"{space_name}:{global_subpath}:{resource_type}",
+            f"{ALL_SPACES}:{search_subpath}:{resource_type}",
+        ):
+            if key in user_permissions:
+                global_key = key
+        if global_key and allowed(global_key):
+            return True
+        key = f"{space_name}:{search_subpath}:{resource_type}"
+        if key in user_permissions and allowed(key):
+            return True
+        search_subpath = "" if search_subpath == "/" else f"{search_subpath}/"
+    return False
+
+
+PERMISSIONS = {
+    "applications:/:folder": _permission(["view", "query"]),
+    "applications:api:content": _permission(["view", "update"], ["own"]),
+    "applications:api/user:content": _permission(["create"], restricted_fields=["payload.body.secret"]),
+    f"applications:{ALL_SUBPATHS}:schema": _permission(["view"]),
+    f"applications:{ALL_SUBPATHS}/docs:content": _permission(["view", "delete"], ["is_active"]),
+    f"applications:api/{ALL_SUBPATHS}/deep:content": _permission(["view", "update"]),
+    f"{ALL_SPACES}:{ALL_SUBPATHS}:user": _permission(["view"]),
+    f"{ALL_SPACES}:public:content": _permission(["query", "view"]),
+    f"{ALL_SPACES}:public/docs:content": _permission(["view"], ["own"]),
+    "personal:people/alice:content": _permission(["view", "update", "create", "delete"]),
+}
+SPACES = ["applications", "personal", "other"]
+SUBPATHS = [[], ["api"], ["api", "user"], ["api", "x", "deep"], ["x", "docs"], ["public"], ["public", "docs"],
+            ["people", "alice", "notes"], ["docs"], ["api", "user", "deep", "er"]]
+RESOURCE_TYPES = [ResourceType.content, ResourceType.folder, ResourceType.schema, ResourceType.user]
+ACTIONS = [ActionType.view, ActionType.query, ActionType.update, ActionType.create, ActionType.delete]
+CONDITIONS = [set(), {ConditionType.own}, {ConditionType.is_active}, {ConditionType.own, ConditionType.is_active}]
+RECORDS = [{}, {"payload": {"body": {"secret": 1}}}, {"payload": {"body": {"title": "x"}}}]
+
+
+def test_tries_match_the_string_keys_walk():
+    control = AccessControl()
+    tries = compile_permissions(PERMISSIONS)
+    granted = 0
+    for space_name, parts, resource_type, action_type, achieved, record in itertools.product(
+        SPACES, SUBPATHS, RESOURCE_TYPES, ACTIONS, CONDITIONS, RECORDS
+    ):
+        expected = _string_keys_access(PERMISSIONS, space_name, parts, resource_type, action_type, achieved, record)
+        assert (
+            control.check_permissions(tries, space_name, parts, resource_type, action_type, achieved, record) == expected
+        ), (space_name, parts, resource_type, action_type, achieved, record)
+        granted += expected
+    assert granted > 0
+
+
+def test_compiled_permissions_follow_the_permissions_map():
+    control = AccessControl()
+    control.compiled = type(control.compiled)()
+    first = control.compiled_permissions("alice", PERMISSIONS)
+    assert control.compiled_permissions("alice", PERMISSIONS) is first
+    assert control.compiled_permissions("alice", dict(PERMISSIONS)) is not first
+
+
+def test_restricted_fields_are_flattened_once(monkeypatch):
+    import utils.access_control as access_control_module
+
+    calls = []
+
+    def _flatten(attributes):
+        calls.append(attributes)
+        return flatten_dict(attributes)
+
+    monkeypatch.setattr(access_control_module, "flatten_dict", _flatten)
+    permissions = {
+        "applications:/:content": _permission(["create"], restricted_fields=["payload.body.secret"]),
+        "applications:api:content": _permission(["create"], restricted_fields=["payload.body.secret"]),
+        "applications:api/user:content": _permission(["create"], restricted_fields=["payload.body.secret"]),
+    }
+    allowed = AccessControl().check_permissions(
+        compile_permissions(permissions),
+        "applications",
+        ["api", "user"],
+        ResourceType.content,
+        ActionType.create,
+        set(),
+        {"payload": {"body": {"secret": 1}}},
+    )
+    assert not allowed
+    assert len(calls) == 1
+
+
+def test_check_permissions_benchmark():
+    """Micro-benchmark of a check against a large permissions map, with the string keys walk as a baseline"""
+    rng = random.Random(7)
+    permissions = dict(PERMISSIONS)
+    for i in range(2000):
+        subpath = "/".join(f"folder_{rng.randrange(50)}" for _ in range(rng.randrange(1, 5)))
+        permissions[f"space_{i % 20}:{subpath}:content"] = _permission(["view", "query"], ["is_active"])
+    control = AccessControl()
+    tries = compile_permissions(permissions)
+    checks = [
+        (f"space_{rng.randrange(20)}", [f"folder_{rng.randrange(50)}" for _ in range(rng.randrange(0, 6))])
+        for _ in range(2000)
+    ]
+    achieved = {ConditionType.is_active}
+
+    started = time.perf_counter()
+    compiled_results = [
+        control.check_permissions(tries, space, parts, ResourceType.content, ActionType.view, achieved, {})
+        for space, parts in checks
+    ]
+    compiled_secs = time.perf_counter() - started
+
+    started = time.perf_counter()
+    string_keys_results = [
+        _string_keys_access(permissions, space, parts, ResourceType.content, ActionType.view, achieved, {})
+        for space, parts in checks
+    ]
+    string_keys_secs = time.perf_counter() - started
+
+    assert compiled_results == string_keys_results
+    print(
+        f"\n{len(checks)} checks: tries {compiled_secs * 1000:.2f} ms, string keys {string_keys_secs * 1000:.2f} ms"
+    )
+
+
+@pytest.mark.anyio
+async def test_check_access_many_resolves_acls_and_permissions_once(monkeypatch):
+    import utils.access_control as access_control_module
+
+    calls: dict[str, int] = {"acl": 0, "permissions": 0, "user": 0}
+
+    async def get_entries_acl(entries):
+        calls["acl"] += 1
+        assert len(entries) == 3
+        return {("shared", "/", "shared", ResourceType.space): [{"user_shortname": "bob", "allowed_actions": ["query"]}]}
+
+    async def get_user_permissions(user_shortname):
+        calls["permissions"] += 1
+        return {"applications:/:space": _permission(["query"])}
+
+    async def load_user_meta(user_shortname):
+        calls["user"] += 1
+        return User(shortname=user_shortname, owner_shortname="dmart")
+
+    async def get_acl_holders():
+        return {"bob"}
+
+    monkeypatch.setattr(access_control_module.db, "get_acl_holders", get_acl_holders)
+    monkeypatch.setattr(access_control_module.db, "get_entries_acl", get_entries_acl)
+    monkeypatch.setattr(access_control_module.db, "get_user_permissions", get_user_permissions)
+    monkeypatch.setattr(access_control_module.db, "load_user_meta", load_user_meta)
+
+    items = [
+        {
+            "space_name": space_name,
+            "subpath": "/",
+            "resource_type": ResourceType.space,
+            "action_type": ActionType.query,
+            "entry_shortname": space_name,
+        }
+        for space_name in ("applications", "shared", "private", "applications")
+    ]
+    assert await AccessControl().check_access_many("bob", items) == [True, True, False, True]
+    assert calls == {"acl": 1, "permissions": 1, "user": 1}
+
+    # Users without any ACL grant, and entries loaded by the caller, skip the ACL lookup
+    assert await AccessControl().check_access_many("carol", items) == [True, False, False, True]
+    items[2]["acl"] = [ACL(user_shortname="bob", allowed_actions=[ActionType.query])]
+    assert await AccessControl().check_access_many("bob", items[2:3]) == [True]
+    assert calls["acl"] == 1
@@ -0,0 +1,96 @@
+import pytest
+from starlette.requests import Request
+from starlette.responses import Response
+
+import models.api as api
+from api.public.router import cached_public_query
+from models.enums import QueryType
+from utils import query_cache
+from utils.query_cache import PublicQueryCache, subpath_lineage
+
+
+def _query(**kwargs) -> api.Query:
+    return api.Query(type=QueryType.search, space_name="acme", subpath="/products", **kwargs)
+
+
+def test_subpath_lineage():
+    assert subpath_lineage("/") == ["/"]
+    assert subpath_lineage("products/phones/") == ["/", "/products", "/products/phones"]
+
+
+def test_key_normalizes_the_query():
+    assert PublicQueryCache.key("query", _query(limit=5)) == PublicQueryCache.key("query", api.Query(**_query(limit=5).model_dump()))
+    assert PublicQueryCache.key("query", _query(limit=5)) != PublicQueryCache.key("query", _query(limit=6))
+    assert PublicQueryCache.key("query", _query()) != PublicQueryCache.key("query_via_urlparams", _query())
+
+
+def test_writes_stale_the_queries_of_their_parents():
+    cache = PublicQueryCache(max_bytes=1024)
+    cache.put("products", "acme", "/products", b"[1]", cache.snapshot("acme", "/products"))
+    cache.put("phones", "acme", "/products/phones", b"[2]", cache.snapshot("acme", "/products/phones"))
+    assert cache.get("products") is not None
+
+    cache.invalidate("acme", "/products/phones/iphone")
+    assert cache.get("products") is None
+    assert cache.get("phones") is None
+
+    cache.put("phones", "acme", "/products/phones", b"[2]", cache.snapshot("acme", "/products/phones"))
+    cache.invalidate("acme", "/orders/o1")
+    cache.invalidate("other", "/products/phones")
+    assert cache.get("phones") is not None
+
+
+def test_folder_changes_stale_their_subtree():
+    cache = PublicQueryCache(max_bytes=1024)
+    cache.put("deep", "acme", "/products/phones/apple", b"[3]", cache.snapshot("acme", "/products/phones/apple"))
+    cache.invalidate("acme", "/products/phones")
+    assert cache.get("deep") is not None
+    cache.invalidate("acme", "/products/phones", subtree=True)
+    assert cache.get("deep") is None
+
+
+def test_results_of_queries_racing_a_write_are_stale():
+    cache = PublicQueryCache(max_bytes=1024)
+    snapshot = cache.snapshot("acme", "/products")
+    cache.invalidate("acme", "/products/p1")
+    cache.put("products", "acme", "/products", b"[1]", snapshot)
+    assert cache.get("products") is None
+
+    snapshot = cache.snapshot("acme", "/products")
+    cache.clear()
+    cache.put("products", "acme", "/products", b"[1]", snapshot)
+    assert cache.get("products") is None
+
+
+def test_memory_bound_evicts_least_recently_used():
+    cache = PublicQueryCache(max_bytes=10)
+    for key in ("a", "b", "c"):
+        cache.put(key, "acme", "/", b"1234", cache.snapshot("acme", "/"))
+    assert len(cache) == 2 and cache.size_bytes == 8
+    assert cache.get("a") is None
+    cache.put("too_big", "acme", "/", b"x" * 11, cache.snapshot("acme", "/"))
+    assert cache.get("too_big") is None
+    stats = cache.stats()
+    assert stats["evictions"] == 1 and stats["misses"] == 2
+
+
+def test_disabled_cache_still_gives_etags():
+    cache = PublicQueryCache(max_bytes=0)
+    etag = cache.put("a", "acme", "/", b"[]", cache.snapshot("acme", "/"))
+    assert etag.startswith('"') and len(cache) == 0
+
+
+@pytest.mark.anyio
+async def test_public_query_responses_get_caching_headers_only_with_the_cache(monkeypatch):
+    async def serve() -> api.Response:
+        return api.Response(status=api.Status.success, records=[])
+
+    request = Request({"type": "http", "headers": []})
+    monkeypatch.setattr(query_cache.public_query_cache, "max_bytes", 0)
+    assert isinstance(await cached_public_query(request, "query", _query(), serve), api.Response)
+
+    monkeypatch.setattr(query_cache.public_query_cache, "max_bytes", 1024)
+    response = await cached_public_query(request, "query", _query(), serve)
+    assert isinstance(response, Response)
+    assert response.headers["X-Cache"] == "MISS" and response.headers["ETag"]
+    query_cache.public_query_cache.clear()
@@ -1,7 +1,7 @@
 """Combined tests for various utility modules — covers uncovered branches and pure functions.
 
 Targets: utils/jwt.py, utils/generate_email.py, utils/social_sso.py, utils/notification.py,
-         utils/plugin_manager.py, main.py (mask_sensitive_data, set_middleware_response_headers),
+         utils/plugin_manager.py, utils/query_policies_helper.py, main.py (mask_sensitive_data, set_middleware_response_headers),
          data_adapters/helpers.py
 """
 
@@ -12,14 +12,19 @@ import jwt as pyjwt
 import pytest
 
 import models.api as api
+import utils.jwt as jwt_module
 from data_adapters.helpers import get_nested_value, trans_magic_words
 from main import mask_sensitive_data, set_middleware_response_headers
 from models.core import ActionType, Event, EventFilter, PluginWrapper
 from models.enums import EventListenTime, PluginType, ResourceType
 from utils.generate_email import generate_email_from_template, generate_subject
-from utils.jwt import decode_jwt, generate_jwt
+from utils.internal_error_code import InternalErrorCode
+from utils.jwt import VerifiedTokens, decode_jwt, generate_jwt
+from utils.middleware import _request_memo_ctx_var, clear_request_memo, get_request_memo
 from utils.notification import NotificationManager
+from utils.password_hashing import token_digest, verify_token_digest
 from utils.plugin_manager import PluginManager
+from utils.query_policies_helper import get_user_query_policies
 from utils.settings import settings
 
 # ==================== data_adapters/helpers.py ====================
@@ -119,6 +124,65 @@ def test_generate_jwt_roundtrip():
     assert decoded["expires"] > time()
 
 
+def test_verified_tokens_honor_expires(monkeypatch):
+    cache = VerifiedTokens(maxsize=2)
+    monkeypatch.setattr(jwt_module, "verified_tokens", cache)
+    token = generate_jwt({"shortname": "testuser", "type": "web"}, expires=3600)
+    assert decode_jwt(token) is decode_jwt(token)
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    short_lived = generate_jwt({"shortname": "testuser", "type": "web"}, expires=3600)
+    cache.put(short_lived, {"shortname": "testuser"}, time() - 1)
+    with pytest.raises(api.Exception) as exc_info:
+        decode_jwt(
+            pyjwt.encode({"data": {"shortname": "x"}, "expires": time() - 1}, settings.jwt_secret, algorithm="HS256")
+        )
+    assert exc_info.value.error.code == InternalErrorCode.EXPIRED_TOKEN
+    assert cache.get(short_lived) is None
+
+    for shortname in ("a", "b", "c"):
+        decode_jwt(generate_jwt({"shortname": shortname, "type": "web"}))
+    assert (len(cache), cache.evictions) == (2, 2)
+
+    monkeypatch.setattr(settings, "jwt_secret", "x" * 32)
+    assert cache.get(token) is None
+    assert len(cache) == 0
+
+
+def test_eddsa_tokens(monkeypatch, tmp_path):
+    from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PrivateKey
+    from cryptography.hazmat.primitives.serialization import Encoding, NoEncryption, PrivateFormat
+
+    private_key = tmp_path / "jwt.pem"
+    private_key.write_bytes(
+        Ed25519PrivateKey.generate().private_bytes(Encoding.PEM, PrivateFormat.PKCS8, NoEncryption())
+    )
+    monkeypatch.setattr(jwt_module, "verified_tokens", VerifiedTokens())
+    monkeypatch.setattr(settings, "jwt_algorithm", "EdDSA")
+    monkeypatch.setattr(settings, "jwt_private_key", str(private_key))
+    token = generate_jwt({"shortname": "testuser", "type": "web"})
+    assert pyjwt.get_unverified_header(token)["alg"] == "EdDSA"
+    assert decode_jwt(token)["shortname"] == "testuser"
+    with pytest.raises(api.Exception):
+        decode_jwt(pyjwt.encode({"data": {"shortname": "x"}, "expires": time() + 60}, settings.jwt_secret))
+
+
+# ==================== utils/password_hashing.py ====================
+
+
+def test_token_digest_deterministic():
+    assert token_digest("some.jwt.token") == token_digest("some.jwt.token")
+    assert token_digest("some.jwt.token") != token_digest("other.jwt.token")
+    assert "some.jwt.token" not in token_digest("some.jwt.token")
+
+
+def test_verify_token_digest():
+    digest = token_digest("some.jwt.token")
+    assert verify_token_digest("some.jwt.token", digest)
+    assert not verify_token_digest("other.jwt.token", digest)
+    assert not verify_token_digest("some.jwt.token", None)
+
+
 # ==================== utils/generate_email.py ====================
 
 
@@ -322,6 +386,46 @@ async def test_notification_manager_send_exception():
     assert result is False
 
 
+# ==================== utils/query_policies_helper.py: request memo ====================
+
+
+def _policies_db():
+    db = MagicMock()
+    db.get_user_permissions = AsyncMock(
+        return_value={"space:offers:content": {"allowed_actions": ["query"], "conditions": ["own"]}}
+    )
+    db.load_user_meta = AsyncMock(return_value=MagicMock(groups=["sales"]))
+    return db
+
+
+@pytest.mark.anyio
+async def test_get_user_query_policies_without_request_memo():
+    db = _policies_db()
+    assert get_request_memo() is None
+    await get_user_query_policies(db, "alice", "space", "/offers")
+    await get_user_query_policies(db, "alice", "space", "/offers")
+    assert db.get_user_permissions.await_count == 2
+
+
+@pytest.mark.anyio
+async def test_get_user_query_policies_memoized_per_request():
+    db = _policies_db()
+    token = _request_memo_ctx_var.set({})
+    try:
+        first = await get_user_query_policies(db, "alice", "space", "/offers")
+        first.append("mutated by caller")
+        second = await get_user_query_policies(db, "alice", "space", "/offers")
+        assert second == ["space:offers:content:true:alice", "space:offers:content:false:alice"]
+        assert db.get_user_permissions.await_count == 1
+        assert db.load_user_meta.return_value.groups == ["sales"]
+
+        clear_request_memo()
+        await get_user_query_policies(db, "alice", "space", "/offers")
+        assert db.get_user_permissions.await_count == 2
+    finally:
+        _request_memo_ctx_var.reset(token)
+
+
 # ==================== utils/plugin_manager.py ====================
 
 
@@ -35,6 +35,28 @@ async def test_get_settings_should_pass(client: AsyncClient) -> None:
     assert response.status_code == status.HTTP_200_OK
 
 
+@pytest.mark.run(order=6)
+@pytest.mark.anyio
+async def test_get_metrics_should_pass(client: AsyncClient) -> None:
+    client.cookies.set("auth_token", await get_superman_cookie(client))
+    response = await client.get("/info/metrics")
+    assert response.status_code == status.HTTP_200_OK
+    assert "permissions_cache" in response.json()["attributes"]
+    assert "public_query_cache" in response.json()["attributes"]
+    assert "database" in response.json()["attributes"]
+    assert "password_hashing" in response.json()["attributes"]
+    assert "jwt_cache" in response.json()["attributes"]
+
+
+@pytest.mark.run(order=6)
+@pytest.mark.anyio
+async def test_get_indexes_should_pass(client: AsyncClient) -> None:
+    client.cookies.set("auth_token", await get_superman_cookie(client))
+    response = await client.get("/info/indexes")
+    assert response.status_code == status.HTTP_200_OK
+    assert isinstance(response.json()["attributes"]["indexes"], list)
+
+
 # @pytest.mark.run(order=6)
 # @pytest.mark.anyio
 # async def test_in_loop_tasks(client: AsyncClient) -> None:
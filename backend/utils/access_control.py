@@ -1,9 +1,10 @@
-import sys
+from collections import OrderedDict
 
 from data_adapters.adapter import data_adapter as db
-from models.core import ACL, ActionType, ConditionType, Group, Permission, Role, User
+from models.core import ACL, ActionType, ConditionType, Group, Meta, Permission, Role, User
 from models.enums import ResourceType
-from utils.helpers import camel_case, flatten_dict
+from utils.helpers import flatten_dict
+from utils.permission_trie import PermissionNode, compile_permissions, iter_grants
 from utils.settings import settings
 
 
@@ -12,6 +13,8 @@ class AccessControl:
     groups: dict[str, Group] = {}
     roles: dict[str, Role] = {}
     users: dict[str, User] = {}
+    # user shortname => (permissions map, its compiled tries), least recently used first
+    compiled: OrderedDict[str, tuple[dict, dict[tuple[str, str], PermissionNode]]] = OrderedDict()
 
     async def check_access(
         self,
@@ -25,98 +28,152 @@ class AccessControl:
         resource_owner_group: str | None = None,
         record_attributes: dict | None = None,
         entry_shortname: str | None = None,
+        entry_meta: Meta | None = None,
     ):
-        record_attributes = record_attributes or {}
-        effective_space = entry_shortname if (resource_type == ResourceType.space and entry_shortname) else space_name
-
-        if entry_shortname:
-            acl_space, acl_subpath = (effective_space, "/") if resource_type == ResourceType.space else (space_name, subpath)
-            acl_access = await self.check_access_control_list(
-                acl_space, acl_subpath, resource_type, entry_shortname, action_type, user_shortname
-            )
-            if acl_access:
-                return True
+        """`entry_meta` is the entry when the caller already loaded it, its ACL is then read from it"""
+        item = {
+            "space_name": space_name,
+            "subpath": subpath,
+            "resource_type": resource_type,
+            "action_type": action_type,
+            "resource_is_active": resource_is_active,
+            "resource_owner_shortname": resource_owner_shortname,
+            "resource_owner_group": resource_owner_group,
+            "record_attributes": record_attributes,
+            "entry_shortname": entry_shortname,
+        }
+        if entry_meta is not None:
+            item["acl"] = entry_meta.acl or []
+        return (await self.check_access_many(user_shortname, [item]))[0]
+
+    async def check_access_many(self, user_shortname: str, items: list[dict]) -> list[bool]:
+        """
+        check_access of many resources, each item holds its keyword arguments but the user shortname, and
+        optionally the "acl" of the already loaded entry. The user permissions and groups are resolved once, the
+        other ACLs are loaded in one query, skipped when the user holds no ACL grant at all.
+        """
         user_permissions = await db.get_user_permissions(user_shortname)
 
+        acl_keys: list[tuple[str, str, str, str] | None] = []
+        for item in items:
+            entry_shortname = item.get("entry_shortname")
+            if not entry_shortname or "acl" in item:
+                acl_keys.append(None)
+            elif item["resource_type"] == ResourceType.space:
+                acl_keys.append((entry_shortname, "/", entry_shortname, item["resource_type"]))
+            else:
+                acl_keys.append((item["space_name"], item["subpath"], entry_shortname, item["resource_type"]))
+        requested_acls = [key for key in acl_keys if key is not None]
+        acls: dict = {}
+        if requested_acls and user_shortname in await db.get_acl_holders():
+            acls = await db.get_entries_acl(list(dict.fromkeys(requested_acls)))
+
+        granted = [
+            bool(item.get("entry_shortname"))
+            and self.acl_allows(item["acl"] if key is None else acls.get(key), user_shortname, item["action_type"])
+            for key, item in zip(acl_keys, items, strict=True)
+        ]
+        if all(granted):
+            return granted
+
+        tries = self.compiled_permissions(user_shortname, user_permissions)
         user_groups = (await db.load_user_meta(user_shortname)).groups or []
 
-        # Generate set of achevied conditions on the resource
-        # ex: {"is_active", "own"}
-        resource_achieved_conditions: set[ConditionType] = set()
-        if resource_is_active:
-            resource_achieved_conditions.add(ConditionType.is_active)
-        if resource_owner_shortname == user_shortname or resource_owner_group in user_groups:
-            resource_achieved_conditions.add(ConditionType.own)
-
-        subpath_parts = ["/"]
-        subpath_parts += list(filter(None, subpath.strip("/").split("/")))
-        if resource_type == ResourceType.folder and entry_shortname:
-            subpath_parts.append(entry_shortname)
-
-        search_subpath = ""
-        for subpath_part in subpath_parts:
-            search_subpath += subpath_part
-            # Check if the user has global access
-            global_access = self.has_global_access(
+        for idx, item in enumerate(items):
+            if granted[idx]:
+                continue
+            resource_type = item["resource_type"]
+            subpath = item["subpath"]
+            entry_shortname = item.get("entry_shortname")
+            effective_space = entry_shortname if (resource_type == ResourceType.space and entry_shortname) else item["space_name"]
+
+            # Generate set of achevied conditions on the resource
+            # ex: {"is_active", "own"}
+            resource_achieved_conditions: set[ConditionType] = set()
+            if item.get("resource_is_active"):
+                resource_achieved_conditions.add(ConditionType.is_active)
+            if item.get("resource_owner_shortname") == user_shortname or item.get("resource_owner_group") in user_groups:
+                resource_achieved_conditions.add(ConditionType.own)
+
+            subpath_parts = list(filter(None, subpath.strip("/").split("/")))
+            if resource_type == ResourceType.folder and entry_shortname:
+                subpath_parts.append(entry_shortname)
+
+            granted[idx] = self.check_permissions(
+                tries,
                 effective_space,
-                user_permissions,
-                search_subpath,
-                action_type,
+                subpath_parts,
                 resource_type,
+                item["action_type"],
                 resource_achieved_conditions,
-                record_attributes,
+                item.get("record_attributes") or {},
             )
-            if global_access:
-                return True
-
-            permission_key = f"{effective_space}:{search_subpath}:{resource_type}"
-            if (
-                permission_key in user_permissions
-                and action_type in user_permissions[permission_key]["allowed_actions"]
-                and self.check_access_conditions(
-                    set(user_permissions[permission_key]["conditions"]),
-                    set(resource_achieved_conditions),
-                    action_type,
+            if not granted[idx] and settings.debug_perm:
+                print(
+                    f"Debug Access: No valid permission found for user {user_shortname} accessing {effective_space}/{subpath} ({resource_type})"
                 )
-                and self.check_access_restriction(
-                    user_permissions[permission_key]["restricted_fields"],
-                    user_permissions[permission_key]["allowed_fields_values"],
-                    action_type,
-                    record_attributes,
-                )
-            ):
-                return True
-            elif settings.debug_perm and permission_key in user_permissions:
-                print(f"Debug Access: Permission found for {permission_key} but access denied.")
-                if action_type not in user_permissions[permission_key]["allowed_actions"]:
-                    print(
-                        f"Debug Access: Action {action_type} not in allowed actions: {user_permissions[permission_key]['allowed_actions']}"
-                    )
-                if not self.check_access_conditions(
-                    set(user_permissions[permission_key]["conditions"]),
-                    set(resource_achieved_conditions),
-                    action_type,
+        return granted
+
+    def compiled_permissions(self, user_shortname: str, user_permissions: dict) -> dict[tuple[str, str], PermissionNode]:
+        """
+        Permission tries of the user, compiled again only when the data adapter hands out a new permissions map
+        (the cached maps are shared and never mutated, so the same object means the same permissions)
+        """
+        entry = self.compiled.get(user_shortname)
+        if entry is not None and entry[0] is user_permissions:
+            self.compiled.move_to_end(user_shortname)
+            return entry[1]
+        tries = compile_permissions(user_permissions)
+        self.compiled[user_shortname] = (user_permissions, tries)
+        self.compiled.move_to_end(user_shortname)
+        while len(self.compiled) > max(settings.permissions_cache_size, 1):
+            self.compiled.popitem(last=False)
+        return tries
+
+    def check_permissions(
+        self,
+        tries: dict[tuple[str, str], PermissionNode],
+        space_name: str,
+        subpath_parts: list[str],
+        resource_type: ResourceType,
+        action_type: ActionType,
+        resource_achieved_conditions: set,
+        record_attributes: dict,
+    ) -> bool:
+        """Whether a grant of "/" or of a prefix of the subpath parts allows the action"""
+        # Only create and update check the record fields, flattened once for all the grants
+        flattened_attributes: dict | None = None
+        for global_grant, grant in iter_grants(tries, space_name, resource_type, subpath_parts):
+            for candidate in (global_grant, grant):
+                if candidate is None or action_type not in candidate.actions:
+                    continue
+                if action_type not in [ActionType.create, ActionType.query] and not candidate.conditions.issubset(
+                    resource_achieved_conditions
                 ):
+                    continue
+                if action_type in [ActionType.create, ActionType.update] and (
+                    candidate.restricted_fields or candidate.allowed_fields_values
+                ):
+                    if flattened_attributes is None:
+                        flattened_attributes = flatten_dict(record_attributes)
+                    if not self.check_flattened_restriction(
+                        candidate.restricted_fields, candidate.allowed_fields_values, flattened_attributes
+                    ):
+                        continue
+                return True
+
+            if settings.debug_perm and grant is not None:
+                print(f"Debug Access: Permission found for {grant.key} but access denied.")
+                if action_type not in grant.actions:
+                    print(f"Debug Access: Action {action_type} not in allowed actions: {sorted(grant.actions)}")
+                if not self.check_access_conditions(set(grant.conditions), resource_achieved_conditions, action_type):
                     print(
-                        f"Debug Access: Conditions check failed. Required: {user_permissions[permission_key]['conditions']}, Achieved: {resource_achieved_conditions}"
+                        f"Debug Access: Conditions check failed. Required: {sorted(grant.conditions)}, Achieved: {resource_achieved_conditions}"
                     )
                 if not self.check_access_restriction(
-                    user_permissions[permission_key]["restricted_fields"],
-                    user_permissions[permission_key]["allowed_fields_values"],
-                    action_type,
-                    record_attributes,
+                    list(grant.restricted_fields), grant.allowed_fields_values, action_type, record_attributes
                 ):
                     print("Debug Access: Restrictions check failed.")
-
-            if search_subpath == "/":
-                search_subpath = ""
-            else:
-                search_subpath += "/"
-
-        if settings.debug_perm:
-            print(
-                f"Debug Access: No valid permission found for user {user_shortname} accessing {effective_space}/{subpath} ({resource_type})"
-            )
         return False
 
     async def check_access_control_list(
@@ -128,84 +185,21 @@ class AccessControl:
         action_type: ActionType,
         user_shortname: str,
     ) -> bool:
-        resource_cls = getattr(sys.modules["models.core"], camel_case(resource_type))
-
-        try:
-            entry = await db.load(space_name=space_name, subpath=subpath, shortname=entry_shortname, class_type=resource_cls)
-        except Exception:
-            return False
-
-        if not entry.acl:
-            return False
-
-        user_acl: ACL | None = None
-        for access in entry.acl:
-            if access.user_shortname == user_shortname:
-                user_acl = access
-                break
-
-        if not user_acl:
-            return False
-
-        return action_type in user_acl.allowed_actions
-
-    def has_global_access(
-        self,
-        space_name: str,
-        user_permissions: dict,
-        search_subpath: str,
-        action_type: ActionType,
-        resource_type: str,
-        resource_achieved_conditions: set,
-        record_attributes: dict,
-    ) -> bool:
-        """
-        check if has access to global subpath by replacing the following
-        subpath = / => __all_subpaths__
-        subpath = {subpath} => __all_subpaths__
-        subpath = {subpath}/protected => __all_subpaths__/protected
-        subpath = {subpath}/protected/mine => {subpath}/__all_subpaths__/mine
-        """
-        original_subpath = search_subpath
-        search_subpath_parts = search_subpath.split("/")
-        if len(search_subpath_parts) > 1:
-            search_subpath_parts[-2] = settings.all_subpaths_mw
-            search_subpath = "/".join(search_subpath_parts)
-        elif len(search_subpath_parts) == 1:
-            search_subpath = settings.all_subpaths_mw
-        if search_subpath[-1] == "/" and len(search_subpath) > 1:
-            search_subpath = search_subpath[:-1]
-
-        permission_key = None
-        # check if has access to all spaces
-        if f"{settings.all_spaces_mw}:{search_subpath}:{resource_type}" in user_permissions:
-            permission_key = f"{settings.all_spaces_mw}:{search_subpath}:{resource_type}"
-
-        # check if has access to current spaces
-        if f"{space_name}:{search_subpath}:{resource_type}" in user_permissions:
-            permission_key = f"{space_name}:{search_subpath}:{resource_type}"
-
-        # check if has access to current subpath
-        if f"{settings.all_spaces_mw}:{original_subpath}:{resource_type}" in user_permissions:
-            permission_key = f"{settings.all_spaces_mw}:{original_subpath}:{resource_type}"
-
-        if not permission_key:
+        if user_shortname not in await db.get_acl_holders():
             return False
-
-        return (
-            action_type in user_permissions[permission_key]["allowed_actions"]
-            and self.check_access_conditions(
-                set(user_permissions[permission_key]["conditions"]),
-                set(resource_achieved_conditions),
-                action_type,
-            )
-            and self.check_access_restriction(
-                user_permissions[permission_key]["restricted_fields"],
-                user_permissions[permission_key]["allowed_fields_values"],
-                action_type,
-                record_attributes,
-            )
-        )
+        key = (space_name, subpath, entry_shortname, resource_type)
+        acls = await db.get_entries_acl([key])
+        return self.acl_allows(acls.get(key), user_shortname, action_type)
+
+    def acl_allows(self, acl: list[ACL] | list[dict] | None, user_shortname: str, action_type: ActionType) -> bool:
+        """Whether the first ACL entry of the user allows the action"""
+        for access in acl or []:
+            if isinstance(access, ACL):
+                if access.user_shortname == user_shortname:
+                    return action_type in access.allowed_actions
+            elif access.get("user_shortname") == user_shortname:
+                return action_type in (access.get("allowed_actions") or [])
+        return False
 
     def check_access_conditions(
         self,
@@ -230,8 +224,11 @@ class AccessControl:
         if action_type not in [ActionType.create, ActionType.update]:
             return True
 
-        flattened_attributes = flatten_dict(record_attributes)
+        return self.check_flattened_restriction(restricted_fields, allowed_fields_values, flatten_dict(record_attributes))
 
+    def check_flattened_restriction(
+        self, restricted_fields: list | tuple, allowed_fields_values: dict, flattened_attributes: dict
+    ) -> bool:
         for restricted_field in restricted_fields:
             if restricted_field in flattened_attributes:
                 return False
@@ -58,4 +58,5 @@ class InternalErrorCode:
     OBJECT_NOT_SAVED = 51
     JQ_TIMEOUT = 120
     JQ_ERROR = 121
+    PASSWORD_HASHING_BUSY = 122
     PROTECTED_FIELD = 210
@@ -0,0 +1,233 @@
+"""jq filters compiled once per filter text with the jq bindings, run in killable worker processes"""
+
+import asyncio
+import multiprocessing
+import time
+from collections import OrderedDict
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Any
+
+from fastapi import status
+
+import models.api as api
+from utils.helpers import jq_dict_parser
+from utils.internal_error_code import InternalErrorCode
+from utils.settings import settings
+
+
+def jq_results(outputs: list) -> list:
+    # Like `jq -c` read back line by line: a filter giving one array gives its items
+    if len(outputs) == 1 and isinstance(outputs[0], list):
+        return outputs[0]
+    return outputs
+
+
+@lru_cache(maxsize=settings.jq_cache_size)
+def _compiled_program(jq_filter: str) -> Any:
+    return __import__("jq").compile(jq_filter)
+
+
+def run_jq_program(jq_filter: str, value: Any) -> list:
+    """Runs in a jq process, which keeps its own LRU of compiled programs"""
+    return _compiled_program(jq_filter).input_value(value).all()  # type: ignore
+
+
+def _serve_jq(conn: Any, runner: Callable[[str, Any], list]) -> None:
+    conn.send(("ready", None))
+    while True:
+        try:
+            jq_filter, value = conn.recv()
+        except (EOFError, OSError):
+            return
+        try:
+            conn.send(("ok", runner(jq_filter, value)))
+        except Exception as e:
+            conn.send(("error", str(e)))
+
+
+class _JqProcess:
+    def __init__(self, context: Any, runner: Callable[[str, Any], list]):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=_serve_jq, args=(child_conn, runner), daemon=True)
+        self.process.start()
+        child_conn.close()
+
+    def wait_ready(self) -> None:
+        """Waits for the process to be up, its start isn't counted in the jq_timeout of a program"""
+        self.conn.recv()
+
+    def call(self, jq_filter: str, value: Any) -> tuple[str, Any]:
+        self.conn.send((jq_filter, value))
+        return self.conn.recv()  # type: ignore
+
+    def kill(self) -> None:
+        self.process.kill()
+        self.process.join()
+        self.conn.close()
+
+
+class JqEngine:
+    """
+    Per-worker LRU of compiled jq programs keyed by the filter text, with the latency of each filter.
+
+    The jq bindings hold the GIL while a program runs, so programs run in up to `workers` long lived processes,
+    started from a forkserver. A program still running after jq_timeout seconds gets its process killed, the next
+    run starts a new one. The filters are compiled here first so invalid ones fail without a process round trip.
+    """
+
+    def __init__(self, maxsize: int = 256, workers: int = 4, runner: Callable[[str, Any], list] = run_jq_program):
+        self.maxsize = maxsize
+        self.workers = max(workers, 1)
+        self.runner = runner
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.restarts = 0
+        self._programs: OrderedDict[str, Any] = OrderedDict()
+        self._latencies: OrderedDict[str, dict] = OrderedDict()
+        self._idle: list[_JqProcess] = []
+        self._slots: asyncio.Semaphore | None = None
+        # Threads only wait on the pipes of the busy processes
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="jq")
+
+    def compile(self, jq_filter: str) -> Any:
+        program = self._programs.get(jq_filter)
+        if program is not None:
+            self._programs.move_to_end(jq_filter)
+            self.hits += 1
+            return program
+
+        self.misses += 1
+        try:
+            jq = __import__("jq")
+        except ModuleNotFoundError:
+            raise api.Exception(
+                status.HTTP_400_BAD_REQUEST,
+                api.Error(
+                    type="request",
+                    code=InternalErrorCode.NOT_ALLOWED,
+                    message="jq is not installed!",
+                ),
+            ) from None
+        try:
+            program = jq.compile(jq_filter)
+        except ValueError as e:
+            raise api.Exception(
+                status.HTTP_400_BAD_REQUEST,
+                api.Error(
+                    type="request",
+                    code=InternalErrorCode.JQ_ERROR,
+                    message="jq filter failed to be executed",
+                ),
+            ) from e
+
+        if self.maxsize > 0:
+            self._programs[jq_filter] = program
+            while len(self._programs) > self.maxsize:
+                self._programs.popitem(last=False)
+                self.evictions += 1
+        return program
+
+    async def run(self, jq_filter: str, value: Any) -> list:
+        """Results of the filter over `value` (records dumps), as `jq -c` output read back"""
+        self.compile(jq_filter)
+        value = jq_dict_parser(value)
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.workers)
+        async with self._slots:
+            return await self._run_in_process(jq_filter, value)
+
+    async def _run_in_process(self, jq_filter: str, value: Any) -> list:
+        loop = asyncio.get_running_loop()
+        if self._idle:
+            jq_process = self._idle.pop()
+        else:
+            jq_process = _JqProcess(multiprocessing.get_context("forkserver"), self.runner)
+            await loop.run_in_executor(self._executor, jq_process.wait_ready)
+        started = time.perf_counter()
+        outcome = "errors"
+        answered = False
+        try:
+            status_, outputs = await asyncio.wait_for(
+                loop.run_in_executor(self._executor, jq_process.call, jq_filter, value),
+                timeout=settings.jq_timeout,
+            )
+            answered = True
+            if status_ != "ok":
+                raise ValueError(outputs)
+            outcome = "runs"
+        except TimeoutError as e:
+            outcome = "timeouts"
+            raise api.Exception(
+                status.HTTP_400_BAD_REQUEST,
+                api.Error(
+                    type="request",
+                    code=InternalErrorCode.JQ_TIMEOUT,
+                    message="jq filter took too long to execute",
+                ),
+            ) from e
+        except (ValueError, EOFError, OSError) as e:
+            raise api.Exception(
+                status.HTTP_400_BAD_REQUEST,
+                api.Error(
+                    type="request",
+                    code=InternalErrorCode.JQ_ERROR,
+                    message="jq filter failed to be executed",
+                ),
+            ) from e
+        finally:
+            if answered:
+                self._idle.append(jq_process)
+            else:
+                # Timed out or died: the program can't be interrupted, only its process
+                jq_process.kill()
+                self.restarts += 1
+            self._record_latency(jq_filter, outcome, (time.perf_counter() - started) * 1000)
+        return jq_results(outputs)
+
+    def shutdown(self) -> None:
+        while self._idle:
+            self._idle.pop().kill()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._programs),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "idle_processes": len(self._idle),
+            "restarts": self.restarts,
+            "filters": {
+                jq_filter: {
+                    "runs": latency["runs"],
+                    "errors": latency["errors"],
+                    "timeouts": latency["timeouts"],
+                    "avg_ms": round(latency["total_ms"] / latency["calls"], 3),
+                    "max_ms": round(latency["max_ms"], 3),
+                }
+                for jq_filter, latency in self._latencies.items()
+            },
+        }
+
+    def _record_latency(self, jq_filter: str, outcome: str, elapsed_ms: float) -> None:
+        latency = self._latencies.get(jq_filter)
+        if latency is None:
+            latency = {"calls": 0, "runs": 0, "errors": 0, "timeouts": 0, "total_ms": 0.0, "max_ms": 0.0}
+            self._latencies[jq_filter] = latency
+            # Keep the latencies of as many filters as the programs cache
+            while len(self._latencies) > max(self.maxsize, 1):
+                self._latencies.popitem(last=False)
+        else:
+            self._latencies.move_to_end(jq_filter)
+        latency["calls"] += 1
+        latency[outcome] += 1
+        latency["total_ms"] += elapsed_ms
+        latency["max_ms"] = max(latency["max_ms"], elapsed_ms)
+
+
+jq_engine = JqEngine(settings.jq_cache_size, settings.jq_workers)
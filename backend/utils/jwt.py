@@ -1,20 +1,113 @@
+import hashlib
+from collections import OrderedDict
+from functools import lru_cache
+from pathlib import Path
 from time import time
 from typing import Any
 
 import jwt
+from cryptography.hazmat.primitives.serialization import load_pem_private_key, load_pem_public_key
 from fastapi import Request, status
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 
 import models.api as api
 from data_adapters.adapter import data_adapter as db
 from utils.internal_error_code import InternalErrorCode
+from utils.middleware import set_request_user
 from utils.settings import settings
 
+ASYMMETRIC_ALGORITHMS = {"EdDSA", "ES256"}
+
+
+@lru_cache(maxsize=4)
+def _load_pem_key(path: str, private: bool) -> Any:
+    data = Path(path).read_bytes()
+    return load_pem_private_key(data, password=None) if private else load_pem_public_key(data)
+
+
+def signing_key() -> Any:
+    if settings.jwt_algorithm in ASYMMETRIC_ALGORITHMS:
+        return _load_pem_key(settings.jwt_private_key, True)
+    return settings.jwt_secret
+
+
+def verification_key() -> Any:
+    """The public key of the asymmetric algorithms, from the private key when no public key file is set"""
+    if settings.jwt_algorithm in ASYMMETRIC_ALGORITHMS:
+        if settings.jwt_public_key:
+            return _load_pem_key(settings.jwt_public_key, False)
+        return _load_pem_key(settings.jwt_private_key, True).public_key()
+    return settings.jwt_secret
+
+
+class VerifiedTokens:
+    """
+    Per-worker LRU of the claims of the verified tokens, keyed by the token hash, so a token is only verified once
+    by the dependency, the logging middleware and the websockets. An entry is dropped once its token expires, and
+    the whole cache when the algorithm or the keys change.
+    """
+
+    def __init__(self, maxsize: int = 1024):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: OrderedDict[bytes, tuple[dict[str, Any], float]] = OrderedDict()
+        self._keys_id: tuple = ()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, token: str) -> dict[str, Any] | None:
+        self._check_keys()
+        key = hashlib.sha256(token.encode()).digest()
+        entry = self._entries.get(key)
+        if entry is not None:
+            data, expires = entry
+            if expires > time():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return data
+            del self._entries[key]
+        self.misses += 1
+        return None
+
+    def put(self, token: str, data: dict[str, Any], expires: float) -> None:
+        if self.maxsize <= 0:
+            return
+        self._check_keys()
+        self._entries[hashlib.sha256(token.encode()).digest()] = (data, expires)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def _check_keys(self) -> None:
+        keys_id = (settings.jwt_algorithm, settings.jwt_secret, settings.jwt_private_key, settings.jwt_public_key)
+        if keys_id != self._keys_id:
+            self._entries.clear()
+            self._keys_id = keys_id
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+verified_tokens = VerifiedTokens(settings.jwt_cache_size)
+
 
 def decode_jwt(token: str) -> dict[str, Any]:
+    cached = verified_tokens.get(token)
+    if cached is not None:
+        return cached
+
     decoded_token: dict
     try:
-        decoded_token = jwt.decode(token, settings.jwt_secret, algorithms=[settings.jwt_algorithm])
+        decoded_token = jwt.decode(token, verification_key(), algorithms=[settings.jwt_algorithm])
     except Exception as e:
         raise api.Exception(
             status.HTTP_401_UNAUTHORIZED,
@@ -32,6 +125,7 @@ def decode_jwt(token: str) -> dict[str, Any]:
         )
 
     if isinstance(decoded_token["data"], dict) and decoded_token["data"].get("shortname") is not None:
+        verified_tokens.put(token, decoded_token["data"], decoded_token["expires"])
         return decoded_token["data"]
     else:
         raise api.Exception(
@@ -83,6 +177,9 @@ class JWTBearer:
                     api.Error(type="jwtauth", code=InternalErrorCode.NOT_AUTHENTICATED, message="Not authenticated [3]"),
                 )
 
+        set_request_user(user_shortname)
+        # Spares the logging middleware from looking the token up again
+        request.state.jwt_data = decoded
         return user_shortname
 
 
@@ -104,7 +201,7 @@ class GetJWTToken:
 
 def generate_jwt(data: dict, expires: int = 86400) -> str:
     payload = {"data": data, "expires": time() + expires}
-    return jwt.encode(payload, settings.jwt_secret, algorithm=settings.jwt_algorithm)
+    return jwt.encode(payload, signing_key(), algorithm=settings.jwt_algorithm)
 
 
 async def sign_jwt(
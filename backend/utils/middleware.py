@@ -14,11 +14,39 @@ REQUEST_DATA_CTX_KEY = "request_data"
 
 _request_data_ctx_var: ContextVar[dict] = ContextVar(REQUEST_DATA_CTX_KEY, default={})  # noqa: B039
 
+REQUEST_MEMO_CTX_KEY = "request_memo"
+
+_request_memo_ctx_var: ContextVar[dict | None] = ContextVar(REQUEST_MEMO_CTX_KEY, default=None)
+
 
 def get_request_data() -> dict:
     return _request_data_ctx_var.get()
 
 
+def get_request_memo() -> dict | None:
+    """
+    Memo of the user meta, permissions and query policies resolved while serving the current request,
+    shared by all the access control paths. None outside of a request, where nothing is memoized.
+    """
+    return _request_memo_ctx_var.get()
+
+
+def set_request_user(user_shortname: str) -> None:
+    """Remember the authenticated user of the current request, a no-op outside of a request"""
+    if _request_memo_ctx_var.get() is not None:
+        _request_data_ctx_var.get()["user_shortname"] = user_shortname
+
+
+def get_request_user() -> str | None:
+    return _request_data_ctx_var.get().get("user_shortname")
+
+
+def clear_request_memo() -> None:
+    request_memo = _request_memo_ctx_var.get()
+    if request_memo is not None:
+        request_memo.clear()
+
+
 class CustomRequestMiddleware:
     def __init__(
         self,
@@ -44,10 +72,12 @@ class CustomRequestMiddleware:
                 "request_headers": request_headers,
             }
         )
+        request_memo = _request_memo_ctx_var.set({})
 
         try:
             await self.app(scope, receive, send)
         finally:
+            _request_memo_ctx_var.reset(request_memo)
             _request_data_ctx_var.reset(request_data)
 
 
@@ -1,14 +1,178 @@
+import asyncio
+import hashlib
+import hmac
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import lru_cache
+from typing import Any
+
 from argon2 import PasswordHasher
+from fastapi import status
+
+from utils.internal_error_code import InternalErrorCode
+from utils.settings import settings
+
+
+@lru_cache(maxsize=4)
+def _hasher(memory_cost: int, time_cost: int, parallelism: int) -> PasswordHasher:
+    return PasswordHasher(memory_cost=memory_cost, time_cost=time_cost, parallelism=parallelism)
+
 
-ph = PasswordHasher(memory_cost=102400, time_cost=3, parallelism=8)
+def password_hasher() -> PasswordHasher:
+    """Argon2 hasher with the password_hash_* parameters of the settings"""
+    return _hasher(
+        settings.password_hash_memory_cost, settings.password_hash_time_cost, settings.password_hash_parallelism
+    )
 
 
 def verify_password(plain_password: str, hashed_password: str):
     try:
-        return ph.verify(hashed_password, plain_password)
+        return password_hasher().verify(hashed_password, plain_password)
     except Exception:
         return False
 
 
 def hash_password(password: str):
-    return ph.hash(password)
+    return password_hasher().hash(password)
+
+
+def needs_rehash(hashed_password: str) -> bool:
+    """Whether the hash was made with other parameters than the current ones"""
+    try:
+        return password_hasher().check_needs_rehash(hashed_password)
+    except Exception:
+        return False
+
+
+class PasswordHashingPool:
+    """
+    Per-worker process pool running the Argon2 hashes and verifications off the event loop, so a burst of logins
+    doesn't stall the other requests. At most `queue_limit` jobs wait or run at once, the next ones are rejected
+    right away. With no workers, the jobs run inline as before.
+
+    The pool starts its processes from a forkserver: forking the threaded server process could copy a lock held
+    by another of its threads and deadlock the child.
+
+    Every operation keeps a histogram of its latencies, waiting in the queue included.
+    """
+
+    BUCKETS_MS = (10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+    def __init__(self, workers: int = 2, queue_limit: int = 32):
+        self.workers = workers
+        self.queue_limit = queue_limit
+        self.in_flight = 0
+        self.rejected = 0
+        self._executor: ProcessPoolExecutor | None = None
+        self._latencies: dict[str, dict] = {}
+
+    async def hash(self, password: str) -> str:
+        return await self._run("hash", hash_password, password)  # type: ignore
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        return bool(await self._run("verify", verify_password, plain_password, hashed_password))
+
+    async def hash_record_password(self, record: Any) -> bool:
+        """
+        Hash the plain password of a user record in place, then build its meta with `password_hashed=True` so
+        Meta.from_record and update_from_record don't hash it again on the event loop
+        """
+        if record.resource_type == "user" and record.attributes.get("password"):
+            record.attributes["password"] = await self.hash(record.attributes["password"])
+            return True
+        return False
+
+    async def verify_and_rehash(self, plain_password: str, hashed_password: str) -> tuple[bool, str | None]:
+        """Whether the password matches, and its new hash when the parameters changed since it was hashed"""
+        if not await self.verify(plain_password, hashed_password):
+            return False, None
+        if needs_rehash(hashed_password):
+            return True, await self.hash(plain_password)
+        return True, None
+
+    async def _run(self, operation: str, function: Any, *args: Any) -> Any:
+        started = time.perf_counter()
+        if self.workers <= 0:
+            try:
+                return function(*args)
+            finally:
+                self._record_latency(operation, (time.perf_counter() - started) * 1000)
+
+        if self.in_flight >= self.queue_limit:
+            self.rejected += 1
+            import models.api as api
+
+            raise api.Exception(
+                status.HTTP_503_SERVICE_UNAVAILABLE,
+                api.Error(
+                    type="auth",
+                    code=InternalErrorCode.PASSWORD_HASHING_BUSY,
+                    message="Too many password checks in progress, try again later",
+                ),
+            )
+        self.in_flight += 1
+        try:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=multiprocessing.get_context("forkserver")
+                )
+            return await asyncio.get_running_loop().run_in_executor(self._executor, function, *args)
+        except BrokenProcessPool:
+            # A worker process died, the next job starts a new pool
+            self._executor = None
+            raise
+        finally:
+            self.in_flight -= 1
+            self._record_latency(operation, (time.perf_counter() - started) * 1000)
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "queue_limit": self.queue_limit,
+            "in_flight": self.in_flight,
+            "rejected": self.rejected,
+            "operations": {
+                operation: {
+                    "calls": latency["calls"],
+                    "avg_ms": round(latency["total_ms"] / latency["calls"], 3),
+                    "max_ms": round(latency["max_ms"], 3),
+                    "histogram_ms": {
+                        **{f"<={bound}": count for bound, count in zip(self.BUCKETS_MS, latency["buckets"], strict=False)},
+                        f">{self.BUCKETS_MS[-1]}": latency["buckets"][-1],
+                    },
+                }
+                for operation, latency in self._latencies.items()
+            },
+        }
+
+    def _record_latency(self, operation: str, elapsed_ms: float) -> None:
+        latency = self._latencies.get(operation)
+        if latency is None:
+            latency = {"calls": 0, "total_ms": 0.0, "max_ms": 0.0, "buckets": [0] * (len(self.BUCKETS_MS) + 1)}
+            self._latencies[operation] = latency
+        latency["calls"] += 1
+        latency["total_ms"] += elapsed_ms
+        latency["max_ms"] = max(latency["max_ms"], elapsed_ms)
+        bucket = next((idx for idx, bound in enumerate(self.BUCKETS_MS) if elapsed_ms <= bound), len(self.BUCKETS_MS))
+        latency["buckets"][bucket] += 1
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+hashing_pool = PasswordHashingPool(settings.password_hash_workers, settings.password_hash_queue_limit)
+
+
+def token_digest(token: str) -> str:
+    """Keyed digest of a session token, safe to store and to look up by equality"""
+    return hmac.new(settings.jwt_secret.encode(), token.encode(), hashlib.sha256).hexdigest()
+
+
+def verify_token_digest(token: str, digest: str | None) -> bool:
+    if not digest:
+        return False
+    return hmac.compare_digest(token_digest(token), digest)
@@ -0,0 +1,92 @@
+from collections.abc import Iterator
+
+from utils.settings import settings
+
+
+class PermissionGrant:
+    """One entry of a user permissions map, with its actions and conditions as sets"""
+
+    __slots__ = ("actions", "allowed_fields_values", "conditions", "key", "restricted_fields")
+
+    def __init__(self, key: str, permission: dict):
+        self.key = key
+        self.actions = frozenset(permission.get("allowed_actions") or [])
+        self.conditions = frozenset(permission.get("conditions") or [])
+        self.restricted_fields = tuple(permission.get("restricted_fields") or [])
+        self.allowed_fields_values: dict = permission.get("allowed_fields_values") or {}
+
+
+class PermissionNode:
+    __slots__ = ("children", "grant")
+
+    def __init__(self) -> None:
+        self.children: dict[str, PermissionNode] = {}
+        self.grant: PermissionGrant | None = None
+
+
+def compile_permissions(user_permissions: dict) -> dict[tuple[str, str], PermissionNode]:
+    """
+    Prefix tries of a user permissions map, one per (space, resource type), walked by the subpath segments.
+    The magic words stay plain segments, `iter_grants` looks them up at the positions the keys allow them.
+    """
+    tries: dict[tuple[str, str], PermissionNode] = {}
+    for key, permission in user_permissions.items():
+        space_name, _, rest = key.partition(":")
+        subpath, _, resource_type = rest.rpartition(":")
+        node = tries.setdefault((space_name, resource_type), PermissionNode())
+        for segment in subpath.split("/"):
+            node = node.children.setdefault(segment, PermissionNode())
+        node.grant = PermissionGrant(key, permission)
+    return tries
+
+
+def _child(node: PermissionNode | None, segment: str) -> PermissionNode | None:
+    return node.children.get(segment) if node is not None else None
+
+
+def _grant(node: PermissionNode | None) -> PermissionGrant | None:
+    return node.grant if node is not None else None
+
+
+def iter_grants(
+    tries: dict[tuple[str, str], PermissionNode], space_name: str, resource_type: str, subpath_parts: list[str]
+) -> Iterator[tuple[PermissionGrant | None, PermissionGrant | None]]:
+    """
+    The global and the exact grants matching "/" then each subpath prefix, root first.
+
+    The global grant of a prefix is, by precedence, the one of all the spaces for the prefix itself, else the
+    one of the space then of all the spaces for the prefix with its second to last segment replaced by
+    __all_subpaths__ (a single segment prefix and "/" become __all_subpaths__).
+    """
+    all_subpaths = settings.all_subpaths_mw
+    space_root = tries.get((space_name, resource_type))
+    all_root = tries.get((settings.all_spaces_mw, resource_type))
+    if space_root is None and all_root is None:
+        return
+
+    yield (
+        _grant(_child(_child(all_root, ""), ""))
+        or _grant(_child(space_root, all_subpaths))
+        or _grant(_child(all_root, all_subpaths)),
+        _grant(_child(_child(space_root, ""), "")),
+    )
+
+    # Nodes of the current prefix and of the one before its parent, in the space and the all spaces tries
+    space_node, all_node = space_root, all_root
+    space_grandparent = all_grandparent = None
+    space_parent, all_parent = space_root, all_root
+    for depth, segment in enumerate(subpath_parts):
+        if depth:
+            space_grandparent, all_grandparent = space_parent, all_parent
+            space_parent, all_parent = space_node, all_node
+            if space_grandparent is None and all_grandparent is None:
+                # Neither the prefixes nor their __all_subpaths__ variants can match deeper
+                return
+            space_global = _child(_child(space_grandparent, all_subpaths), segment)
+            all_global = _child(_child(all_grandparent, all_subpaths), segment)
+        else:
+            space_global = _child(space_root, all_subpaths)
+            all_global = _child(all_root, all_subpaths)
+        space_node = _child(space_parent, segment)
+        all_node = _child(all_parent, segment)
+        yield _grant(all_node) or _grant(space_global) or _grant(all_global), _grant(space_node)
@@ -0,0 +1,145 @@
+import hashlib
+import json
+import time
+from collections import OrderedDict
+
+import models.api as api
+from utils.settings import settings
+
+
+def normalize_subpath(subpath: str) -> str:
+    subpath = "/" + subpath.strip("/")
+    return subpath.replace("//", "/")
+
+
+def subpath_lineage(subpath: str) -> list[str]:
+    """The subpath and its parents, root first"""
+    lineage = ["/"]
+    current = ""
+    for part in normalize_subpath(subpath).strip("/").split("/"):
+        if part:
+            current = f"{current}/{part}"
+            lineage.append(current)
+    return lineage
+
+
+class PublicQueryCache:
+    """
+    Per-worker LRU of the serialized responses of anonymous queries, bounded by their total size in bytes.
+
+    Every entry remembers the version of its (space, subpath) when it was filled. A write bumps the generation of
+    its subpath and of every parent, and a folder move or delete also bumps the subtree generation of the folder,
+    so an entry is stale as soon as anything under its subpath changes. Writes handled by other workers aren't seen
+    here, `ttl` bounds how long their effect can stay hidden.
+    """
+
+    def __init__(self, max_bytes: int = 0, ttl: int = 60):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.size_bytes = 0
+        self.epoch = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._entries: OrderedDict[str, tuple[bytes, str, str, str, int, int, float]] = OrderedDict()
+        self._generations: dict[tuple[str, str], int] = {}
+        self._subtree_generations: dict[tuple[str, str], int] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    @staticmethod
+    def key(route: str, query: api.Query) -> str:
+        normalized = json.dumps(query.model_dump(mode="json", exclude_defaults=True), sort_keys=True)
+        return hashlib.sha256(f"{route}:{normalized}".encode()).hexdigest()
+
+    def get(self, key: str) -> tuple[bytes, str] | None:
+        """Body and ETag of a fresh entry"""
+        entry = self._entries.get(key)
+        if entry is not None:
+            body, etag, space_name, subpath, generation, epoch, expires_at = entry
+            if (
+                epoch == self.epoch
+                and generation == self._version(space_name, subpath)
+                and time.monotonic() < expires_at
+            ):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return body, etag
+            self._drop(key)
+        self.misses += 1
+        return None
+
+    def snapshot(self, space_name: str, subpath: str) -> tuple[int, int]:
+        """Version of the subpath and epoch, taken before running the query so concurrent writes stale its result"""
+        return self._version(space_name, normalize_subpath(subpath)), self.epoch
+
+    def put(self, key: str, space_name: str, subpath: str, body: bytes, snapshot: tuple[int, int]) -> str:
+        etag = f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+        if not self.enabled or len(body) > self.max_bytes:
+            return etag
+        self._drop(key)
+        generation, epoch = snapshot
+        self._entries[key] = (
+            body,
+            etag,
+            space_name,
+            normalize_subpath(subpath),
+            generation,
+            epoch,
+            time.monotonic() + self.ttl,
+        )
+        self.size_bytes += len(body)
+        while self.size_bytes > self.max_bytes:
+            self._drop(next(iter(self._entries)))
+            self.evictions += 1
+        return etag
+
+    def invalidate(self, space_name: str, subpath: str, subtree: bool = False) -> None:
+        """Stale the entries of the subpath and of its parents, and of all its children with `subtree`"""
+        for path in subpath_lineage(subpath):
+            self._generations[(space_name, path)] = self._generations.get((space_name, path), 0) + 1
+        if subtree:
+            key = (space_name, normalize_subpath(subpath))
+            self._subtree_generations[key] = self._subtree_generations.get(key, 0) + 1
+        self.invalidations += 1
+
+    def clear(self) -> None:
+        """Stale every entry, for the changes that may affect any query (spaces, anonymous permissions)"""
+        self.epoch += 1
+        self.invalidations += 1
+        self._entries.clear()
+        self.size_bytes = 0
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "size": len(self._entries),
+            "size_bytes": self.size_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+    def _version(self, space_name: str, subpath: str) -> int:
+        # Both kinds of generations only grow, so the sum changes whenever one of them does
+        return self._generations.get((space_name, subpath), 0) + sum(
+            self._subtree_generations.get((space_name, path), 0) for path in subpath_lineage(subpath)
+        )
+
+    def _drop(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.size_bytes -= len(entry[0])
+
+
+public_query_cache = PublicQueryCache(settings.public_query_cache_bytes, settings.public_query_cache_ttl)
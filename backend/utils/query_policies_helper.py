@@ -1,4 +1,5 @@
 from models.enums import ConditionType, ResourceType
+from utils.middleware import get_request_memo
 from utils.settings import settings
 
 
@@ -77,8 +78,13 @@ async def get_user_query_policies(
         "products:offers:content:*", # IF conditions = {}
     ]
     """
+    request_memo = get_request_memo()
+    memo_key = ("query_policies", user_shortname, space_name, subpath, is_space)
+    if request_memo is not None and memo_key in request_memo:
+        return list(request_memo[memo_key])
+
     user_permissions = await db.get_user_permissions(user_shortname)
-    user_groups = (await db.load_user_meta(user_shortname)).groups or []
+    user_groups = list((await db.load_user_meta(user_shortname)).groups or [])
     user_groups.append(user_shortname)
 
     query_subpath = subpath.lstrip("/")
@@ -110,4 +116,7 @@ async def get_user_query_policies(
 
         else:
             sql_query_policies.append(f"{perm_key}:*")
+
+    if request_memo is not None:
+        request_memo[memo_key] = list(sql_query_policies)
     return sql_query_policies
@@ -1,9 +1,6 @@
-import asyncio
-import json
 import os
 import re
 import shutil
-import subprocess
 import sys
 from pathlib import Path
 from typing import Any
@@ -15,12 +12,10 @@ import models.api as api
 import models.core as core
 import utils.regex as regex
 from data_adapters.adapter import data_adapter as db
-from models.enums import ContentType, Language
-from utils.helpers import (
-    camel_case,
-    jq_dict_parser,
-)
+from models.enums import ContentType, Language, TotalMode
+from utils.helpers import camel_case
 from utils.internal_error_code import InternalErrorCode
+from utils.jq_engine import jq_engine
 from utils.jwt import generate_jwt
 from utils.settings import settings
 
@@ -29,6 +24,18 @@ async def serve_query(query: api.Query, logged_in_user: str) -> tuple[int, list[
     records: list[core.Record] = []
     total: int = 0
 
+    if query.explain:
+        if logged_in_user != "dmart":
+            raise api.Exception(
+                status.HTTP_401_UNAUTHORIZED,
+                api.Error(
+                    type="access",
+                    code=InternalErrorCode.NOT_ALLOWED,
+                    message="You don't have permission to this action [24]",
+                ),
+            )
+        query.start_profile()
+
     total, records = await db.query(query, logged_in_user)
 
     try:
@@ -40,74 +47,23 @@ async def serve_query(query: api.Query, logged_in_user: str) -> tuple[int, list[
         pass
 
     if query.jq_filter:
-        try:
-
-            def _run_jq_subprocess() -> list:
-                _input_local = [record.model_dump() for record in records]
-                _input_local = jq_dict_parser(_input_local)
-                input_json = json.dumps(_input_local)
-
-                cmd = ["jq", "-c", query.jq_filter]
-
-                try:
-                    completed = subprocess.run(
-                        cmd,  # type: ignore
-                        input=input_json.encode("utf-8"),
-                        capture_output=True,
-                        timeout=settings.jq_timeout,
-                        check=False,
-                    )
-                except subprocess.TimeoutExpired as e:
-                    raise api.Exception(
-                        status.HTTP_400_BAD_REQUEST,
-                        api.Error(
-                            type="request",
-                            code=InternalErrorCode.JQ_TIMEOUT,
-                            message="jq filter took too long to execute",
-                        ),
-                    ) from e
-
-                if completed.returncode != 0:
-                    raise api.Exception(
-                        status.HTTP_400_BAD_REQUEST,
-                        api.Error(
-                            type="request",
-                            code=InternalErrorCode.JQ_ERROR,
-                            message="jq filter failed to be executed",
-                        ),
-                    )
-
-                stdout = completed.stdout.decode("utf-8")
-                results: list = []
-                if stdout.startswith("[") and stdout.endswith("]\n"):
-                    results = json.loads(stdout)
-                else:
-                    for line in stdout.splitlines():
-                        line = line.strip()
-                        if not line:
-                            continue
-                        results.append(json.loads(line))
-                return results
-
-            loop = asyncio.get_running_loop()
-            records = await asyncio.wait_for(
-                loop.run_in_executor(None, _run_jq_subprocess),
-                timeout=settings.jq_timeout,
-            )
-
-        except FileNotFoundError as e:
-            raise api.Exception(
-                status.HTTP_400_BAD_REQUEST,
-                api.Error(
-                    type="request",
-                    code=InternalErrorCode.NOT_ALLOWED,
-                    message="jq is not installed!",
-                ),
-            ) from e
+        with query.phase("jq"):
+            records = await jq_engine.run(query.jq_filter, [record.model_dump() for record in records])
 
     return total, records
 
 
+def query_response_attributes(query: api.Query, total: int, records: list) -> dict[str, Any]:
+    attributes: dict[str, Any] = {"total": total, "returned": len(records)}
+    if query.next_cursor:
+        attributes["next_cursor"] = query.next_cursor
+    if query.effective_total_mode != TotalMode.exact:
+        attributes["total_mode"] = query.effective_total_mode
+    if query.profile is not None:
+        attributes["explain"] = query.profile
+    return attributes
+
+
 async def get_last_updated_entry(
     space_name: str,
     schema_names: list,
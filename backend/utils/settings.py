@@ -54,6 +54,9 @@ class Settings(BaseSettings):
     jwt_secret: str = "".join(secrets.choice(string.ascii_letters + string.digits) for _ in range(32))
     jwt_algorithm: str = "HS256"
     jwt_access_expires: int = 30 * 86400  # 30 days
+    jwt_private_key: str = ""  # PEM file signing the tokens when jwt_algorithm is EdDSA or ES256
+    jwt_public_key: str = ""  # PEM file verifying them
+    jwt_cache_size: int = 1024  # verified tokens kept in each worker's memory
     listening_host: str = "0.0.0.0"
     listening_port: int = 8282
     max_sessions_per_user: int = 5
@@ -102,11 +105,32 @@ class Settings(BaseSettings):
     ldap_root_dn: str = ""
     ldap_pass: str = ""
     max_query_limit: int = 10000
+    # Row paths, besides shortname, displayname, description and tags, indexed in the search_vector column
+    search_vector_paths: list[str] = ["payload.body.title", "payload.body.name", "payload.body.description"]
+    folder_indexes_auto_sync: bool = True  # (re)build folder declared payload indexes when folders change
+    trigram_payload_paths: list[str] = []  # payload paths, e.g. "body.title", with a trigram index for @payload.* searches
+    query_attachments_per_type_limit: int = 0  # 0 for no limit on the attachments of each type returned per query record
+    csv_export_single_pass: bool = True  # /managed/csv writes every folder csv_columns, False drops the never set ones
+    query_stream_batch_size: int = 500  # rows fetched per round trip by the /managed/query/stream cursor
+    query_window_total_limit: int = 100  # pages up to this size get their total from COUNT(*) OVER() in the same query
+    public_query_cache_bytes: int = 0  # memory of each worker's cache of anonymous /public/query responses, 0 disables it
+    public_query_cache_ttl: int = 60  # secs, bounds how long a worker's cache can miss the writes of other workers
+    public_query_cache_max_age: int = 0  # secs, Cache-Control max-age of /public/query responses (0: revalidate by ETag)
+    permissions_cache_size: int = 1024  # users whose permission maps are kept in each worker's memory
+    permissions_version_poll_ms: int = 500  # each worker reads the permissions version at most this often, 0 on every check
     session_inactivity_ttl: int = (
         0  # Set initially to 0 to disable session timeout. Possible value : 60 * 60 * 24 * 7  # 7 days
     )
+    session_touch_interval: int = 60  # secs, minimum gap between session last-seen timestamp writes
     request_timeout: int = 35  # In seconds the time of dmart requests.
     jq_timeout: int = 2  # secs
+    jq_cache_size: int = 256  # compiled jq filters kept in each worker's memory
+    jq_workers: int = 4  # processes running jq filters in each worker, a timed out filter gets its process killed
+    password_hash_memory_cost: int = 102400  # KiB, hashes made with other parameters are upgraded on login
+    password_hash_time_cost: int = 3
+    password_hash_parallelism: int = 8
+    password_hash_workers: int = 2  # processes hashing passwords in each worker, 0 hashes on the event loop
+    password_hash_queue_limit: int = 32  # hashes waiting or running in each worker before rejecting new ones
     is_sha_required: bool = False
     logout_on_pwd_change: bool = True
     url_shorter_expires: int = 60 * 60  # 1 hour
@@ -137,6 +161,10 @@ class Settings(BaseSettings):
     database_max_overflow: int = 10
     database_pool_timeout: int = 30
     database_pool_recycle: int = 1800
+    database_replica_hosts: list[str] = []  # "host" or "host:port" of read replicas sharing the primary's credentials
+    database_replica_strategy: str = "round_robin"  # or "least_loaded", the replica with the fewest connections in use
+    database_replica_read_your_writes: int = 5  # secs a user's reads stay on the primary after their own writes
+    database_replica_eject_secs: int = 30  # secs a replica failing to connect stays out of the rotation
     allowed_cors_origins: list[str] = []
     user_profile_payload_protected_fields: list[str] = []
     hide_stack_trace: bool = True